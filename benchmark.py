@@ -0,0 +1,323 @@
+"""M3U8 批量转换性能基准
+
+用 ffmpeg 的 testsrc/sine 合成源在本地生成测试视频（时长、码率、GOP、容器组合），
+按不同并行数与片段时长运行批量转换，输出 JSON 结果；compare 子命令对比两次结果并标出退化。
+--http 改由本机 http.server 提供测试视频，测量 ffmpeg 直接读取网络输入的转换。
+
+    python benchmark.py run -o results.json
+    python benchmark.py run -o quick.json --durations 10 --parallel 1,2 --segments 6
+    python benchmark.py run -o http.json --http --containers mkv
+    python benchmark.py compare base.json results.json --threshold 0.1
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import threading
+import argparse
+import platform
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from m3u8_batch_converter import (BatchRunner, M3U8Converter, hidden_subprocess_kwargs,
+                                  host_connections, make_conversion_task)
+
+RESULT_VERSION = 1
+SYNTH_RESOLUTION = "1280x720"
+SYNTH_FPS = 25
+
+
+def parse_list(text, cast=str):
+    return [cast(value.strip()) for value in text.split(",") if value.strip()]
+
+
+def parse_bitrate(text):
+    """'2M' / '800k' / '1500000' -> 比特/秒"""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000 ** 2}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def input_name(duration, bitrate, gop, container):
+    # 输出目录取文件名主干，容器也要写进主干，否则 mp4/mkv 两个输入会并行写入同一目录
+    return f"bench_{duration}s_{bitrate}_{gop}g_{container}.{container}"
+
+
+def generate_input(ffmpeg_path, path, duration, bitrate, gop):
+    """生成合成测试视频：testsrc 画面 + sine 音频，固定 GOP 且关闭场景切换关键帧"""
+    keyint = int(gop * SYNTH_FPS)
+    cmd = [ffmpeg_path, "-hide_banner", "-v", "error",
+           "-f", "lavfi", "-i", f"testsrc=duration={duration}:size={SYNTH_RESOLUTION}:rate={SYNTH_FPS}",
+           "-f", "lavfi", "-i", f"sine=frequency=1000:duration={duration}",
+           "-c:v", "libx264", "-preset", "ultrafast", "-b:v", bitrate,
+           "-g", str(keyint), "-keyint_min", str(keyint), "-sc_threshold", "0",
+           "-c:a", "aac", "-b:a", "128k", "-shortest", "-y", str(path)]
+    subprocess.run(cmd, check=True, capture_output=True, **hidden_subprocess_kwargs())
+
+
+def prepare_inputs(args, ffmpeg_path):
+    """按参数矩阵生成（或复用已生成的）测试视频，返回输入描述列表"""
+    input_dir = Path(args.workdir) / "inputs"
+    input_dir.mkdir(parents=True, exist_ok=True)
+    inputs = []
+    for duration in parse_list(args.durations, int):
+        for bitrate in parse_list(args.bitrates):
+            for gop in parse_list(args.gops, float):
+                for container in parse_list(args.containers):
+                    path = input_dir / input_name(duration, bitrate, f"{gop:g}", container)
+                    if not path.exists() or args.regenerate:
+                        print(f"🎬 生成测试视频: {path.name}")
+                        generate_input(ffmpeg_path, path, duration, bitrate, gop)
+                    inputs.append({
+                        'name': path.name,
+                        'path': str(path),
+                        'duration': duration,
+                        'bitrate': parse_bitrate(bitrate),
+                        'gop': gop,
+                        'container': container,
+                        'size': path.stat().st_size
+                    })
+    return inputs
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """支持单段 Range 请求的静态文件服务（ffmpeg 读取 moov 在文件末尾的 mp4 时需要跳转）"""
+    
+    RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+    
+    def send_head(self):
+        self.remaining = None
+        match = self.RANGE_RE.match(self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        start, end = match.groups()
+        if start:
+            start, end = int(start), min(int(end) if end else size - 1, size - 1)
+        else:
+            start, end = max(0, size - int(end or 0)), size - 1
+        if start >= size or start > end:
+            self.send_error(416)
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.remaining = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self.remaining))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return f
+    
+    def copyfile(self, source, outputfile):
+        remaining = self.remaining
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_inputs(directory):
+    """在本机随机端口提供测试视频，返回 (服务器, 基础地址)"""
+    handler = lambda *handler_args: RangeRequestHandler(*handler_args, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def run_config(args, ffmpeg_path, inputs, parallel, segment_duration):
+    """以指定并行数与片段时长转换全部输入，返回每次重复的测量结果"""
+    repeats = []
+    for repeat in range(args.repeat):
+        output_dir = Path(args.workdir) / "output" / f"p{parallel}_s{segment_duration}"
+        shutil.rmtree(output_dir, ignore_errors=True)
+        tasks = [make_conversion_task(item.get('url', item['path']), output_dir, segment_duration,
+                                      output_mode=args.output_mode) for item in inputs]
+        for task, item in zip(tasks, inputs):
+            task['size'] = item['size']  # URL 输入不发起请求取大小，吞吐按已知大小计算
+        runner = BatchRunner(parallel, ffmpeg_path=ffmpeg_path, resume=False)
+        summary = runner.run(tasks)
+
+        phases = {}
+        for result in summary['results']:
+            for phase, seconds in result.get('timings', {}).items():
+                phases[phase] = phases.get(phase, 0.0) + seconds
+        repeats.append({
+            'wall_time': summary['wall_time'],
+            'files_per_sec': summary['files_per_sec'],
+            'mb_per_sec': summary['mb_per_sec'],
+            'success': summary['success'],
+            'total': summary['total'],
+            'phases': phases
+        })
+        print(f"  第 {repeat + 1}/{args.repeat} 次: {summary['wall_time']:.2f}s, "
+              f"{summary['files_per_sec']:.2f} 文件/s, {summary['mb_per_sec']:.1f} MB/s, "
+              f"成功 {summary['success']}/{summary['total']}")
+    return repeats
+
+
+def summarize_repeats(repeats):
+    """多次重复取中位数，阶段耗时取各阶段中位数"""
+    phase_names = sorted({phase for repeat in repeats for phase in repeat['phases']})
+    return {
+        'wall_time': statistics.median(repeat['wall_time'] for repeat in repeats),
+        'files_per_sec': statistics.median(repeat['files_per_sec'] for repeat in repeats),
+        'mb_per_sec': statistics.median(repeat['mb_per_sec'] for repeat in repeats),
+        'phases': {phase: statistics.median(repeat['phases'].get(phase, 0.0) for repeat in repeats)
+                   for phase in phase_names},
+        'failures': sum(repeat['total'] - repeat['success'] for repeat in repeats)
+    }
+
+
+def run_benchmark(args):
+    converter = M3U8Converter(args.ffmpeg)
+    capabilities = converter.toolchain.capabilities()
+    if capabilities is None:
+        print("❌ 未找到 FFmpeg，请确保已安装并添加到系统PATH中")
+        return 1
+
+    inputs = prepare_inputs(args, converter.ffmpeg_path)
+    total_mb = sum(item['size'] for item in inputs) / 1024 / 1024
+    print(f"📦 测试输入: {len(inputs)} 个文件, {total_mb:.1f} MB")
+    server = None
+    if args.http:
+        server, base_url = serve_inputs(Path(args.workdir) / "inputs")
+        host_connections.limit = args.max_per_host
+        for item in inputs:
+            item['url'] = base_url + item['name']
+        print(f"🌐 测试视频经 {base_url} 提供")
+
+    runs = []
+    try:
+        for parallel in parse_list(args.parallel, int):
+            for segment_duration in parse_list(args.segments, int):
+                print(f"🚀 并行 {parallel}, 片段 {segment_duration}s")
+                repeats = run_config(args, converter.ffmpeg_path, inputs, parallel, segment_duration)
+                run = {'parallel': parallel, 'segment_duration': segment_duration, 'repeats': repeats}
+                run.update(summarize_repeats(repeats))
+                runs.append(run)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    result = {
+        'version': RESULT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': capabilities['version']
+        },
+        'matrix': {
+            'durations': args.durations, 'bitrates': args.bitrates, 'gops': args.gops,
+            'containers': args.containers, 'parallel': args.parallel, 'segments': args.segments,
+            'output_mode': args.output_mode, 'http': args.http
+        },
+        'repeat': args.repeat,
+        'inputs': [{key: value for key, value in item.items() if key not in ('path', 'url')} for item in inputs],
+        'runs': runs
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"✅ 结果已写入: {args.output}")
+    return 0 if all(run['failures'] == 0 for run in runs) else 1
+
+
+def compare_results(args):
+    """对比两次结果：墙钟时间变慢超过阈值视为退化，返回码 1"""
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    if base.get('matrix') != new.get('matrix'):
+        print("⚠️ 两次测试的参数矩阵不同，只对比共同的配置")
+    if base.get('host') != new.get('host'):
+        print("⚠️ 两次测试的运行环境不同，结果可能不可比")
+
+    base_runs = {(run['parallel'], run['segment_duration']): run for run in base['runs']}
+    regressions = 0
+    print(f"{'并行':>4} {'片段':>5} {'基线(s)':>9} {'本次(s)':>9} {'变化':>8}  阶段变化")
+    for run in new['runs']:
+        key = (run['parallel'], run['segment_duration'])
+        if key not in base_runs:
+            continue
+        base_run = base_runs[key]
+        change = run['wall_time'] / base_run['wall_time'] - 1 if base_run['wall_time'] > 0 else 0.0
+        if change > args.threshold:
+            flag = "❌ 退化"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "✅ 提升"
+        else:
+            flag = ""
+        phase_changes = []
+        for phase, seconds in sorted(run.get('phases', {}).items()):
+            base_seconds = base_run.get('phases', {}).get(phase)
+            if base_seconds:
+                phase_changes.append(f"{phase} {seconds / base_seconds - 1:+.0%}")
+        print(f"{key[0]:>4} {key[1]:>4}s {base_run['wall_time']:>9.2f} {run['wall_time']:>9.2f} "
+              f"{change:>+8.1%}  {', '.join(phase_changes)} {flag}")
+
+    if regressions:
+        print(f"❌ {regressions} 个配置变慢超过 {args.threshold:.0%}")
+        return 1
+    print("✅ 未发现性能退化")
+    return 0
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="M3U8 批量转换性能基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="生成测试视频并运行基准")
+    run_parser.add_argument("-o", "--output", default="benchmark_results.json", help="结果 JSON 文件")
+    run_parser.add_argument("--workdir", default="benchmark_work", help="测试视频与输出的工作目录")
+    run_parser.add_argument("--durations", default="10,60", help="测试视频时长（秒），逗号分隔")
+    run_parser.add_argument("--bitrates", default="2M,6M", help="视频码率，逗号分隔")
+    run_parser.add_argument("--gops", default="2,8", help="GOP 长度（秒），逗号分隔")
+    run_parser.add_argument("--containers", default="mp4,mkv", help="容器格式，逗号分隔")
+    run_parser.add_argument("--parallel", default="1,2,4", help="并行任务数，逗号分隔")
+    run_parser.add_argument("--segments", default="4,10", help="片段时长（秒），逗号分隔")
+    run_parser.add_argument("--output-mode", default="ts", help="输出格式，默认 ts")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每个配置重复次数（取中位数），默认 3")
+    run_parser.add_argument("--regenerate", action="store_true", help="重新生成测试视频")
+    run_parser.add_argument("--http", action="store_true",
+                            help="由本机 http.server 提供测试视频，ffmpeg 直接读取 URL 输入")
+    run_parser.add_argument("--max-per-host", type=int, default=0,
+                            help="--http 时同一主机同时转换的输入数上限，默认 0（不限制）")
+    run_parser.add_argument("--ffmpeg", help="ffmpeg 可执行文件路径，默认自动查找")
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次基准结果")
+    compare_parser.add_argument("base", help="基线结果 JSON")
+    compare_parser.add_argument("new", help="本次结果 JSON")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="墙钟时间变慢超过该比例视为退化，默认 0.10")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "run":
+        return run_benchmark(args)
+    return compare_results(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,737 +1,6006 @@
 import os
+import re
 import sys
+import glob
+import json
+import fnmatch
+import hashlib
+import heapq
+import hmac
+import itertools
+import math
+import queue
+import secrets
+import select
+import time
+import argparse
+import asyncio
+import contextlib
+import functools
+import shutil
+import signal
+import socket
+import sqlite3
+import struct
 import subprocess
 import threading
+import urllib.error
+import urllib.parse
+import urllib.request
 from pathlib import Path
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import concurrent.futures
+from collections import deque
+
+# tkinter 仅在图形界面模式下按需导入，命令行模式无需加载
+tk = ttk = filedialog = messagebox = simpledialog = ScrolledText = None
+
+AUTO_MAX_PARALLEL = 16
+
+# 界面刷新节拍与日志保留行数
+UI_TICK_MS = 100
+UI_TICK_BUDGET = 0.05
+LOG_MAX_LINES = 5000
+# 批量导入时每个节拍插入列表的行数
+INSERT_CHUNK_SIZE = 500
+
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.ts', '.m2ts'}
+
+
+def load_tkinter():
+    """按需导入 tkinter"""
+    global tk, ttk, filedialog, messagebox, simpledialog, ScrolledText
+    try:
+        import tkinter as tk
+        from tkinter import ttk, filedialog, messagebox, simpledialog
+        from tkinter.scrolledtext import ScrolledText
+    except ImportError:
+        print("请安装 tkinter 库")
+        sys.exit(1)
+
+
+def hide_console_window():
+    """隐藏控制台窗口（仅 Windows 图形界面模式）"""
+    if sys.platform == "win32":
+        import ctypes
+        whnd = ctypes.windll.kernel32.GetConsoleWindow()
+        if whnd != 0:
+            ctypes.windll.user32.ShowWindow(whnd, 0)
+
+
+def hidden_subprocess_kwargs():
+    """返回隐藏子进程窗口所需的参数，非 Windows 平台返回空字典"""
+    if sys.platform != "win32":
+        return {}
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo.wShowWindow = 0
+    return {"startupinfo": startupinfo, "creationflags": subprocess.CREATE_NO_WINDOW}
+
+
+def split_patterns(text):
+    """拆分以分号或逗号分隔的列表（通配符、码率阶梯等）"""
+    return [pattern.strip() for pattern in re.split(r"[;,]", text or "") if pattern.strip()]
+
+
+def format_file_size(size_bytes):
+    """格式化文件大小"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+
+def parse_ffmpeg_time(value):
+    """将 ffmpeg 的 HH:MM:SS.xx 时间字符串转换为秒，无法解析时返回 None"""
+    match = re.match(r"(-?\d+):(\d+):(\d+(?:\.\d+)?)", value.strip())
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_eta(seconds):
+    """格式化剩余时间"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+SOURCE_URL_SCHEMES = ('http', 'https')
+GENERIC_SOURCE_NAMES = {'index', 'master', 'playlist', 'prog_index', 'main', 'stream', 'video'}
+NETWORK_DEFAULTS = {
+    'reconnect_delay_max': 30,  # 断线重连的最长等待（秒）
+    'rw_timeout': 30.0,  # 单次网络读写超时（秒）
+    'read_ahead': True  # 预读：HLS 源并行预取下一个片段，单文件源经 async 协议在独立线程中读取
+}
+NETWORK_MAX_PER_HOST = 4
+HOST_SLOT_POLL_SECONDS = 0.2
+
+
+def is_source_url(path):
+    """输入是否为 ffmpeg 直接读取的 HTTP(S) 地址（单文件或 HLS 播放列表）"""
+    return urllib.parse.urlsplit(str(path)).scheme.lower() in SOURCE_URL_SCHEMES
+
+
+def source_host(path):
+    """URL 输入的主机（含端口），本地文件返回 None"""
+    return urllib.parse.urlsplit(path).netloc.lower() if is_source_url(path) else None
+
+
+def source_name(path):
+    """输入的显示名称：本地文件为文件名，URL 为路径最后一段（没有路径时为主机名）"""
+    if not is_source_url(path):
+        return Path(path).name
+    parts = urllib.parse.urlsplit(path)
+    return urllib.parse.unquote(parts.path.rstrip('/').rsplit('/', 1)[-1]) or parts.netloc
+
+
+def source_stem(path):
+    """输出名称：本地文件为文件名主干；URL 取最后一段的主干，
+    index.m3u8、master.m3u8 这类通用名改用上一级目录名"""
+    if not is_source_url(path):
+        return Path(path).stem
+    parts = urllib.parse.urlsplit(path)
+    segments = [urllib.parse.unquote(segment) for segment in parts.path.split('/') if segment]
+    stem = Path(segments[-1]).stem if segments else ""
+    if stem.lower() in GENERIC_SOURCE_NAMES and len(segments) > 1:
+        stem = segments[-2]
+    stem = re.sub(r'[\\/:*?"<>|]+', '_', stem).strip(' .')
+    return stem or re.sub(r'[^\w.-]+', '_', parts.netloc)
+
+
+def source_size(path, default=0):
+    """本地输入的文件大小；URL 输入不发起请求，返回 default（如 ffprobe 探测到的大小）"""
+    if is_source_url(path):
+        return default
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return default
+
+
+def network_input(url, network=None):
+    """URL 输入的 ffmpeg 参数，返回 (加在 -i 之前的选项, -i 的值)
+    
+    ffmpeg 边下载边复用切片，不需要先把整个文件下载到本地；断线时按 reconnect 选项重连。
+    """
+    network = dict(NETWORK_DEFAULTS, **(network or {}))
+    args = ["-reconnect", "1", "-reconnect_streamed", "1",
+            "-reconnect_delay_max", str(int(network['reconnect_delay_max'])),
+            "-rw_timeout", str(int(network['rw_timeout'] * 1000000))]
+    if urllib.parse.urlsplit(url).path.lower().endswith('.m3u8'):
+        args += ["-http_persistent", "1"]
+        if network['read_ahead']:
+            args += ["-http_multiple", "1"]
+        return args, url
+    if network['read_ahead']:
+        return args, "async:" + url
+    return args, url
+
+
+class HostConnectionLimiter:
+    """按主机限制同时转换的 URL 输入数，避免同一源站连接过多而被限速或拒绝
+    
+    本地文件不受限制；limit 为 0 表示不限制。同步与异步引擎共用同一份计数。
+    """
+    
+    def __init__(self, limit=NETWORK_MAX_PER_HOST):
+        self.limit = limit
+        self.active = {}  # 主机 -> 运行中的任务数
+        self.condition = threading.Condition()
+    
+    def try_acquire(self, host):
+        with self.condition:
+            if self.limit and self.active.get(host, 0) >= self.limit:
+                return False
+            self.active[host] = self.active.get(host, 0) + 1
+            return True
+    
+    def release(self, host):
+        with self.condition:
+            self.active[host] -= 1
+            if not self.active[host]:
+                del self.active[host]
+            self.condition.notify_all()
+    
+    @contextlib.contextmanager
+    def slot(self, path, converter=None, on_wait=None):
+        """占用输入所在主机的一个名额，yield 是否成功（等待期间转换器被停止时为 False）
+        
+        需要等待时调用一次 on_wait(主机)。
+        """
+        host = source_host(path)
+        acquired = host is None or self.try_acquire(host)
+        if not acquired and on_wait:
+            on_wait(host)
+        while not acquired and not (converter and converter.stop_requested):
+            with self.condition:
+                acquired = self.try_acquire(host)
+                if not acquired:
+                    self.condition.wait(HOST_SLOT_POLL_SECONDS)
+        try:
+            yield acquired
+        finally:
+            if acquired and host is not None:
+                self.release(host)
+    
+    @contextlib.asynccontextmanager
+    async def slot_async(self, path, converter=None, on_wait=None):
+        """slot 的协程版本，等待时不占用线程"""
+        host = source_host(path)
+        acquired = host is None or self.try_acquire(host)
+        if not acquired and on_wait:
+            on_wait(host)
+        while not acquired and not (converter and converter.stop_requested):
+            await asyncio.sleep(HOST_SLOT_POLL_SECONDS)
+            acquired = self.try_acquire(host)
+        try:
+            yield acquired
+        finally:
+            if acquired and host is not None:
+                self.release(host)
+
+
+host_connections = HostConnectionLimiter()
+
+
+FFMPEG_TAIL_LINES = 20
+FFMPEG_LINE_MAX = 300  # 错误尾部每行保留的最大字符数
+
+# 失败分类（按优先级排列）：匹配 ffmpeg 输出的特征行，fixes 为依次尝试的自动修复
+FAILURE_CATEGORIES = {
+    'disk_full': {
+        'label': "磁盘空间不足",
+        'pattern': re.compile(r"No space left on device|Disk quota exceeded"),
+        'fixes': ()
+    },
+    'permission': {
+        'label': "没有读写权限",
+        'pattern': re.compile(r"Permission denied|Read-only file system|Server returned 40[13]|HTTP error 40[13]"),
+        'fixes': ()
+    },
+    'missing_input': {
+        'label': "输入文件不存在",
+        'pattern': re.compile(r"No such file or directory|Server returned 404|HTTP error 404"),
+        'fixes': ()
+    },
+    'network': {
+        'label': "网络连接中断",
+        'pattern': re.compile(r"Connection (?:refused|timed out|reset by peer)|Failed to resolve hostname"
+                              r"|Name or service not known|Network is unreachable|Server returned 5\d\d"
+                              r"|HTTP error 5\d\d"),
+        'fixes': ('reconnect',)
+    },
+    'bitstream': {
+        'label': "码流格式与输出容器不匹配",
+        'pattern': re.compile(r"bitstream malformed|use the (?:video|audio) bitstream filter|Malformed AAC bitstream"),
+        'fixes': ('bitstream_filter', 'transcode')
+    },
+    'unsupported_codec': {
+        'label': "编码不受输出容器支持",
+        'pattern': re.compile(r"Could not find tag for codec|codec not currently supported in container"),
+        'fixes': ('reencode_streams', 'transcode')
+    },
+    'broken_container': {
+        # 容器索引缺失或头部损坏时 ffmpeg 无法打开文件，丢弃数据或转码都无济于事
+        'label': "容器结构损坏",
+        'pattern': re.compile(r"moov atom not found|EBML header parsing failed"),
+        'fixes': ()
+    },
+    'corrupt_input': {
+        'label': "输入文件损坏",
+        'pattern': re.compile(r"Invalid data found when processing input|Invalid NAL unit|[Cc]orrupt (?:input|packet|frame)"
+                              r"|[Ee]rror while decoding|Truncating packet"),
+        'fixes': ('ignore_errors', 'transcode')
+    },
+    'timeout': {
+        'label': "超时或卡死",
+        'pattern': None,  # 由异步引擎按时限判定
+        'fixes': ()
+    },
+    'timestamps': {
+        'label': "时间戳不单调",
+        'pattern': re.compile(r"[Nn]on-monoton\w* DTS|DTS \d+, next:\d+ st:\d+ invalid|pts has no value"),
+        'fixes': ('regen_timestamps', 'transcode')
+    },
+}
+FALLBACK_FIXES = {
+    'reconnect': "重新连接（关闭预读）",
+    'bitstream_filter': "码流过滤器",
+    'reencode_streams': "仅重编码不兼容的流",
+    'regen_timestamps': "重新生成时间戳",
+    'ignore_errors': "丢弃损坏数据",
+    'transcode': "完整转码",
+}
+FALLBACK_MAX_RETRIES = 3
+FFMPEG_STALL_TIMEOUT = 300.0  # 异步引擎中 ffmpeg 无任何输出超过该秒数视为卡死
+FALLBACK_TRANSCODE_PRESET = 'fast'
+
+
+def classify_failure(matches):
+    """按优先级从已匹配的特征行中选出失败类别，未匹配任何类别时返回 'unknown'"""
+    return next((name for name in FAILURE_CATEGORIES if name in matches), 'unknown')
+
+
+def describe_failure(category):
+    return FAILURE_CATEGORIES[category]['label'] if category in FAILURE_CATEGORIES else "未知错误"
+
+
+class FFmpegProgressParser:
+    """逐行解析 ffmpeg -progress 输出，内存占用与文件时长无关
+    
+    非进度行只保留最近 tail_lines 行（每行截断到 FFMPEG_LINE_MAX 字符），
+    并记录每个失败类别首次匹配到的行，供失败分类使用。
+    """
+    
+    DURATION_RE = re.compile(r"Duration:\s*(\d+:\d+:\d+(?:\.\d+)?)")
+    
+    def __init__(self, duration=None, tail_lines=FFMPEG_TAIL_LINES, offset=0.0):
+        self.duration = duration
+        self.offset = offset
+        self.values = {}
+        self.tail = deque(maxlen=tail_lines)
+        self.failure_lines = {}  # 失败类别 -> 首次匹配的行
+        self.start_time = time.perf_counter()
+    
+    def feed(self, line):
+        """处理一行输出，完成一组进度数据时返回进度字典，否则返回 None"""
+        line = line.strip()
+        if not line:
+            return None
+        
+        key, sep, value = line.partition("=")
+        if not sep or " " in key:
+            # 非进度行：保留最近若干行用于错误报告，并从中提取输入时长
+            line = line[:FFMPEG_LINE_MAX]
+            self.tail.append(line)
+            for name, category in FAILURE_CATEGORIES.items():
+                if (name not in self.failure_lines and category['pattern']
+                        and category['pattern'].search(line)):
+                    self.failure_lines[name] = line
+            if self.duration is None:
+                match = self.DURATION_RE.search(line)
+                if match:
+                    self.duration = parse_ffmpeg_time(match.group(1))
+            return None
+        
+        self.values[key] = value.strip()
+        if key == "progress":
+            return self.snapshot()
+        return None
+    
+    def snapshot(self):
+        """根据当前数据计算百分比、速度与剩余时间"""
+        out_time = None
+        for key in ("out_time_us", "out_time_ms"):
+            raw = self.values.get(key, "")
+            if raw.lstrip("-").isdigit():
+                out_time = max(0, int(raw)) / 1_000_000
+                break
+        if out_time is None and "out_time" in self.values:
+            out_time = parse_ffmpeg_time(self.values["out_time"])
+        if out_time is not None:
+            # 续转时 ffmpeg 从断点开始计时，需加上已完成部分
+            out_time += self.offset
+        
+        speed = None
+        raw_speed = self.values.get("speed", "").rstrip("x").strip()
+        try:
+            speed = float(raw_speed)
+        except ValueError:
+            pass
+        
+        total_size = None
+        raw_size = self.values.get("total_size", "")
+        if raw_size.isdigit():
+            total_size = int(raw_size)
+        
+        finished = self.values.get("progress") == "end"
+        percent = None
+        eta = None
+        if finished:
+            percent = 100.0
+            eta = 0
+        elif self.duration and out_time is not None:
+            percent = min(100.0, out_time / self.duration * 100)
+            if speed:
+                eta = max(0.0, (self.duration - out_time) / speed)
+        
+        return {
+            'percent': percent,
+            'out_time': out_time,
+            'duration': self.duration,
+            'speed': speed,
+            'eta': eta,
+            'total_size': total_size,
+            'finished': finished
+        }
+
+
+def parse_media_playlist(text):
+    """解析媒体播放列表，返回 {'segments', 'maps', 'target_duration', 'ended'}
+    
+    segments 为 {'duration', 'uri', 'offset', 'length', 'line'} 列表，未使用字节范围时
+    offset/length 为 None，line 为片段 URI 所在的行号（从 0 开始）；
+    maps 为 #EXT-X-MAP 引用的初始化片段 URI。续转与输出校验共用此解析。
+    """
+    playlist = {'segments': [], 'maps': [], 'target_duration': None, 'ended': False}
+    duration = None
+    byte_range = None
+    range_end = {}
+    for line_number, line in enumerate(text.splitlines()):
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            try:
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            except ValueError:
+                duration = 0.0
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            length, _, offset = line[len("#EXT-X-BYTERANGE:"):].partition("@")
+            try:
+                byte_range = (int(length), int(offset) if offset else None)
+            except ValueError:
+                byte_range = (0, None)
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            try:
+                playlist['target_duration'] = int(line.split(":", 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith("#EXT-X-MAP:"):
+            match = re.search(r'URI="([^"]+)"', line)
+            if match:
+                playlist['maps'].append(match.group(1))
+        elif line == "#EXT-X-ENDLIST":
+            playlist['ended'] = True
+        elif line and not line.startswith("#") and duration is not None:
+            segment = {'duration': duration, 'uri': line, 'offset': None, 'length': None, 'line': line_number}
+            if byte_range:
+                length, offset = byte_range
+                # 省略偏移时紧接同一文件的上一个子范围
+                offset = range_end.get(line, 0) if offset is None else offset
+                segment['offset'], segment['length'] = offset, length
+                range_end[line] = offset + length
+            playlist['segments'].append(segment)
+            duration = None
+            byte_range = None
+    return playlist
+
+
+TS_PACKET_SIZE = 188
+# 续转起点与关键帧时间的最大允许偏差（秒），小于常见帧间隔的一半
+RESUME_KEYFRAME_TOLERANCE = 0.01
+
+
+def is_complete_ts_segment(segment_file):
+    """检查 TS 片段是否完整：大小为 188 字节整数倍且首尾包同步字节正确"""
+    try:
+        size = os.path.getsize(segment_file)
+        if size == 0 or size % TS_PACKET_SIZE:
+            return False
+        with open(segment_file, 'rb') as f:
+            first = f.read(1)
+            f.seek(size - TS_PACKET_SIZE)
+            last = f.read(1)
+        return first == b"\x47" and last == b"\x47"
+    except OSError:
+        return False
+
+
+def is_keyframe_time(keyframes, offset, tolerance=RESUME_KEYFRAME_TOLERANCE):
+    """offset（相对第一个关键帧的秒数）处是否恰好有关键帧"""
+    if not keyframes:
+        return False
+    origin = keyframes[0]
+    return any(abs(keyframe - origin - offset) <= tolerance for keyframe in keyframes)
+
+
+def copies_video(transcode=None, codec_args=None):
+    """按转换参数判断视频流是否直接复制（codec_args 中同一流的后一个编码选项生效）"""
+    if transcode:
+        return False
+    args = list(codec_args or ["-c", "copy"])
+    codec = None
+    for option, value in zip(args, args[1:]):
+        if option in ("-c", "-c:v", "-codec", "-codec:v", "-vcodec"):
+            codec = value
+    return codec in (None, "copy")
+
+
+def format_progress(progress):
+    """将进度字典格式化为简短状态文本"""
+    parts = []
+    if progress.get('percent') is not None:
+        parts.append(f"{progress['percent']:.0f}%")
+    if progress.get('speed'):
+        parts.append(f"{progress['speed']:.1f}x")
+    if progress.get('eta') is not None:
+        parts.append(f"ETA {format_eta(progress['eta'])}")
+    return " ".join(parts) if parts else "转换中"
+
+
+def parse_abr_ladder(text):
+    """解析码率阶梯，格式为 "高度:码率,..."，如 "720:2800k,480:1400k"
+    
+    返回按高度降序排列的 [{'name', 'height', 'bitrate_kbps'}, ...]，格式错误时抛出 ValueError。
+    """
+    ladder = []
+    for rung in split_patterns(text):
+        height, sep, bitrate = rung.partition(":")
+        bitrate = bitrate.strip().lower().rstrip("k")
+        if not sep or not height.strip().isdigit() or not bitrate.isdigit():
+            raise ValueError(f"无效的码率阶梯: {rung}")
+        ladder.append({'name': f"{int(height)}p", 'height': int(height), 'bitrate_kbps': int(bitrate)})
+    return sorted(ladder, key=lambda rung: rung['height'], reverse=True)
+
+
+def format_abr_ladder(ladder):
+    """码率阶梯转回文本形式"""
+    return ",".join(f"{rung['height']}:{rung['bitrate_kbps']}k" for rung in ladder)
+
+
+# 软件转码预设（libx264 视频 + AAC 音频）
+TRANSCODE_PRESETS = {
+    'fast': {'preset': 'veryfast', 'crf': 23},
+    'balanced': {'preset': 'medium', 'crf': 21},
+    'quality': {'preset': 'slow', 'crf': 19},
+}
+TRANSCODE_AUDIO_BITRATE = "128k"
+
+
+def plan_thread_budget(parallel_jobs, cpu_count=None):
+    """在并行的 ffmpeg 进程之间平均分配 CPU 线程，每个任务至少 1 个线程"""
+    cpus = cpu_count or os.cpu_count() or 1
+    jobs = max(1, parallel_jobs)
+    threads = max(1, cpus // jobs)
+    return {'cpus': cpus, 'jobs': jobs, 'threads': threads, 'total': jobs * threads}
+
+
+def describe_thread_plan(plan):
+    """生成线程预算的日志文本"""
+    text = (f"🧮 线程预算: {plan['cpus']} 核 → {plan['jobs']} 个任务 × {plan['threads']} 线程 "
+            f"= {plan['total']} 线程")
+    if plan['total'] > plan['cpus']:
+        text += "（并行数超过核数，每任务最少 1 线程）"
+    return text
+
+
+def task_needs_encoding(task):
+    return bool(task.get('transcode') or task.get('abr_ladder'))
+
+
+OUTPUT_MODES = {
+    'ts': "TS 片段",
+    'fmp4': "fMP4 片段 (CMAF)",
+    'single': "单文件 TS (字节范围)",
+    'fmp4_single': "单文件 fMP4 (字节范围)",
+}
+
+
+def hls_output_args(output_mode, output_path, base_name, number_width=3):
+    """按输出模式生成片段命名相关的 ffmpeg 参数，base_name 可包含 %v（多码率）"""
+    fmp4 = output_mode in ('fmp4', 'fmp4_single')
+    args = []
+    hls_flags = []
+    if fmp4:
+        args += ["-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", f"{base_name}_init.mp4"]
+    if output_mode in ('single', 'fmp4_single'):
+        # 全部片段写入同一个文件，播放列表以 #EXT-X-BYTERANGE 引用
+        hls_flags.append("single_file")
+        segment_file = output_path / f"{base_name}.{'mp4' if fmp4 else 'ts'}"
+    else:
+        segment_file = output_path / f"{base_name}_%0{number_width}d.{'m4s' if fmp4 else 'ts'}"
+    args += ["-hls_segment_filename", str(segment_file)]
+    return args, hls_flags
+
+
+def segment_number_width(duration, segment_duration):
+    """片段序号位数：至少 3 位，预计片段数更多时加宽，保证文件名按字典序排列"""
+    if not duration or not segment_duration:
+        return 3
+    return max(3, len(str(int(duration / float(segment_duration)) + 1)))
+
+
+VERIFY_DURATION_TOLERANCE = 0.01
+VERIFY_MIN_TOLERANCE = 2.0
+VERIFY_HEADER_SAMPLES = 3
+MP4_BOX_TYPES = {b"ftyp", b"styp", b"moof", b"moov", b"sidx", b"free"}
+
+
+def check_segment_header(segment_file, offset=0):
+    """读取片段开头，判断是否为可识别的 TS（同步字节）或 MP4（box 类型）数据"""
+    try:
+        with open(segment_file, 'rb') as f:
+            f.seek(offset or 0)
+            head = f.read(TS_PACKET_SIZE + 1)
+    except OSError:
+        return False
+    if head[:1] == b"\x47" and (len(head) <= TS_PACKET_SIZE or head[TS_PACKET_SIZE:TS_PACKET_SIZE + 1] == b"\x47"):
+        return True
+    return head[4:8] in MP4_BOX_TYPES
+
+
+def pick_samples(items, count):
+    """在列表中均匀抽取 count 个元素（含首尾）"""
+    if count <= 0 or not items:
+        return []
+    if count >= len(items):
+        return list(items)
+    if count == 1:
+        return [items[0]]
+    step = (len(items) - 1) / float(count - 1)
+    return [items[round(i * step)] for i in range(count)]
+
+
+class PlaylistVerifier:
+    """按播放列表校验 HLS 输出
+    
+    只检查播放列表实际引用的文件，不会被上一次运行残留的片段干扰：
+    文件存在且大小合理、抽样片段的头部可识别、片段时长不超过 TARGETDURATION。
+    总时长与输入时长超出容差只记为警告：音频起始偏移、最后一个 GOP 较短等
+    正常输入也会出现偏差，不应让已完成的转换失败。probe_samples 大于 0 且提供了转换器时，
+    另外用 ffprobe 并行探测抽样片段能否解析出流。
+    """
+    
+    def __init__(self, converter=None, header_samples=VERIFY_HEADER_SAMPLES, probe_samples=0, workers=8,
+                 tolerance=VERIFY_DURATION_TOLERANCE):
+        self.converter = converter
+        self.header_samples = header_samples
+        self.probe_samples = probe_samples if converter else 0
+        self.workers = max(1, workers)
+        self.tolerance = tolerance
+    
+    def verify(self, m3u8_file, expected_duration=None, follow_variants=True, parallel=True):
+        """校验单个播放列表，返回结果字典
+        
+        结果包含 playlist、ok、segments（片段数）、files（引用的文件数）、bytes（引用文件总大小）、
+        duration（播放列表总时长）、variants（主播放列表的码率数）、problems（问题列表，
+        任一问题即不通过）与 warnings（不影响通过的提示）。
+        follow_variants 为 False 时主播放列表只检查各路播放列表是否存在。
+        """
+        m3u8_file = Path(m3u8_file)
+        result = {'playlist': str(m3u8_file), 'ok': False, 'segments': 0, 'files': 0, 'bytes': 0,
+                  'duration': 0.0, 'variants': 0, 'problems': [], 'warnings': []}
+        try:
+            text = m3u8_file.read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            result['problems'].append(f"无法读取播放列表: {m3u8_file.name}")
+            return result
+        
+        if "#EXT-X-STREAM-INF" in text:
+            self.verify_master(m3u8_file, text, result, expected_duration, follow_variants, parallel)
+        else:
+            self.verify_media(m3u8_file, text, result, expected_duration, parallel)
+        result['ok'] = not result['problems']
+        return result
+    
+    def verify_master(self, m3u8_file, text, result, expected_duration, follow_variants, parallel):
+        variants = [line.strip() for line in text.splitlines()
+                    if line.strip() and not line.startswith("#")]
+        result['variants'] = len(variants)
+        if not variants:
+            result['problems'].append("主播放列表没有任何码率")
+        for variant in variants:
+            variant_file = m3u8_file.parent / variant
+            if not follow_variants:
+                if not variant_file.is_file():
+                    result['problems'].append(f"缺少码率播放列表: {variant}")
+                continue
+            variant_result = self.verify(variant_file, expected_duration, parallel=parallel)
+            result['segments'] += variant_result['segments']
+            result['files'] += variant_result['files']
+            result['bytes'] += variant_result['bytes']
+            result['duration'] = max(result['duration'], variant_result['duration'])
+            result['problems'].extend(f"{variant}: {problem}" for problem in variant_result['problems'])
+            result['warnings'].extend(f"{variant}: {warning}" for warning in variant_result['warnings'])
+    
+    def verify_media(self, m3u8_file, text, result, expected_duration, parallel):
+        problems = result['problems']
+        base_dir = m3u8_file.parent
+        playlist = parse_media_playlist(text)
+        segments = playlist['segments']
+        result['segments'] = len(segments)
+        result['duration'] = sum(segment['duration'] for segment in segments)
+        
+        if not playlist['ended']:
+            problems.append("播放列表未结束（转换可能被中断）")
+        if not segments:
+            problems.append("播放列表没有片段")
+            return
+        
+        # 每个引用的文件只 stat 一次；字节范围输出要求文件覆盖到最后一个子范围
+        required_size = {}
+        for segment in segments:
+            end = (segment['offset'] + segment['length']) if segment['length'] is not None else 1
+            required_size[segment['uri']] = max(required_size.get(segment['uri'], 0), end)
+        for uri in playlist['maps']:
+            required_size.setdefault(uri, 1)
+        result['files'] = len(required_size)
+        for uri, required in required_size.items():
+            try:
+                size = os.path.getsize(base_dir / uri)
+            except OSError:
+                problems.append(f"缺少片段文件: {uri}")
+                continue
+            result['bytes'] += size
+            if size < required:
+                problems.append(f"片段文件过小: {uri} ({size} < {required} 字节)")
+            elif uri.lower().endswith(".ts") and size % TS_PACKET_SIZE:
+                problems.append(f"TS 片段不完整: {uri}（大小不是 {TS_PACKET_SIZE} 字节整数倍）")
+        if problems:
+            return
+        
+        target = playlist['target_duration']
+        if target:
+            too_long = [segment['uri'] for segment in segments if round(segment['duration']) > target]
+            if too_long:
+                problems.append(f"{len(too_long)} 个片段时长超过 TARGETDURATION {target}s: {too_long[0]}")
+        
+        if expected_duration:
+            allowed = max(VERIFY_MIN_TOLERANCE, expected_duration * self.tolerance)
+            if abs(result['duration'] - expected_duration) > allowed:
+                result['warnings'].append(f"播放列表总时长 {result['duration']:.1f}s 与输入时长 "
+                                          f"{expected_duration:.1f}s 不一致")
+        
+        checks = [(self.check_header, segment) for segment in pick_samples(segments, self.header_samples)]
+        if self.probe_samples:
+            # 字节范围或 fMP4 片段无法单独解析，改为通过播放列表探测
+            if playlist['maps'] or segments[0]['length'] is not None:
+                checks.append((self.probe_playlist, m3u8_file))
+            else:
+                checks += [(self.probe_segment, segment)
+                           for segment in pick_samples(segments, self.probe_samples)]
+        
+        def run_check(check):
+            function, target_item = check
+            return function(base_dir, target_item)
+        
+        if parallel and len(checks) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.workers, len(checks))) as executor:
+                outcomes = list(executor.map(run_check, checks))
+        else:
+            outcomes = [run_check(check) for check in checks]
+        problems.extend(problem for problem in outcomes if problem)
+    
+    def check_header(self, base_dir, segment):
+        if not check_segment_header(base_dir / segment['uri'], segment['offset']):
+            return f"片段头部无法识别: {segment['uri']}"
+        return None
+    
+    def probe_segment(self, base_dir, segment):
+        if not self.converter.probe_streams(base_dir / segment['uri']):
+            return f"ffprobe 无法解析片段: {segment['uri']}"
+        return None
+    
+    def probe_playlist(self, base_dir, m3u8_file):
+        if not self.converter.probe_streams(m3u8_file):
+            return f"ffprobe 无法解析播放列表: {m3u8_file.name}"
+        return None
+    
+    def verify_many(self, playlists, on_result=None):
+        """并行校验多个播放列表（每个只检查自身，不展开主播放列表），返回结果列表"""
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.verify, playlist, None, False, False) for playlist in playlists]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        return results
+
+
+class OutputNamer:
+    """为一批输入分配互不冲突的输出名称
+    
+    递归扫描时不同子目录中的同名文件、最后一段（或 index.m3u8 的上一级目录）相同的
+    URL 会映射到同一个输出目录，并行转换时互相覆盖播放列表、片段和续传状态。
+    第一个输入沿用文件名主干，之后重名的输入追加由完整路径（URL）计算的短哈希；
+    同一输入重复分配得到相同名称。
+    """
+    
+    def __init__(self):
+        self.names = {}
+        self.owners = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def source_key(path):
+        # URL 路径区分大小写，也不能按本地路径规范化
+        return path if is_source_url(path) else os.path.normcase(os.path.abspath(path))
+    
+    def reserve(self, path, name):
+        """登记已确定的名称（如恢复的任务沿用的名称），之后分配的名称不会与其重复"""
+        key = self.source_key(path)
+        with self.lock:
+            self.owners[name.casefold()] = key
+            self.names[key] = name
+    
+    def name_for(self, path):
+        key = self.source_key(path)
+        with self.lock:
+            if key in self.names:
+                return self.names[key]
+            name = source_stem(path)
+            # Windows 文件系统不区分大小写，按 casefold 判断是否重名
+            if self.owners.get(name.casefold(), key) != key:
+                name = f"{name}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+            self.owners[name.casefold()] = key
+            self.names[key] = name
+            return name
+
+
+def make_conversion_task(file_path, output_path, segment_duration, item=None, abr_ladder=None,
+                         transcode=None, gop_plan='off', output_mode='ts', network=None, output_name=None):
+    """构建单个转换任务字典（界面与命令行共用）
+    
+    file_path 也可以是 HTTP(S) 地址，此时 network 覆盖 NETWORK_DEFAULTS 中的网络设置。
+    output_name 为输出目录与播放列表名称，默认取输入的文件名主干；
+    一批任务应通过同一个 OutputNamer 分配，避免重名输入写入同一目录。
+    """
+    stem = output_name or source_stem(file_path)
+    task = {
+        'file_path': file_path,
+        'output_dir': str(Path(output_path) / stem),
+        'segment_duration': segment_duration,
+        'output_filename': stem,
+        'output_mode': output_mode,
+        'abr_ladder': abr_ladder,
+        'transcode': transcode,
+        'gop_plan': gop_plan
+    }
+    if is_source_url(file_path):
+        task['network'] = dict(NETWORK_DEFAULTS, **(network or {}))
+    if item is not None:
+        task['item'] = item
+    return task
+
+
+SCHEDULE_MODES = {'fifo': "列表顺序", 'lpt': "最长优先"}
+
+
+def simulate_makespan(costs, workers):
+    """按给定顺序把任务贪心分配给最早空闲的工作线程，返回总完工时间"""
+    if not costs:
+        return 0.0
+    loads = [0.0] * max(1, min(workers, len(costs)))
+    for cost in costs:
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
+
+
+def estimate_task_costs(tasks):
+    """估算任务开销：流复制以读写字节数为主，缺少大小时按中位码率由时长推算"""
+    rates = sorted(task['size'] / task['duration'] for task in tasks
+                   if task.get('size') and task.get('duration'))
+    median_rate = rates[len(rates) // 2] if rates else 0
+    for task in tasks:
+        if task.get('size'):
+            task['cost'] = float(task['size'])
+        elif task.get('duration') and median_rate:
+            task['cost'] = task['duration'] * median_rate
+        else:
+            task['cost'] = 0.0
+
+
+def plan_longest_first(tasks, workers, converter, probe_workers=8):
+    """探测输入时长与大小并按开销降序（LPT）排列任务
+    
+    返回 (排序后的任务列表, 调度计划)，计划中记录两种顺序下的预计负载。
+    """
+    def probe(task):
+        info = converter.probe_media(task['file_path'])
+        task['duration'] = info.get('duration')
+        task['size'] = info.get('size')
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=probe_workers) as executor:
+        list(executor.map(probe, tasks))
+    
+    estimate_task_costs(tasks)
+    for index, task in enumerate(tasks):
+        task['source_index'] = index
+    ordered = sorted(tasks, key=lambda task: task['cost'], reverse=True)
+    plan = {
+        'workers': workers,
+        'lpt_load': simulate_makespan([task['cost'] for task in ordered], workers),
+        'fifo_load': simulate_makespan([task['cost'] for task in tasks], workers)
+    }
+    return ordered, plan
+
+
+def describe_schedule_plan(plan):
+    """生成调度计划的日志文本"""
+    if not plan['fifo_load']:
+        return "🗓️ 最长优先调度: 无法估算任务开销"
+    gain = (1 - plan['lpt_load'] / plan['fifo_load']) * 100
+    return f"🗓️ 最长优先调度: 预计完工时间比列表顺序缩短 {gain:.1f}%"
+
+
+def describe_schedule_result(plan, tasks, actual_makespan):
+    """按实测吞吐校准预测值，生成预测与实际完工时间的对比文本"""
+    measured = [task for task in tasks if task.get('elapsed') and task.get('cost')]
+    total_elapsed = sum(task['elapsed'] for task in measured)
+    if not measured or not total_elapsed:
+        return f"🗓️ 实际完工 {actual_makespan:.1f}s（无可用于校准的任务开销）"
+    rate = sum(task['cost'] for task in measured) / total_elapsed
+    predicted = plan['lpt_load'] / rate
+    fifo_predicted = plan['fifo_load'] / rate
+    return (f"🗓️ 调度评估: 预测完工 {predicted:.1f}s, 实际 {actual_makespan:.1f}s, "
+            f"列表顺序预计 {fifo_predicted:.1f}s")
+
+
+CACHE_FILENAME = ".m3u8_cache.json"
+
+
+def conversion_settings(task):
+    """影响输出结果的转换参数，任一变化都需要重新转换"""
+    return {
+        'segment_duration': task['segment_duration'],
+        'output_mode': task.get('output_mode', 'ts'),
+        'abr_ladder': format_abr_ladder(task.get('abr_ladder') or []),
+        'transcode': task.get('transcode'),
+        'gop_plan': task.get('gop_plan', 'off')
+    }
+
+
+def app_cache_dir(*parts):
+    """本程序的用户级缓存目录（Windows 为 %LOCALAPPDATA%，其他平台为 ~/.cache）"""
+    if sys.platform == "win32":
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser("~")
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser("~"), ".cache")
+    path = Path(base) / "m3u8_batch_converter"
+    for part in parts:
+        path = path / part
+    return path
+
+
+GOP_PLAN_MODES = {'off': "关闭", 'warn': "仅提示", 'auto': "自动调整"}
+# 预测的最长片段超过目标时长的该倍数时提示
+GOP_WARN_RATIO = 1.5
+
+
+class KeyframeIndex:
+    """关键帧时间索引
+    
+    通过 ffprobe 的包级探测（只读取包标志，不解码）获得视频关键帧时间戳，
+    并按输入路径、大小与修改时间缓存到磁盘，重复运行时无需再次读取整个文件。
+    """
+    
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else app_cache_dir("keyframes")
+    
+    def cache_file(self, abs_path):
+        digest = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+    
+    def get(self, converter, input_file):
+        """返回 (关键帧时间列表, 总时长)，探测失败时返回 ([], None)
+        
+        URL 输入不做分析：逐包探测需要把整个文件下载一遍。
+        """
+        if is_source_url(input_file):
+            return [], None
+        abs_path = os.path.abspath(input_file)
+        try:
+            stat = os.stat(abs_path)
+        except OSError:
+            return [], None
+        
+        cache_file = self.cache_file(abs_path)
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('path') == abs_path and data.get('size') == stat.st_size
+                    and data.get('mtime_ns') == stat.st_mtime_ns):
+                return data['keyframes'], data['duration']
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        keyframes = converter.probe_keyframes(abs_path)
+        duration = converter.probe_media(abs_path).get('duration')
+        if keyframes:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'path': abs_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                               'duration': duration, 'keyframes': keyframes}, f)
+                os.replace(tmp_file, cache_file)
+            except OSError:
+                pass
+        return keyframes, duration
+
+
+def predict_segment_durations(keyframes, total_duration, segment_duration):
+    """模拟 HLS 复用器在流复制时的切片：累计时长达到 n×目标时长后，在下一个关键帧处切分"""
+    if not keyframes:
+        return []
+    start = keyframes[0]
+    cuts = [start]
+    boundary = 1
+    for keyframe in keyframes[1:]:
+        if keyframe - start >= boundary * segment_duration:
+            cuts.append(keyframe)
+            boundary += 1
+    end = total_duration + start if total_duration else keyframes[-1]
+    if end > cuts[-1]:
+        cuts.append(end)
+    return [b - a for a, b in zip(cuts, cuts[1:])]
+
+
+def summarize_segment_durations(durations):
+    """片段时长分布：数量、最短、最长、平均与 P95"""
+    if not durations:
+        return None
+    ordered = sorted(durations)
+    return {
+        'count': len(ordered),
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': sum(ordered) / len(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    }
+
+
+def plan_segment_duration(keyframes, total_duration, segment_duration):
+    """在目标时长与其附近的 GOP 整数倍之间选择切片最均匀的片段时长
+    
+    返回 (建议时长, 目标时长的预测分布, 建议时长的预测分布)。最后一个片段通常较短，不计入分布。
+    """
+    def stats_for(candidate):
+        durations = predict_segment_durations(keyframes, total_duration, candidate)
+        return summarize_segment_durations(durations[:-1] or durations)
+    
+    current = stats_for(segment_duration)
+    if not current or len(keyframes) < 2:
+        return segment_duration, current, current
+    
+    gops = sorted(b - a for a, b in zip(keyframes, keyframes[1:]))
+    gop = gops[len(gops) // 2]
+    candidates = {segment_duration}
+    if gop > 0:
+        multiple = segment_duration / gop
+        for count in (int(multiple), int(multiple) + 1):
+            if count >= 1:
+                candidates.add(round(count * gop, 3))
+    
+    def spread(stats):
+        # 以最长片段相对平均值的偏离衡量均匀程度
+        return stats['max'] / stats['mean'] if stats['mean'] else float('inf')
+    
+    best = segment_duration
+    best_stats = current
+    for candidate in sorted(candidates):
+        stats = stats_for(candidate)
+        if stats and spread(stats) < spread(best_stats) - 0.05:
+            best, best_stats = candidate, stats
+    return best, current, best_stats
+
+
+def describe_segment_stats(stats):
+    return (f"{stats['count']} 个片段, 最短 {stats['min']:.1f}s, 平均 {stats['mean']:.1f}s, "
+            f"P95 {stats['p95']:.1f}s, 最长 {stats['max']:.1f}s")
+
+
+def apply_gop_plan(converter, task, task_id, log_callback=None, keyframe_index=None):
+    """按关键帧分布检查（或调整）流复制任务的片段时长，返回本次实际使用的片段时长"""
+    segment_duration = task['segment_duration']
+    mode = task.get('gop_plan', 'off')
+    if mode == 'off' or task.get('transcode'):
+        return segment_duration
+    
+    def log(message):
+        if log_callback:
+            log_callback(f"[任务{task_id}] {message}", task_id)
+    
+    if is_source_url(task['file_path']):
+        log("ℹ️ 网络输入跳过片段时长分析（逐包探测需要完整下载）")
+        return segment_duration
+    keyframes, total_duration = (keyframe_index or KeyframeIndex()).get(converter, task['file_path'])
+    if not keyframes:
+        log("⚠️ 无法获取关键帧信息，跳过片段时长分析")
+        return segment_duration
+    
+    suggested, current, planned = plan_segment_duration(keyframes, total_duration, segment_duration)
+    log(f"🔑 关键帧分析: 目标 {segment_duration}s → {describe_segment_stats(current)}")
+    if current['max'] <= segment_duration * GOP_WARN_RATIO and suggested == segment_duration:
+        return segment_duration
+    
+    if suggested == segment_duration:
+        log(f"⚠️ 源文件 GOP 过长，片段时长将明显不均匀（最长 {current['max']:.1f}s）")
+        return segment_duration
+    if mode == 'auto':
+        log(f"🔧 片段时长调整为 {suggested:g}s: {describe_segment_stats(planned)}")
+        return suggested
+    log(f"⚠️ 片段时长不均匀，建议改为 {suggested:g}s: {describe_segment_stats(planned)}")
+    return segment_duration
+
+
+# HLS 可直接承载（流复制）的编码，按片段容器区分
+HLS_COPY_CODECS = {
+    'ts': {'video': {'h264', 'hevc'}, 'audio': {'aac', 'mp3', 'ac3', 'eac3'}},
+    'fmp4': {'video': {'h264', 'hevc', 'av1', 'vp9'}, 'audio': {'aac', 'mp3', 'ac3', 'eac3', 'flac', 'opus', 'alac'}},
+}
+COVER_ART_CODECS = {'mjpeg', 'png', 'bmp', 'gif'}
+STREAM_PATHS = {
+    'copy': "全部复制",
+    'audio': "仅重编码音频",
+    'video': "仅重编码视频",
+    'video_audio': "重编码音视频",
+    'transcode': "完整转码",
+    'abr': "多码率",
+    'unknown': "未探测",
+}
+
+
+def describe_stream_paths(paths):
+    """编码路径统计的可读描述，如 '全部复制 120, 仅重编码音频 8'"""
+    return ", ".join(f"{STREAM_PATHS.get(path, path)} {count}"
+                     for path, count in sorted(paths.items(), key=lambda item: -item[1]))
+
+
+def plan_stream_codecs(streams, output_mode, segment_duration):
+    """按探测到的流信息生成逐流的编码参数
+    
+    取第一路视频（跳过封面图）与第一路音频：HLS 可承载的编码直接复制，其余只重编码该流；
+    字幕一律不映射：单个媒体播放列表没有主播放列表，无法用 EXT-X-MEDIA 声明 WebVTT 字幕轨，
+    播放器找不到字幕，HLS 复用器也可能拒绝多出的流。
+    返回 (codec_args, path, notes)，path 为 STREAM_PATHS 的键；没有流信息时返回 (None, 'unknown', [])。
+    """
+    if not streams:
+        return None, 'unknown', []
+    copy_codecs = HLS_COPY_CODECS['fmp4' if output_mode in ('fmp4', 'fmp4_single') else 'ts']
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'
+                  and stream.get('codec_name') not in COVER_ART_CODECS), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    subtitle = next((stream for stream in streams if stream.get('codec_type') == 'subtitle'), None)
+    
+    args = []
+    encoded = []
+    notes = []
+    if video:
+        args += ["-map", f"0:{video['index']}"]
+    if audio:
+        args += ["-map", f"0:{audio['index']}"]
+    if video and video.get('codec_name') not in copy_codecs['video']:
+        args += M3U8Converter.video_encode_args(FALLBACK_TRANSCODE_PRESET, segment_duration)
+        encoded.append('video')
+        notes.append(f"视频 {video.get('codec_name')} 重编码为 H.264")
+    else:
+        args += ["-c:v", "copy"]
+    if audio and audio.get('codec_name') not in copy_codecs['audio']:
+        args += M3U8Converter.audio_encode_args()
+        encoded.append('audio')
+        notes.append(f"音频 {audio.get('codec_name')} 重编码为 AAC")
+    else:
+        args += ["-c:a", "copy"]
+    if subtitle:
+        notes.append(f"字幕 {subtitle.get('codec_name')} 无法放入单个媒体播放列表，已丢弃")
+    return args, '_'.join(encoded) or 'copy', notes
+
+
+BITSTREAM_FILTERS = {'h264': "h264_mp4toannexb", 'hevc': "hevc_mp4toannexb"}
+CODEC_NAME_RE = re.compile(r"codec (\w+)")
+
+
+def plan_fallback(converter, task, failure, fixes, segment_duration, codec_args=None):
+    """把已选择的自动修复（可累积）转换为 convert_to_m3u8_optimized 的附加参数
+    
+    codec_args 为按流探测得到的编码参数，修复参数追加在其后（同一流的后一个编码选项生效）。
+    """
+    input_args = []
+    fflags = []
+    if 'regen_timestamps' in fixes:
+        fflags.append("+genpts+igndts")
+    if 'ignore_errors' in fixes:
+        input_args += ["-err_detect", "ignore_err"]
+        fflags.append("+discardcorrupt")
+    if fflags:
+        input_args += ["-fflags", "".join(fflags)]
+    # 只是重新连接时输出参数不变，可以从已完成的片段处续转
+    overrides = {'input_args': input_args, 'resume': set(fixes) == {'reconnect'}}
+    if 'reconnect' in fixes:
+        overrides['network'] = dict(task.get('network') or {}, read_ahead=False)
+    
+    if 'transcode' in fixes:
+        overrides['transcode'] = FALLBACK_TRANSCODE_PRESET
+        return overrides
+    
+    streams = []
+    if 'bitstream_filter' in fixes or 'reencode_streams' in fixes:
+        streams = converter.probe_streams(task['file_path'])
+    codec_args = list(codec_args or ["-c", "copy"])
+    if 'bitstream_filter' in fixes:
+        if task.get('output_mode', 'ts') in ('fmp4', 'fmp4_single'):
+            if any(stream.get('codec_name') == 'aac' for stream in streams):
+                codec_args += ["-bsf:a", "aac_adtstoasc"]
+        else:
+            video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+            if video.get('codec_name') in BITSTREAM_FILTERS:
+                codec_args += ["-bsf:v", BITSTREAM_FILTERS[video['codec_name']]]
+    if 'reencode_streams' in fixes:
+        # 只重编码错误信息中提到的编码所在的流类型，无法判断时重编码音频（最常见的原因）
+        codecs = set(CODEC_NAME_RE.findall(failure.get('line', '')))
+        kinds = {stream.get('codec_type') for stream in streams if stream.get('codec_name') in codecs}
+        if not kinds & {'video', 'audio', 'subtitle', 'data'}:
+            kinds = {'audio'}
+        if 'video' in kinds:
+            codec_args += converter.video_encode_args(FALLBACK_TRANSCODE_PRESET, segment_duration)
+        if 'audio' in kinds:
+            codec_args += converter.audio_encode_args()
+        if 'subtitle' in kinds:
+            codec_args += ["-sn"]
+        if 'data' in kinds:
+            codec_args += ["-dn"]
+    overrides['codec_args'] = codec_args
+    return overrides
+
+
+def next_fallback_fix(task, failure, fixes):
+    """为本次失败选择下一个尚未尝试的修复，没有可用修复时返回 None"""
+    if not failure or len(fixes) >= FALLBACK_MAX_RETRIES:
+        return None
+    for fix in FAILURE_CATEGORIES.get(failure['category'], {}).get('fixes', ()):
+        if fix in fixes:
+            continue
+        if task.get('abr_ladder') and fix not in ('regen_timestamps', 'ignore_errors'):
+            # 多码率输出的编码参数由 build_abr_args 决定，只能调整输入端
+            continue
+        if task.get('transcode') and fix in ('transcode', 'reencode_streams', 'bitstream_filter'):
+            continue
+        return fix
+    return None
+
+
+class ConversionAttempts:
+    """一个任务的转换尝试序列（同步与异步引擎共用）
+    
+    first() 完成 GOP 分析与流探测并给出第一次尝试的参数；每次尝试后把结果交给 next()，
+    失败时按失败类别自动以代价最低的修复重试（码流过滤器、重新生成时间戳、只重编码不兼容的流……），
+    完整转码是最后手段；没有下一次尝试时返回 None，由 finish() 给出最终结果。
+    task['fixes'] 记录实际使用的修复，task['failure'] 记录最后一次失败的类别，
+    task['stream_path'] 为成功那次尝试的编码路径（失败时为 None）。
+    """
+    
+    def __init__(self, converter, task, task_id, log_callback=None, resume=True, keyframe_index=None):
+        self.converter = converter
+        self.task = task
+        self.task_id = task_id
+        self.log_callback = log_callback
+        self.resume = resume
+        self.keyframe_index = keyframe_index
+        self.segment_duration = task['segment_duration']
+        self.stream_codec_args = None
+        self.stream_path = None  # 当前尝试的编码路径，只有成功时写入 task['stream_path']
+        self.fixes = []
+        self.timings = {}
+        self.result = (False, "未开始")
+    
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(f"[任务{self.task_id}] {message}", self.task_id)
+    
+    def attempt_options(self, options):
+        """补全 convert_to_m3u8_optimized 的参数"""
+        task = self.task
+        options.update(
+            input_file=task['file_path'],
+            output_dir=task['output_dir'],
+            segment_duration=self.segment_duration,
+            output_filename=task['output_filename'],
+            log_callback=self.log_callback,
+            task_id=self.task_id,
+            abr_ladder=task.get('abr_ladder'),
+            threads=task.get('threads'),
+            output_mode=task.get('output_mode', 'ts'),
+            expected_duration=task.get('duration'),
+            keyframe_index=self.keyframe_index)
+        options.setdefault('transcode', task.get('transcode'))
+        options.setdefault('network', task.get('network'))
+        options['resume'] = options.get('resume') and self.resume
+        return options
+    
+    def first(self):
+        """准备第一次尝试，FFmpeg 缺少所需功能时返回 None"""
+        converter, task = self.converter, self.task
+        missing = converter.toolchain.missing_features(task)
+        if missing:
+            self.result = (False, f"当前 FFmpeg 不支持: {', '.join(missing)}")
+            self.log(f"❌ {self.result[1]}")
+            return None
+        phase_start = time.perf_counter()
+        self.segment_duration = apply_gop_plan(converter, task, self.task_id, self.log_callback,
+                                               self.keyframe_index)
+        self.timings['gop_plan'] = time.perf_counter() - phase_start
+        
+        options = {'resume': self.resume}
+        if task.get('abr_ladder'):
+            self.stream_path = 'abr'
+        elif task.get('transcode'):
+            self.stream_path = 'transcode'
+        else:
+            phase_start = time.perf_counter()
+            self.stream_codec_args, self.stream_path, notes = plan_stream_codecs(
+                converter.probe_streams(task['file_path']), task.get('output_mode', 'ts'), self.segment_duration)
+            self.timings['probe'] = time.perf_counter() - phase_start
+            options['codec_args'] = self.stream_codec_args
+            if notes:
+                self.log(f"🎛️ {'；'.join(notes)}")
+        return self.attempt_options(options)
+    
+    def next(self, result):
+        """记录一次尝试的结果，需要重试时返回下一次尝试的参数，否则返回 None"""
+        converter, task = self.converter, self.task
+        self.result = result
+        success = result[0]
+        # 重试时各阶段耗时累加，便于看出自动修复的代价
+        for phase, seconds in converter.timings.items():
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+        failure = converter.last_failure
+        task['failure'] = None if success else (failure or {}).get('category')
+        fix = None if success or converter.stop_requested else next_fallback_fix(task, failure, self.fixes)
+        if fix is None:
+            return None
+        self.fixes.append(fix)
+        self.log(f"🔁 {describe_failure(failure['category'])}，自动重试: {FALLBACK_FIXES[fix]}")
+        options = plan_fallback(converter, task, failure, self.fixes, self.segment_duration,
+                                self.stream_codec_args)
+        if 'transcode' in options:
+            self.stream_path = 'transcode'
+        return self.attempt_options(options)
+    
+    def finish(self):
+        """返回最终的 (success, message)，并把累计耗时写回转换器"""
+        success, message = self.result
+        self.task['fixes'] = self.fixes
+        self.task['stream_path'] = self.stream_path if success else None
+        if success and self.fixes:
+            message += f"（自动修复: {', '.join(FALLBACK_FIXES[fix] for fix in self.fixes)}）"
+        self.converter.timings = dict(self.timings)
+        return success, message
+
+
+def run_conversion_task(converter, task, task_id, log_callback=None, progress_callback=None, resume=True,
+                        keyframe_index=None):
+    """按任务字典调用转换器（界面、命令行共用），失败时自动修复重试，见 ConversionAttempts
+    
+    URL 输入先占用所在主机的连接名额（host_connections），探测与转换都在名额内进行。
+    """
+    with host_connections.slot(task['file_path'], converter, host_wait_logger(task_id, log_callback)) as acquired:
+        if not acquired:
+            return False, "已停止"
+        attempts = ConversionAttempts(converter, task, task_id, log_callback, resume, keyframe_index)
+        options = attempts.first()
+        while options is not None:
+            result = converter.convert_to_m3u8_optimized(progress_callback=progress_callback, **options)
+            options = attempts.next(result)
+        return attempts.finish()
+
+
+def host_wait_logger(task_id, log_callback):
+    """生成等待主机连接名额时的日志回调"""
+    def on_wait(host):
+        if log_callback:
+            log_callback(f"[任务{task_id}] 🌐 {host} 的连接数已达上限 {host_connections.limit}，等待中...", task_id)
+    return on_wait
+
+
+class ConversionCache:
+    """增量转换缓存
+    
+    以输入路径为键记录输入大小、修改时间、转换参数以及生成的播放列表状态。
+    输入与参数均未变化且播放列表仍然完好时，只需几次 stat 即可跳过转换。
+    
+    缓存文件为只追加的 JSON Lines：首行是版本号，之后每行是一条记录的新值
+    （null 表示移除），flush() 只追加上次写入之后的变化，耗时与缓存大小无关。
+    打开时按行回放；过期的行过多或末行不完整（写入时进程被结束）时原子地重写一次。
+    """
+    
+    VERSION = 2
+    COMPACT_MIN_LINES = 1000  # 过期行超过此数且多于有效记录数时压缩
+    
+    def __init__(self, cache_file, flush_every=100, flush_interval=None):
+        self.cache_file = Path(cache_file)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval  # 有未写入的记录且距上次写入超过该秒数时写入
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.pending = 0
+        self.changes = {}  # 上次写入之后变化的记录，值为 None 表示已移除
+        self.entries = {}
+        self.rewrite = True  # 缓存文件不存在或无法识别时，下次写入改为整体重写
+        self.load()
+    
+    def load(self):
+        lines = 0
+        damaged = False
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or "null")
+                if not isinstance(header, dict):
+                    return
+                if header.get('version') == 1:
+                    # 旧版整体写入的 JSON，读入后改写为新格式
+                    self.entries = header.get('entries', {})
+                    damaged = True
+                elif header.get('version') != self.VERSION:
+                    return
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        key, entry = record['key'], record['entry']
+                    except (ValueError, KeyError, TypeError):
+                        damaged = True
+                        continue
+                    lines += 1
+                    if entry is None:
+                        self.entries.pop(key, None)
+                    else:
+                        self.entries[key] = entry
+        except (OSError, ValueError):
+            return
+        self.rewrite = False
+        if damaged or lines - len(self.entries) > max(self.COMPACT_MIN_LINES, len(self.entries)):
+            self.compact()
+    
+    def compact(self):
+        """把全部有效记录原子地重写为新的缓存文件"""
+        with self.write_lock:
+            with self.lock:
+                lines = [json.dumps({'version': self.VERSION})]
+                lines += [json.dumps({'key': key, 'entry': entry}, ensure_ascii=False)
+                          for key, entry in self.entries.items()]
+                self.changes = {}
+                self.pending = 0
+                self.last_flush = time.monotonic()
+            try:
+                self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = self.cache_file.with_name(self.cache_file.name + ".tmp")
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                os.replace(tmp_file, self.cache_file)
+                self.rewrite = False
+            except OSError:
+                pass
+    
+    @staticmethod
+    def playlist_path(task):
+        return Path(task['output_dir']) / f"{task['output_filename']}.m3u8"
+    
+    def is_fresh(self, task):
+        """输入、参数与输出均未变化时返回 True（URL 输入无法判断是否变化，总是重新转换）"""
+        if is_source_url(task['file_path']):
+            return False
+        key = os.path.abspath(task['file_path'])
+        with self.lock:
+            entry = self.entries.get(key)
+        if not entry or entry['settings'] != conversion_settings(task):
+            return False
+        try:
+            input_stat = os.stat(key)
+            playlist_stat = os.stat(self.playlist_path(task))
+        except OSError:
+            return False
+        return (entry['size'] == input_stat.st_size
+                and entry['mtime_ns'] == input_stat.st_mtime_ns
+                and entry['playlist'] == str(self.playlist_path(task))
+                and entry['playlist_size'] == playlist_stat.st_size
+                and entry['playlist_mtime_ns'] == playlist_stat.st_mtime_ns)
+    
+    def record(self, task):
+        """记录一次成功的转换"""
+        if is_source_url(task['file_path']):
+            return
+        key = os.path.abspath(task['file_path'])
+        try:
+            input_stat = os.stat(key)
+            playlist_stat = os.stat(self.playlist_path(task))
+        except OSError:
+            return
+        with self.lock:
+            self.entries[key] = self.changes[key] = {
+                'size': input_stat.st_size,
+                'mtime_ns': input_stat.st_mtime_ns,
+                'settings': conversion_settings(task),
+                'playlist': str(self.playlist_path(task)),
+                'playlist_size': playlist_stat.st_size,
+                'playlist_mtime_ns': playlist_stat.st_mtime_ns
+            }
+            self.pending += 1
+            should_flush = self.pending >= self.flush_every
+        if should_flush:
+            self.flush()
+        else:
+            self.flush_if_due()
+    
+    def flush_if_due(self):
+        """设置了 flush_interval 时，距上次写入已超过该时长则写入（常驻进程定期调用）"""
+        if self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+    
+    def forget(self, task):
+        """移除一条记录（转换失败或输出被覆盖时）"""
+        key = os.path.abspath(task['file_path'])
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.changes[key] = None
+                self.pending += 1
+    
+    def flush(self):
+        """把上次写入之后的变化追加到缓存文件（文件不存在或无法识别时整体写入）"""
+        with self.lock:
+            if not self.changes:
+                return
+        if self.rewrite or not self.cache_file.exists():
+            self.compact()
+            return
+        with self.write_lock:
+            with self.lock:
+                if not self.changes:
+                    return
+                lines = [json.dumps({'key': key, 'entry': entry}, ensure_ascii=False)
+                         for key, entry in self.changes.items()]
+                self.changes = {}
+                self.pending = 0
+                self.last_flush = time.monotonic()
+            try:
+                # 一次写入全部行；写到一半被结束时末行不完整，下次打开会丢弃它并重写文件
+                with open(self.cache_file, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError:
+                pass
+
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+JOB_STORE_CHUNK = 500  # 批量插入的行数
+IN_FLIGHT_FACTOR = 2  # 线程池中最多排队 并行数 × 该系数 个任务
+# 恢复批次时沿用的任务字段（其余字段是运行中写入的状态）
+JOB_TASK_FIELDS = ('file_path', 'output_dir', 'output_filename', 'segment_duration', 'output_mode',
+                   'abr_ladder', 'transcode', 'gop_plan', 'network')
+
+
+class JobStore:
+    """基于 SQLite 的持久化任务队列
+    
+    每个任务一行：状态（queued/running/done/failed/cancelled）、尝试次数与结果。
+    执行器按需从中领取任务，内存占用与批次大小无关；进程崩溃后重新打开时，
+    停留在 running 的任务回到 queued，批次从中断处继续。
+    """
+    
+    def __init__(self, db_file):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                task TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                elapsed REAL,
+                updated REAL,
+                UNIQUE (file_path, output_dir))""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+            self.recovered = self.conn.execute(
+                "UPDATE jobs SET state = 'queued' WHERE state = 'running'").rowcount
+    
+    def add_tasks(self, tasks):
+        """加入任务（同一输入与输出目录只记录一次），返回新增的任务数
+        
+        已存在且未完成的任务改用新的任务参数（例如修改了片段时长后重新加入）。
+        """
+        added = 0
+        rows = []
+        
+        def insert():
+            with self.lock, self.conn:
+                before = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+                self.conn.executemany(
+                    "INSERT INTO jobs (file_path, output_dir, task, updated) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (file_path, output_dir) DO UPDATE SET task = excluded.task, "
+                    "updated = excluded.updated WHERE state != 'done'", rows)
+                return self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+        
+        for task in tasks:
+            payload = json.dumps(job_task_payload(task), ensure_ascii=False, default=str)
+            rows.append((str(task['file_path']), task['output_dir'], payload, time.time()))
+            if len(rows) >= JOB_STORE_CHUNK:
+                added += insert()
+                rows = []
+        if rows:
+            added += insert()
+        return added
+    
+    def claim(self, limit):
+        """领取至多 limit 个排队中的任务并标记为 running，返回带 job_id 的任务字典"""
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT id, task FROM jobs WHERE state = 'queued' ORDER BY id LIMIT ?", (limit,)).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                [(time.time(), job_id) for job_id, _ in rows])
+        tasks = []
+        for job_id, payload in rows:
+            task = json.loads(payload)
+            task['job_id'] = job_id
+            tasks.append(task)
+        return tasks
+    
+    def finish(self, task, success, message, elapsed=None, outcome=None):
+        """记录任务结果
+        
+        task 为 claim() 返回的任务（按 job_id 定位），或直接加入的任务（按输入与输出目录定位）。
+        outcome 为 'stopped' 时任务回到队列、下次运行时继续；为 'cancelled' 时记为已取消。
+        这两种情况都不计入尝试次数。
+        """
+        if 'job_id' in task:
+            where, key = "id = ?", (task['job_id'],)
+            claimed = 1
+        else:
+            where, key = "file_path = ? AND output_dir = ?", (str(task['file_path']), task['output_dir'])
+            claimed = 0
+        with self.lock, self.conn:
+            if outcome in ('stopped', 'cancelled'):
+                # 撤销 claim() 时计入的尝试次数
+                self.conn.execute(f"UPDATE jobs SET state = ?, attempts = MAX(attempts - ?, 0), message = ?, "
+                                  f"updated = ? WHERE {where}",
+                                  ('queued' if outcome == 'stopped' else 'cancelled', claimed,
+                                   message, time.time(), *key))
+                return
+            self.conn.execute(f"UPDATE jobs SET state = ?, attempts = attempts + ?, message = ?, elapsed = ?, "
+                              f"updated = ? WHERE {where}",
+                              ('done' if success else 'failed', 1 - claimed,
+                               message, elapsed, time.time(), *key))
+    
+    def retry_failed(self, max_attempts=None):
+        """失败的任务重新排队（尝试次数未达 max_attempts 的），返回重新排队的任务数"""
+        with self.lock, self.conn:
+            if max_attempts:
+                cursor = self.conn.execute(
+                    "UPDATE jobs SET state = 'queued' WHERE state = 'failed' AND attempts < ?", (max_attempts,))
+            else:
+                cursor = self.conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'failed'")
+            return cursor.rowcount
+    
+    def counts(self):
+        """各状态的任务数"""
+        with self.lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(rows)
+        return counts
+    
+    def unfinished_tasks(self, page_size=JOB_STORE_CHUNK):
+        """逐页返回未完成（排队或运行中）的任务字典列表，每页至多 page_size 个"""
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, task FROM jobs WHERE state IN ('queued', 'running') AND id > ? "
+                    "ORDER BY id LIMIT ?", (last_id, page_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [json.loads(payload) for _, payload in rows]
+    
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM jobs")
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def percentile(sorted_values, fraction):
+    """已排序序列的百分位数（最近秩法）"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ConcurrencyAutotuner:
+    """流复制任务的自适应并发控制
+    
+    以输入读取进度估算整体吞吐量，按固定窗口做爬山调整：吞吐继续上升时增加
+    并发，持平、下降或单任务延迟突增时减少并发。工作线程在开始转换前调用
+    acquire()，结束后调用 release()，线程池本身按上限创建。
+    单任务延迟取自成功任务的实际耗时（按输入大小折算为 秒/MB），统计当前并发下最近完成的任务：
+    p90 超过历史最佳 p50 的 LATENCY_SPIKE 倍视为延迟突增。
+    """
+    
+    GAIN_THRESHOLD = 0.05
+    LATENCY_SPIKE = 2.0
+    LATENCY_MIN_SAMPLES = 3  # 当前并发下至少完成这么多任务才判断延迟
+    LATENCY_SAMPLES = 50
+    CEILING_RESET_WINDOWS = 6
+    
+    def __init__(self, initial=2, minimum=1, maximum=16, interval=5.0, log_callback=None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.interval = interval
+        self.log_callback = log_callback
+        self.active = 0
+        self.condition = threading.Condition()
+        self.task_bytes = {}
+        self.window_bytes = 0
+        self.window_start = time.perf_counter()
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)  # 当前并发下完成的任务耗时（秒/MB）
+        self.history = {}
+        self.best_latency = None
+        self.ceiling = None
+        self.stable_windows = 0
+        self.running = False
+        self.thread = None
+    
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message, None)
+    
+    def acquire(self):
+        """等待空闲并发槽位，停止后立即返回 False"""
+        with self.condition:
+            while self.running and self.active >= self.limit:
+                self.condition.wait(0.5)
+            if not self.running:
+                return False
+            self.active += 1
+            return True
+    
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+    
+    def record_progress(self, task_id, bytes_done):
+        """记录任务累计已读取字节数"""
+        with self.condition:
+            delta = bytes_done - self.task_bytes.get(task_id, 0)
+            if delta > 0:
+                self.task_bytes[task_id] = bytes_done
+                self.window_bytes += delta
+    
+    def task_finished(self, task_id, total_bytes):
+        """任务结束时补记剩余字节"""
+        self.record_progress(task_id, total_bytes)
+        with self.condition:
+            self.task_bytes.pop(task_id, None)
+    
+    def record_task_time(self, elapsed, total_bytes):
+        """记录一个成功任务的实际耗时"""
+        megabytes = total_bytes / 1024 / 1024
+        if elapsed > 0 and megabytes > 0:
+            with self.condition:
+                self.latencies.append(elapsed / megabytes)
+    
+    def start(self):
+        """启动后台评估线程"""
+        self.running = True
+        self.window_start = time.perf_counter()
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        self.log(f"🎛️ 自动并发: 初始 {self.limit}，范围 {self.minimum}-{self.maximum}，"
+                 f"评估间隔 {self.interval:.0f}s")
+    
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+    
+    def run_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            if self.running:
+                self.evaluate()
+    
+    def set_limit(self, new_limit, reason):
+        with self.condition:
+            old_limit = self.limit
+            self.limit = new_limit
+            # 之前的耗时属于旧的并发数
+            self.latencies.clear()
+            self.condition.notify_all()
+        self.log(f"🎛️ 并发 {old_limit} → {new_limit}: {reason}")
+    
+    def evaluate(self):
+        """结束当前窗口并做出一次调整决策"""
+        now = time.perf_counter()
+        with self.condition:
+            elapsed = now - self.window_start
+            window_bytes = self.window_bytes
+            active = self.active
+            limit = self.limit
+            latencies = sorted(self.latencies)
+            self.window_bytes = 0
+            self.window_start = now
+        
+        if elapsed <= 0 or window_bytes <= 0:
+            return
+        
+        throughput = window_bytes / elapsed
+        stats = f"{throughput / 1024 / 1024:.1f} MB/s"
+        p50 = p90 = None
+        if len(latencies) >= self.LATENCY_MIN_SAMPLES:
+            p50 = percentile(latencies, 0.5)
+            p90 = percentile(latencies, 0.9)
+            stats += f", 单任务 p50 {p50:.2f} / p90 {p90:.2f} s/MB"
+        
+        if active < limit:
+            self.log(f"🎛️ 保持并发 {limit}: 待处理任务不足 ({stats})")
+            return
+        
+        self.history[limit] = throughput
+        if p50 is not None and (self.best_latency is None or p50 < self.best_latency):
+            self.best_latency = p50
+        
+        if self.ceiling is not None:
+            self.stable_windows += 1
+            if self.stable_windows >= self.CEILING_RESET_WINDOWS:
+                # 存储负载可能已变化，允许重新向上探测
+                self.ceiling = None
+                self.stable_windows = 0
+        
+        previous = self.history.get(limit - 1)
+        if p90 is not None and p90 > self.best_latency * self.LATENCY_SPIKE and limit > self.minimum:
+            self.ceiling = limit - 1
+            self.stable_windows = 0
+            self.set_limit(limit - 1, f"延迟突增 ({stats})")
+        elif previous is not None and throughput < previous * (1 + self.GAIN_THRESHOLD):
+            if limit > self.minimum:
+                self.ceiling = limit - 1
+                self.stable_windows = 0
+                self.set_limit(limit - 1, f"吞吐未提升，较并发 {limit - 1} 时 "
+                                          f"{previous / 1024 / 1024:.1f} MB/s ({stats})")
+            else:
+                self.log(f"🎛️ 保持并发 {limit} ({stats})")
+        elif limit < self.maximum and (self.ceiling is None or limit < self.ceiling):
+            self.set_limit(limit + 1, f"吞吐上升 ({stats})")
+        else:
+            self.log(f"🎛️ 保持并发 {limit} ({stats})")
+
+
+TERMINATE_GRACE_SECONDS = 3.0
+
+
+class ProcessRegistry:
+    """运行中 ffmpeg 子进程的登记表（按任务编号索引）
+    
+    子进程在独立的进程组中启动（Windows 为新进程组），结束时先向整个进程组
+    发送终止信号，宽限期后仍未退出的强制结束，停止批次可在数秒内释放 CPU 与磁盘。
+    同一登记表也用于暂停、继续单个任务。
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = {}
+        self.paused = set()
+    
+    @staticmethod
+    def spawn_kwargs(**kwargs):
+        """子进程启动参数：隐藏窗口，并放入独立的进程组"""
+        popen_kwargs = hidden_subprocess_kwargs()
+        popen_kwargs.update(kwargs)
+        if sys.platform == "win32":
+            popen_kwargs['creationflags'] = (popen_kwargs.get('creationflags', 0)
+                                             | subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            popen_kwargs['start_new_session'] = True
+        return popen_kwargs
+    
+    def spawn(self, key, cmd, **kwargs):
+        """启动子进程并登记到 key 下"""
+        return self.register(key, subprocess.Popen(cmd, **self.spawn_kwargs(**kwargs)))
+    
+    def register(self, key, process):
+        """登记已启动的子进程（Popen 或 AsyncProcessHandle）"""
+        with self.lock:
+            self.processes[key] = process
+            self.paused.discard(key)
+        return process
+    
+    def unregister(self, key, process):
+        with self.lock:
+            if self.processes.get(key) is process:
+                del self.processes[key]
+                self.paused.discard(key)
+    
+    def is_paused(self, key):
+        with self.lock:
+            return key in self.paused
+    
+    @staticmethod
+    def signal_group(process, sig):
+        """向进程所在的进程组发送信号（仅 POSIX），进程已退出时忽略"""
+        try:
+            os.killpg(process.pid, sig)
+        except OSError:
+            pass
+    
+    @staticmethod
+    def suspend_windows_process(process, suspend):
+        try:
+            import ctypes
+            ntdll = ctypes.windll.ntdll
+            function = ntdll.NtSuspendProcess if suspend else ntdll.NtResumeProcess
+            handle = getattr(process, '_handle', None)
+            if handle is not None:
+                return function(int(handle)) == 0
+            # asyncio 子进程没有公开句柄，按进程号打开（PROCESS_SUSPEND_RESUME）
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(0x0800, False, process.pid)
+            if not handle:
+                return False
+            try:
+                return function(handle) == 0
+            finally:
+                kernel32.CloseHandle(handle)
+        except (OSError, AttributeError):
+            return False
+    
+    def set_paused(self, key, paused):
+        """暂停或继续 key 对应的子进程，返回是否成功"""
+        with self.lock:
+            process = self.processes.get(key)
+        if process is None or process.poll() is not None:
+            return False
+        if sys.platform == "win32":
+            if not self.suspend_windows_process(process, paused):
+                return False
+        else:
+            self.signal_group(process, signal.SIGSTOP if paused else signal.SIGCONT)
+        with self.lock:
+            if paused:
+                self.paused.add(key)
+            else:
+                self.paused.discard(key)
+        return True
+    
+    def pause(self, key):
+        return self.set_paused(key, True)
+    
+    def resume(self, key):
+        return self.set_paused(key, False)
+    
+    def terminate(self, keys=None, grace=TERMINATE_GRACE_SECONDS):
+        """结束指定任务（默认全部）的进程组：先请求退出，宽限期后强制结束，返回处理的进程数"""
+        with self.lock:
+            targets = [process for key, process in self.processes.items()
+                       if keys is None or key in keys]
+        targets = [process for process in targets if process.poll() is None]
+        
+        for process in targets:
+            if sys.platform == "win32":
+                self.suspend_windows_process(process, False)
+                try:
+                    process.send_signal(signal.CTRL_BREAK_EVENT)
+                except OSError:
+                    pass
+            else:
+                self.signal_group(process, signal.SIGTERM)
+                # 已暂停的进程需要继续运行才能处理终止信号
+                self.signal_group(process, signal.SIGCONT)
+        
+        deadline = time.monotonic() + grace
+        for process in targets:
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                if sys.platform == "win32":
+                    subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                                   capture_output=True, **hidden_subprocess_kwargs())
+                else:
+                    self.signal_group(process, signal.SIGKILL)
+                try:
+                    process.wait(timeout=grace)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        return len(targets)
+
+
+process_registry = ProcessRegistry()
+
+
+class AsyncProcessHandle:
+    """asyncio 子进程的同步外观，使其可由 ProcessRegistry 在其他线程中暂停与结束
+    
+    只读取 returncode（由事件循环更新），不自行回收子进程，因此事件循环须保持运行。
+    """
+    
+    def __init__(self, process):
+        self.process = process
+        self.pid = process.pid
+    
+    def poll(self):
+        return self.process.returncode
+    
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.process.returncode is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.05)
+        return self.process.returncode
+    
+    def send_signal(self, sig):
+        try:
+            os.kill(self.pid, sig)
+        except OSError:
+            pass
+    
+    def kill(self):
+        self.send_signal(signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+
+
+async def terminate_process_async(process, grace=TERMINATE_GRACE_SECONDS):
+    """在事件循环中结束 asyncio 子进程的进程组：先请求退出，宽限期后强制结束"""
+    if process.returncode is not None:
+        return
+    handle = AsyncProcessHandle(process)
+    if sys.platform == "win32":
+        ProcessRegistry.suspend_windows_process(handle, False)
+        handle.send_signal(signal.CTRL_BREAK_EVENT)
+    else:
+        ProcessRegistry.signal_group(handle, signal.SIGTERM)
+        ProcessRegistry.signal_group(handle, signal.SIGCONT)
+    try:
+        await asyncio.wait_for(process.wait(), grace)
+    except asyncio.TimeoutError:
+        if sys.platform == "win32":
+            killer = await asyncio.create_subprocess_exec(
+                "taskkill", "/F", "/T", "/PID", str(process.pid),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **hidden_subprocess_kwargs())
+            await killer.wait()
+        else:
+            ProcessRegistry.signal_group(handle, signal.SIGKILL)
+        await process.wait()
+
+
+def use_pidfd_child_watcher(loop=None):
+    """Linux 上让 asyncio 通过 pidfd 等待子进程退出
+    
+    Python 3.12 之前默认的 ThreadedChildWatcher 为每个子进程启动一个等待线程，
+    数百个并发任务就是数百个线程；3.12 起 asyncio 已自动使用 pidfd，无需处理。
+    """
+    if sys.platform != "linux" or sys.version_info >= (3, 12) or not hasattr(os, 'pidfd_open'):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))  # 需要 5.3 以上内核
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop or asyncio.get_running_loop())
+    asyncio.set_child_watcher(watcher)
+
+
+def find_ffmpeg():
+    """自动查找 ffmpeg 可执行文件（只检查文件是否存在，不启动进程）"""
+    possible_paths = []
+    exe_name = 'ffmpeg.exe' if sys.platform == "win32" else 'ffmpeg'
+    
+    # 1. 检查打包后的环境
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+        possible_paths.append(os.path.join(base_dir, exe_name))
+        
+        if hasattr(sys, '_MEIPASS'):
+            possible_paths.append(os.path.join(sys._MEIPASS, exe_name))
+    
+    # 2. 检查开发环境
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    possible_paths.append(os.path.join(script_dir, 'resources', exe_name))
+    possible_paths.append(os.path.join(script_dir, exe_name))
+    
+    # 3. 检查路径
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    
+    # 4. 系统PATH中的 ffmpeg
+    return "ffmpeg"
+
+
+class FFmpegToolchain:
+    """进程内共享的 ffmpeg 句柄
+    
+    首次使用时才查找 ffmpeg/ffprobe 并探测版本、muxer、编码器、滤镜与 hls 选项；
+    探测结果按可执行文件的路径、大小与修改时间缓存到磁盘，之后的启动无需再运行 ffmpeg。
+    通过 get_toolchain() 获取，同一路径在进程内只有一个实例。
+    """
+    
+    def __init__(self, ffmpeg_path=None, cache_file=None):
+        self.requested_path = ffmpeg_path
+        self.cache_file = Path(cache_file) if cache_file else app_cache_dir("ffmpeg_capabilities.json")
+        self.lock = threading.RLock()
+        self.resolved_path = None
+        self.probed = False
+        self.cached_capabilities = None
+    
+    @property
+    def ffmpeg_path(self):
+        with self.lock:
+            if self.resolved_path is None:
+                self.resolved_path = self.requested_path or find_ffmpeg()
+            return self.resolved_path
+    
+    @property
+    def ffprobe_path(self):
+        """根据 ffmpeg 路径推断同目录下的 ffprobe"""
+        directory, name = os.path.split(self.ffmpeg_path)
+        probe_name = name.replace('ffmpeg', 'ffprobe') if 'ffmpeg' in name else 'ffprobe'
+        if directory:
+            return os.path.join(directory, probe_name)
+        return probe_name
+    
+    def executable(self):
+        """返回 ffmpeg 的绝对路径，找不到时返回 None"""
+        path = self.ffmpeg_path
+        if os.path.dirname(path):
+            return os.path.abspath(path) if os.path.isfile(path) else None
+        return shutil.which(path)
+    
+    def capabilities(self):
+        """返回 {'version', 'muxers', 'encoders', 'filters', 'hls_options'}，ffmpeg 不可用时返回 None
+        
+        列表字段探测失败时为 None（表示未知）。
+        """
+        with self.lock:
+            if not self.probed:
+                self.cached_capabilities = self.load_capabilities()
+                self.probed = True
+            return self.cached_capabilities
+    
+    def load_capabilities(self):
+        executable = self.executable()
+        if executable is None:
+            return None
+        try:
+            stat = os.stat(executable)
+        except OSError:
+            return None
+        
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        entry = cache.get(executable)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry['capabilities']
+        
+        capabilities = self.probe_capabilities(executable)
+        if capabilities is None:
+            return None
+        cache[executable] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'capabilities': capabilities}
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_name(self.cache_file.name + f".{os.getpid()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
+        return capabilities
+    
+    def run_ffmpeg(self, executable, *args):
+        """运行 ffmpeg 并返回标准输出文本，失败时返回 None"""
+        try:
+            result = subprocess.run([executable, "-hide_banner", *args],
+                                    capture_output=True,
+                                    timeout=30,
+                                    **hidden_subprocess_kwargs())
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout.decode('utf-8', errors='replace')
+    
+    @staticmethod
+    def parse_listing(text):
+        """解析 -muxers / -encoders / -filters 的列表输出，每个条目行为 "标志 名称 描述"
+        
+        -muxers 与 -encoders 的条目在 "--" 分隔线之后；-filters 没有分隔线，
+        跳过 "Filters:" 标题和 "T.. = Timeline support" 之类的说明行即可。
+        """
+        if text is None:
+            return None
+        lines = text.splitlines()
+        names = []
+        started = not any(line.strip().startswith("--") for line in lines)
+        for line in lines:
+            stripped = line.strip()
+            if not started:
+                started = stripped.startswith("--")
+                continue
+            parts = stripped.split()
+            if len(parts) >= 2 and parts[1] != "=" and not parts[0].endswith(":"):
+                names.extend(parts[1].split(","))
+        return sorted(set(names))
+    
+    def probe_capabilities(self, executable):
+        version_text = self.run_ffmpeg(executable, "-version")
+        if version_text is None:
+            return None
+        first_line = version_text.splitlines()[0] if version_text.strip() else ""
+        words = first_line.split()
+        version = words[2] if len(words) > 2 and words[1] == "version" else first_line
+        
+        hls_help = self.run_ffmpeg(executable, "-h", "muxer=hls")
+        hls_options = None
+        if hls_help is not None:
+            # 既收集 -hls_xxx 选项，也收集 hls_flags 等选项下列出的常量（如 single_file）
+            hls_options = sorted(set(re.findall(r'^\s+-?([a-z][a-z0-9_]*)\s', hls_help, re.MULTILINE)))
+        return {
+            'version': version,
+            'muxers': self.parse_listing(self.run_ffmpeg(executable, "-muxers")),
+            'encoders': self.parse_listing(self.run_ffmpeg(executable, "-encoders")),
+            'filters': self.parse_listing(self.run_ffmpeg(executable, "-filters")),
+            'hls_options': hls_options,
+        }
+    
+    def missing_features(self, task):
+        """返回当前 ffmpeg 缺少的、该任务需要的功能列表；能力未知时不报告"""
+        capabilities = self.capabilities()
+        if not capabilities:
+            return []
+        required = [('muxers', 'hls')]
+        if task.get('output_mode') in ('fmp4', 'fmp4_single'):
+            required.append(('hls_options', 'hls_segment_type'))
+        if task.get('output_mode') in ('single', 'fmp4_single'):
+            required.append(('hls_options', 'single_file'))
+        if task.get('abr_ladder'):
+            required += [('hls_options', 'var_stream_map'), ('filters', 'split'), ('filters', 'scale')]
+        if task.get('transcode') or task.get('abr_ladder'):
+            required.append(('encoders', 'libx264'))
+        if task.get('transcode'):
+            required.append(('encoders', 'aac'))
+        return [name for field, name in required
+                if capabilities.get(field) is not None and name not in capabilities[field]]
+
+
+toolchains = {}
+toolchains_lock = threading.Lock()
+
+
+def get_toolchain(ffmpeg_path=None):
+    """返回进程内共享的 FFmpegToolchain（按请求的路径区分）"""
+    with toolchains_lock:
+        toolchain = toolchains.get(ffmpeg_path)
+        if toolchain is None:
+            toolchain = toolchains[ffmpeg_path] = FFmpegToolchain(ffmpeg_path)
+        return toolchain
 
-# 修复控制台窗口问题
-if sys.platform == "win32":
-    import ctypes
-    # 隐藏控制台窗口
-    whnd = ctypes.windll.kernel32.GetConsoleWindow()
-    if whnd != 0:
-        ctypes.windll.user32.ShowWindow(whnd, 0)
-
-try:
-    import tkinter as tk
-    from tkinter import ttk, filedialog, messagebox
-    from tkinter.scrolledtext import ScrolledText
-except ImportError:
-    print("请安装 tkinter 库")
-    sys.exit(1)
 
 class M3U8Converter:
     def __init__(self, ffmpeg_path=None):
-        if ffmpeg_path is None:
-            self.ffmpeg_path = self.find_ffmpeg()
+        # 查找与能力探测由进程内共享的 FFmpegToolchain 完成，创建转换器几乎没有开销
+        self.toolchain = get_toolchain(ffmpeg_path)
+        self.ffmpeg_path = self.toolchain.ffmpeg_path
+        self.ffprobe_path = self.toolchain.ffprobe_path
+        self.is_running = False
+        self.current_process = None
+        self.process_key = id(self)
+        self.stop_requested = False
+        self.timings = {}  # 最近一次转换各阶段耗时（秒）
+        self.output_stats = {}  # 最近一次转换的输出统计：segments、files、bytes
+        self.last_failure = None  # 最近一次失败的分类：category、line、tail
+    
+    def probe_media(self, input_file):
+        """探测输入文件的时长（秒）与大小（字节），失败的字段为 None"""
+        info = {'duration': None, 'size': None}
+        if not is_source_url(input_file):
+            try:
+                info['size'] = os.path.getsize(input_file)
+            except OSError:
+                pass
+        
+        try:
+            result = subprocess.run(
+                [self.ffprobe_path, "-v", "error",
+                 "-show_entries", "format=duration,size",
+                 "-of", "json", str(input_file)],
+                capture_output=True,
+                timeout=60,
+                **hidden_subprocess_kwargs())
+            if result.returncode == 0:
+                fmt = json.loads(result.stdout or b"{}").get('format', {})
+                if fmt.get('duration') not in (None, 'N/A'):
+                    info['duration'] = float(fmt['duration'])
+                if info['size'] is None and fmt.get('size') not in (None, 'N/A'):
+                    info['size'] = int(fmt['size'])
+        except (OSError, subprocess.TimeoutExpired, ValueError):
+            pass
+        return info
+    
+    def probe_streams(self, input_file):
+        """探测输入的流信息，返回 ffprobe 的 streams 列表，失败时返回空列表"""
+        try:
+            result = subprocess.run(
+                [self.ffprobe_path, "-v", "error",
+                 "-show_entries", "stream=index,codec_type,codec_name,width,height,bit_rate",
+                 "-of", "json", str(input_file)],
+                capture_output=True,
+                timeout=60,
+                **hidden_subprocess_kwargs())
+            if result.returncode == 0:
+                return json.loads(result.stdout or b"{}").get('streams', [])
+        except (OSError, subprocess.TimeoutExpired, ValueError):
+            pass
+        return []
+    
+    def probe_keyframes(self, input_file):
+        """包级探测视频关键帧时间戳（不解码），失败时返回空列表"""
+        keyframes = []
+        try:
+            process = subprocess.Popen(
+                [self.ffprobe_path, "-v", "error", "-select_streams", "v:0",
+                 "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(input_file)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                **hidden_subprocess_kwargs())
+            for raw_line in process.stdout:
+                pts_time, _, flags = raw_line.decode('ascii', errors='replace').strip().partition(",")
+                if "K" in flags and pts_time not in ("", "N/A"):
+                    keyframes.append(float(pts_time))
+            process.stdout.close()
+            if process.wait() != 0:
+                return []
+        except (OSError, ValueError):
+            return []
+        return sorted(keyframes)
+    
+    @staticmethod
+    def video_encode_args(transcode, segment_duration):
+        """libx264 视频编码参数，按片段时长强制关键帧使切片均匀"""
+        preset = TRANSCODE_PRESETS[transcode]
+        return ["-c:v", "libx264", "-preset", preset['preset'], "-crf", str(preset['crf']),
+                "-force_key_frames", f"expr:gte(t,n_forced*{segment_duration})"]
+    
+    @staticmethod
+    def audio_encode_args():
+        return ["-c:a", "aac", "-b:a", TRANSCODE_AUDIO_BITRATE]
+    
+    def build_transcode_args(self, transcode, segment_duration, threads=None):
+        """构建软件转码参数：libx264 + AAC"""
+        args = self.video_encode_args(transcode, segment_duration) + self.audio_encode_args()
+        if threads:
+            args += ["-threads", str(threads)]
+        return args
+    
+    def build_abr_args(self, input_file, ladder, output_path, output_filename, transcode=None, threads=None):
+        """构建单次解码、多码率输出的参数
+        
+        源视频流直接复制为第一路（指定 transcode 时改为按预设编码），其余各路由同一次
+        解码经 split/scale 后编码，并按源关键帧强制关键帧，使各路片段边界对齐。
+        返回 (参数列表, 实际各路名称)。
+        """
+        streams = self.probe_streams(input_file)
+        video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+        has_audio = any(stream.get('codec_type') == 'audio' for stream in streams)
+        source_height = video.get('height')
+        # 不放大：只保留低于源分辨率的档位
+        rungs = [rung for rung in ladder if not source_height or rung['height'] < source_height]
+        
+        args = []
+        if rungs:
+            labels = "".join(f"[s{index}]" for index in range(len(rungs)))
+            graph = [f"[0:v:0]split={len(rungs)}{labels}"]
+            graph += [f"[s{index}]scale=-2:{rung['height']}[v{index}]" for index, rung in enumerate(rungs)]
+            args += ["-filter_complex", ";".join(graph)]
+        
+        args += ["-map", "0:v:0"]
+        if has_audio:
+            args += ["-map", "0:a:0"]
+        for index in range(len(rungs)):
+            args += ["-map", f"[v{index}]"]
+            if has_audio:
+                args += ["-map", "0:a:0"]
+        
+        if transcode:
+            preset = TRANSCODE_PRESETS[transcode]
+            args += ["-c:v:0", "libx264", "-preset:v:0", preset['preset'], "-crf:v:0", str(preset['crf']),
+                     "-force_key_frames:v:0", "source", "-sc_threshold:v:0", "0"]
+        else:
+            args += ["-c:v:0", "copy"]
+        for index, rung in enumerate(rungs, start=1):
+            bitrate = rung['bitrate_kbps']
+            args += [f"-c:v:{index}", "libx264", f"-preset:v:{index}", "veryfast",
+                     f"-b:v:{index}", f"{bitrate}k", f"-maxrate:v:{index}", f"{bitrate}k",
+                     f"-bufsize:v:{index}", f"{bitrate * 2}k",
+                     f"-force_key_frames:v:{index}", "source", f"-sc_threshold:v:{index}", "0"]
+        if has_audio:
+            args += ["-c:a", "aac", "-b:a", TRANSCODE_AUDIO_BITRATE] if transcode else ["-c:a", "copy"]
+        if threads:
+            args += ["-threads", str(threads)]
+        
+        names = ["source"] + [rung['name'] for rung in rungs]
+        stream_map = []
+        for index, name in enumerate(names):
+            entry = f"v:{index}"
+            if has_audio:
+                entry += f",a:{index}"
+            stream_map.append(f"{entry},name:{name}")
+        args += ["-var_stream_map", " ".join(stream_map),
+                 "-master_pl_name", f"{output_filename}.m3u8"]
+        return args, names
+    
+    def check_ffmpeg(self):
+        """检查 ffmpeg 是否可用（使用缓存的能力信息，通常无需启动 ffmpeg）"""
+        capabilities = self.toolchain.capabilities()
+        if capabilities is None:
+            return False, "未找到 FFmpeg，请确保已安装并添加到系统PATH中"
+        return True, f"FFmpeg 检测成功: {self.ffmpeg_path} (版本 {capabilities['version']})"
+    
+    RESUME_SEEK_EPSILON = 0.05
+    
+    @staticmethod
+    def resume_state_path(output_path, output_filename):
+        return Path(output_path) / f"{output_filename}.resume.json"
+    
+    @staticmethod
+    def resume_fingerprint(input_file, segment_duration, transcode=None, input_args=None, codec_args=None):
+        """续转时必须与上次一致的源文件与转换设置"""
+        fingerprint = {
+            'input': str(input_file),
+            'segment_duration': segment_duration,
+            'transcode': transcode,
+            'input_args': list(input_args or []),
+            'codec_args': list(codec_args or []),
+        }
+        if not is_source_url(input_file):
+            try:
+                stat = os.stat(input_file)
+                fingerprint['size'] = stat.st_size
+                fingerprint['mtime_ns'] = stat.st_mtime_ns
+            except OSError:
+                pass
+        return fingerprint
+    
+    def load_resume_state(self, output_path, output_filename):
+        try:
+            with open(self.resume_state_path(output_path, output_filename), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def save_resume_state(self, output_path, output_filename, fingerprint):
+        try:
+            with open(self.resume_state_path(output_path, output_filename), 'w', encoding='utf-8') as f:
+                json.dump(fingerprint, f, ensure_ascii=False)
+        except OSError:
+            pass
+    
+    def find_resume_point(self, m3u8_file, output_path, output_filename, fingerprint=None, is_keyframe=None):
+        """检测中断的转换，返回 {'segments': 已完成片段数, 'offset': 续转起点秒数}
+        
+        播放列表只在片段写完后才登记该片段，因此列表中的片段视为已完成；
+        最后一个片段校验不通过时回退一个片段。列表之后残留的半成品片段会被删除。
+        fingerprint 与上次转换记录的不一致（源文件或设置已变化），或 is_keyframe(offset)
+        确认续转起点不是关键帧（流复制无法在该处无缝衔接）时，删除旧列表登记的片段，不续转。
+        无可续转内容时返回 None。
+        """
+        try:
+            text = m3u8_file.read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            return None
+        playlist = parse_media_playlist(text)
+        if playlist['ended']:
+            return None
+        
+        listed = playlist['segments']
+        segments = list(listed)
+        while segments and not is_complete_ts_segment(output_path / segments[-1]['uri']):
+            segments.pop()
+        offset = sum(segment['duration'] for segment in segments)
+        
+        if fingerprint is not None and self.load_resume_state(output_path, output_filename) != fingerprint:
+            # 旧片段无法与新的输出拼接
+            self.remove_segments(output_path, listed)
+            return None
+        if not segments:
+            return None
+        if is_keyframe is not None and not is_keyframe(offset):
+            self.remove_segments(output_path, listed)
+            return None
+        
+        # 截断播放列表到最后一个完整片段
+        kept_lines = text.splitlines()[:segments[-1]['line'] + 1]
+        m3u8_file.write_text("\n".join(kept_lines) + "\n", encoding='utf-8')
+        
+        # 只删除本输出的编号片段（<名称>_<序号>.ts），不触及其他名称的文件
+        kept = {segment['uri'] for segment in segments}
+        pattern = re.compile(re.escape(output_filename) + r"_\d+\.ts")
+        for segment_file in output_path.glob(f"{output_filename}_*.ts"):
+            if pattern.fullmatch(segment_file.name) and segment_file.name not in kept:
+                segment_file.unlink()
+        
+        return {'segments': len(segments), 'offset': offset}
+    
+    @staticmethod
+    def remove_segments(output_path, segments):
+        """删除播放列表登记的片段文件"""
+        for segment in segments:
+            try:
+                (output_path / segment['uri']).unlink()
+            except OSError:
+                pass
+    
+    def resume_keyframe_check(self, input_file, keyframe_index=None):
+        """生成 find_resume_point 的关键帧检查：按需读取（缓存的）关键帧索引"""
+        def is_keyframe(offset):
+            keyframes, _ = (keyframe_index or KeyframeIndex()).get(self, input_file)
+            return is_keyframe_time(keyframes, offset)
+        return is_keyframe
+    
+    def mark_playlist_incomplete(self, m3u8_file):
+        """移除结束标记，使被中止的转换下次可以续转"""
+        try:
+            lines = m3u8_file.read_text(encoding='utf-8').splitlines()
+            kept_lines = [line for line in lines if line.strip() != "#EXT-X-ENDLIST"]
+            if len(kept_lines) != len(lines):
+                m3u8_file.write_text("\n".join(kept_lines) + "\n", encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            pass
+    
+    def convert_to_m3u8_optimized(self, input_file, output_dir, segment_duration=10, 
+                                output_filename=None, log_callback=None, task_id=None,
+                                progress_callback=None, resume=True, abr_ladder=None,
+                                transcode=None, threads=None, output_mode='ts', expected_duration=None,
+                                input_args=None, codec_args=None, network=None, keyframe_index=None):
+        """优化的视频转换方法
+        
+        progress_callback(task_id, progress) 在 ffmpeg 每次输出进度时被调用，
+        progress 为包含 percent/speed/eta/out_time/total_size 的字典。
+        resume 为 True 时从上次中断处的最后一个完整片段继续转换。
+        abr_ladder 非空时输出多码率阶梯：源流复制一路加各缩放档位，并生成主播放列表。
+        transcode 为 TRANSCODE_PRESETS 中的预设名时改为 libx264/AAC 软件转码，
+        threads 限制该 ffmpeg 进程的解码与编码线程数。
+        output_mode 为 OUTPUT_MODES 之一：TS 片段、fMP4 片段，或以字节范围引用的单文件输出。
+        expected_duration 为已知的输入时长，用于确定片段序号位数，缺省时自动探测。
+        input_args 加在 -i 之前，codec_args 替换默认的 -c copy（自动修复重试时使用）。
+        input_file 可以是 HTTP(S) 地址（单文件或 HLS 播放列表），由 ffmpeg 边下载边切片，
+        network 覆盖 NETWORK_DEFAULTS 中的重连、超时与预读设置。
+        视频流复制时只在续转起点恰为关键帧时续转，keyframe_index 为查询关键帧所用的 KeyframeIndex。
+        失败时 last_failure 记录失败类别与 ffmpeg 输出尾部，尾部同时写入输出目录的 <名称>.ffmpeg.log。
+        """
+        if self.stop_requested:
+            return False, "已停止"
+        try:
+            job = self.prepare_job(input_file, output_dir, segment_duration, output_filename, log_callback,
+                                   task_id, resume, abr_ladder, transcode, threads, output_mode,
+                                   expected_duration, input_args, codec_args, network, keyframe_index)
+            
+            # 执行转换（隐藏FFmpeg窗口，登记后可被停止、取消或暂停）
+            phase_start = time.perf_counter()
+            self.current_process = process_registry.spawn(
+                self.process_key,
+                job['cmd'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=False,
+                bufsize=8192
+            )
+            if self.stop_requested:
+                # 启动前后恰好收到停止请求
+                self.is_running = False
+                process_registry.terminate([self.process_key])
+            
+            # 逐行读取进度，仅保留最近的日志行
+            for raw_line in self.current_process.stdout:
+                self.handle_output_line(job, raw_line, progress_callback, phase_start)
+            self.current_process.stdout.close()
+            
+            return_code = self.current_process.wait()
+            self.timings['ffmpeg'] = time.perf_counter() - phase_start
+            return self.finish_job(job, return_code)
+                
+        except Exception as e:
+            error_msg = f"转换过程中出错: {str(e)}"
+            if log_callback:
+                log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
+            return False, error_msg
+        finally:
+            if self.current_process:
+                process_registry.unregister(self.process_key, self.current_process)
+            self.is_running = False
+            self.current_process = None
+    
+    async def convert_async(self, executor=None, progress_callback=None, timeout=None,
+                            stall_timeout=FFMPEG_STALL_TIMEOUT, **options):
+        """convert_to_m3u8_optimized 的 asyncio 版本，参数 options 与其相同
+        
+        ffmpeg 由事件循环启动并异步读取输出，不占用线程；准备命令与校验输出等阻塞步骤
+        交给 executor（线程池）。timeout 为整个转换的时限，stall_timeout 为无任何输出的时限
+        （暂停中的任务不计），超时后结束进程组并以 'timeout' 类别失败。任务被取消时同样结束进程组。
+        """
+        if self.stop_requested:
+            return False, "已停止"
+        loop = asyncio.get_running_loop()
+        task_id = options.get('task_id')
+        log_callback = options.get('log_callback')
+        process = None
+        handle = None
+        try:
+            job = await loop.run_in_executor(executor, functools.partial(self.prepare_job, **options))
+            phase_start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                *job['cmd'], **process_registry.spawn_kwargs(stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+            handle = process_registry.register(self.process_key, AsyncProcessHandle(process))
+            if self.stop_requested:
+                self.is_running = False
+                await terminate_process_async(process)
+            
+            deadline = loop.time() + timeout if timeout else None
+            timed_out = None
+            while True:
+                wait = stall_timeout
+                if deadline is not None:
+                    wait = max(0.0, min(wait, deadline - loop.time()))
+                try:
+                    raw_line = await asyncio.wait_for(process.stdout.readline(), wait)
+                except asyncio.TimeoutError:
+                    if deadline is not None and loop.time() >= deadline:
+                        timed_out = f"超过时限 {timeout:g} 秒"
+                    elif process_registry.is_paused(self.process_key):
+                        continue
+                    else:
+                        timed_out = f"{stall_timeout:g} 秒内没有任何输出"
+                    await terminate_process_async(process)
+                    break
+                if not raw_line:
+                    break
+                self.handle_output_line(job, raw_line, progress_callback, phase_start)
+            
+            return_code = await process.wait()
+            self.timings['ffmpeg'] = time.perf_counter() - phase_start
+            if timed_out:
+                self.last_failure = {'category': 'timeout', 'line': timed_out, 'tail': list(job['parser'].tail)}
+                error_msg = f"转换超时: {timed_out}"
+                if log_callback:
+                    log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
+                return False, error_msg
+            return await loop.run_in_executor(executor, self.finish_job, job, return_code)
+        
+        except asyncio.CancelledError:
+            self.request_stop()
+            if process is not None:
+                await terminate_process_async(process)
+            raise
+        except Exception as e:
+            error_msg = f"转换过程中出错: {str(e)}"
+            if log_callback:
+                log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
+            return False, error_msg
+        finally:
+            if handle is not None:
+                process_registry.unregister(self.process_key, handle)
+            self.is_running = False
+    
+    def prepare_job(self, input_file, output_dir, segment_duration=10, output_filename=None, log_callback=None,
+                    task_id=None, resume=True, abr_ladder=None, transcode=None, threads=None, output_mode='ts',
+                    expected_duration=None, input_args=None, codec_args=None, network=None, keyframe_index=None):
+        """转换前的准备：创建输出目录、查找续转点并构建 ffmpeg 命令（可能探测输入时长）
+        
+        返回 finish_job 所需的上下文字典，参数含义同 convert_to_m3u8_optimized。
+        """
+        self.timings = {}
+        self.output_stats = {}
+        self.last_failure = None
+        phase_start = time.perf_counter()
+        self.is_running = True
+        input_file = str(input_file)
+        output_path = Path(output_dir)
+        
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        if not output_filename:
+            output_filename = source_stem(input_file)
+        
+        m3u8_file = output_path / f"{output_filename}.m3u8"
+        
+        resume_point = None
+        # 仅独立 TS 片段支持续转（需要逐片段校验完整性）
+        if output_mode == 'ts' and not abr_ladder:
+            fingerprint = self.resume_fingerprint(input_file, segment_duration, transcode, input_args, codec_args)
+            if resume and m3u8_file.exists():
+                # 重编码视频时输入端定位是精确的；流复制只能从关键帧开始，起点必须恰为关键帧
+                is_keyframe = (self.resume_keyframe_check(input_file, keyframe_index)
+                               if copies_video(transcode, codec_args) else None)
+                resume_point = self.find_resume_point(m3u8_file, output_path, output_filename, fingerprint,
+                                                      is_keyframe)
+            self.save_resume_state(output_path, output_filename, fingerprint)
+        
+        if log_callback:
+            if resume_point:
+                log_callback(f"[任务{task_id}] 续转: {source_name(input_file)}，已有 {resume_point['segments']} 个片段，"
+                             f"从 {format_eta(resume_point['offset'])} 继续", task_id)
+            else:
+                log_callback(f"[任务{task_id}] 开始转换: {source_name(input_file)}", task_id)
+        
+        # 构建优化的FFmpeg命令
+        cmd = [self.ffmpeg_path]
+        if threads and (transcode or abr_ladder):
+            cmd += ["-threads", str(threads)]
+        if resume_point:
+            # 片段边界即关键帧，输入端定位到该处后流复制即可无缝衔接
+            cmd += ["-ss", f"{resume_point['offset'] + self.RESUME_SEEK_EPSILON:.6f}"]
+        cmd += list(input_args or [])
+        if is_source_url(input_file):
+            network_args, input_url = network_input(input_file, network)
+            cmd += network_args + ["-i", input_url]
+        else:
+            cmd += ["-i", input_file]
+        if abr_ladder:
+            abr_args, variant_names = self.build_abr_args(input_file, abr_ladder, output_path, output_filename,
+                                                          transcode=transcode, threads=threads)
+            cmd += abr_args
+            if log_callback:
+                log_callback(f"[任务{task_id}] 📶 多码率输出: {', '.join(variant_names)}", task_id)
+        elif transcode:
+            cmd += self.build_transcode_args(transcode, segment_duration, threads)
+        elif codec_args:
+            cmd += codec_args
         else:
-            self.ffmpeg_path = ffmpeg_path
+            cmd += ["-c", "copy"]
+        
+        number_width = 3
+        if output_mode in ('ts', 'fmp4'):
+            if expected_duration is None:
+                expected_duration = self.probe_media(input_file).get('duration')
+            number_width = segment_number_width(expected_duration, segment_duration)
+        base_name = f"{output_filename}_%v" if abr_ladder else output_filename
+        output_args, hls_flags = hls_output_args(output_mode, output_path, base_name, number_width)
+        cmd += output_args
+        cmd += [
+            "-f", "hls",
+            "-hls_time", str(segment_duration),
+            "-hls_list_size", "0",
+            "-avoid_negative_ts", "make_zero",
+            "-fflags", "+genpts",
+            "-progress", "pipe:1",
+            "-nostats"
+        ]
+        if resume_point:
+            # append_list 读入已有列表并接着其片段序号写入，不能再指定 -start_number
+            hls_flags += ["append_list"]
+        if hls_flags:
+            cmd += ["-hls_flags", "+".join(hls_flags)]
+        if abr_ladder:
+            # 各路播放列表为 <名称>_<档位>.m3u8，主播放列表沿用 <名称>.m3u8
+            cmd += ["-y", str(output_path / f"{output_filename}_%v.m3u8")]
+        else:
+            cmd += ["-y", str(m3u8_file)]
+        
+        if task_id is not None:
+            self.process_key = task_id
+        self.timings['prepare'] = time.perf_counter() - phase_start
+        return {
+            'cmd': cmd,
+            'task_id': task_id,
+            'log_callback': log_callback,
+            'output_path': output_path,
+            'output_filename': output_filename,
+            'm3u8_file': m3u8_file,
+            'expected_duration': expected_duration,
+            'parser': FFmpegProgressParser(offset=resume_point['offset'] if resume_point else 0.0)
+        }
+    
+    def handle_output_line(self, job, raw_line, progress_callback, phase_start):
+        """处理 ffmpeg 的一行输出：更新进度与错误尾部"""
+        progress = job['parser'].feed(raw_line.decode('utf-8', errors='replace'))
+        if progress and 'startup' not in self.timings:
+            self.timings['startup'] = time.perf_counter() - phase_start
+        if progress and progress_callback:
+            progress_callback(job['task_id'], progress)
+    
+    def finish_job(self, job, return_code):
+        """ffmpeg 退出后的处理：校验输出或对失败分类，返回 (success, message)"""
+        task_id = job['task_id']
+        log_callback = job['log_callback']
+        parser = job['parser']
+        m3u8_file = job['m3u8_file']
+        if not self.is_running:
+            # 被用户中止时 ffmpeg 仍会写入结束标记，去掉它以便下次续转
+            self.mark_playlist_incomplete(m3u8_file)
+        
+        if return_code == 0 and self.is_running:
+            phase_start = time.perf_counter()
+            verification = PlaylistVerifier(self).verify(m3u8_file, job['expected_duration'] or parser.duration)
+            self.timings['verify'] = time.perf_counter() - phase_start
+            self.output_stats = {key: verification[key] for key in ('segments', 'files', 'bytes')}
             
+            if verification['ok']:
+                success_msg = (f"转换成功！生成 {verification['segments']} 个片段"
+                               f"（{verification['files']} 个文件）")
+                if verification['warnings']:
+                    success_msg += f"，注意: {verification['warnings'][0]}"
+                self.failure_log_path(job['output_path'], job['output_filename']).unlink(missing_ok=True)
+                self.resume_state_path(job['output_path'], job['output_filename']).unlink(missing_ok=True)
+                if log_callback:
+                    log_callback(f"[任务{task_id}] ✅ {success_msg}", task_id)
+                return True, success_msg
+            else:
+                # 输出不完整通常伴随时间戳或损坏数据警告，按同样的类别尝试修复
+                self.record_failure(parser, job['cmd'], job['output_path'], job['output_filename'])
+                error_msg = f"转换完成但输出校验失败: {verification['problems'][0]}"
+                if log_callback:
+                    log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
+                return False, error_msg
+        elif not self.is_running:
+            error_msg = "已停止"
+            if log_callback:
+                log_callback(f"[任务{task_id}] ⏹️ {error_msg}", task_id)
+            return False, error_msg
+        else:
+            failure = self.record_failure(parser, job['cmd'], job['output_path'], job['output_filename'])
+            error_msg = f"转换失败（{describe_failure(failure['category'])}），返回码: {return_code}"
+            if failure['line']:
+                error_msg += f" ({failure['line']})"
+            if log_callback:
+                log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
+            return False, error_msg
+    
+    @staticmethod
+    def failure_log_path(output_path, output_filename):
+        return Path(output_path) / f"{output_filename}.ffmpeg.log"
+    
+    def record_failure(self, parser, cmd, output_path, output_filename):
+        """对失败分类并把命令与 ffmpeg 输出尾部写入日志文件，返回 last_failure"""
+        category = classify_failure(parser.failure_lines)
+        line = parser.failure_lines.get(category) or (parser.tail[-1] if parser.tail else "")
+        self.last_failure = {'category': category, 'line': line, 'tail': list(parser.tail)}
+        try:
+            with open(self.failure_log_path(output_path, output_filename), 'w', encoding='utf-8') as f:
+                f.write(subprocess.list2cmdline(cmd) + "\n\n")
+                f.write(f"# {describe_failure(category)}\n")
+                f.write("\n".join(parser.tail) + "\n")
+        except OSError:
+            pass
+        return self.last_failure
+    
+    def request_stop(self):
+        """标记为已停止（不等待进程退出），进程由 process_registry 统一结束"""
+        self.stop_requested = True
         self.is_running = False
-        self.current_process = None
+    
+    def stop_conversion(self):
+        """停止转换过程：结束 ffmpeg 进程组，宽限期后强制结束"""
+        self.request_stop()
+        process_registry.terminate([self.process_key])
+
+
+class M3U8BatchConverterGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("M3U8 批量视频分割工具 v2.0")
+        self.root.geometry("1200x800")
+        
+        # 设置程序图标 - 新增代码
+        self.set_window_icon()
+        
+        # 初始化变量
+        self.video_files = {}  # 绝对路径 -> 列表项，用于 O(1) 去重与移除
+        self.folder_scanner = None
+        self.conversion_tasks = []
+        self.is_converting = False
+        self.file_paths = {}
+        self.max_workers = min(4, (os.cpu_count() or 1))
+        self.completed_tasks = 0
+        self.submitted_tasks = 0
+        self.task_results = {}
+        self.task_progress = {}
+        self.schedule_plan = None
+        self.metrics = None  # 当前批次的 BatchMetrics
+        self.autotuner = None
+        self.engine = None  # 当前批次的 AsyncConversionEngine，线程池模式为 None
+        self.cache = None
+        self.parallel_tasks = self.max_workers
+        self.keyframe_index = KeyframeIndex()
+        self.active_converters = {}  # 任务编号 -> 运行中的转换器
+        self.converters_lock = threading.Lock()
+        self.cancelled_tasks = set()
+        self.next_task_index = 0  # 下一个待提交的任务，线程池中只保留有限个排队任务
+        self.job_store = None  # 当前批次的持久化记录，程序异常退出后可恢复
+        self.claim_from_store = False  # 为 True 时按任务记录领取任务
+        self.task_ids = {}  # (输入, 输出目录) -> 任务编号
+        self.restored_tasks = {}  # 输入 -> 恢复的批次中保存的任务设置（JOB_TASK_FIELDS）
+        
+        # 工作线程只向队列写入，由界面线程按节拍批量取出
+        self.ui_queue = queue.Queue()
+        self.pending_progress = {}
+        self.progress_lock = threading.Lock()
+        self.status_updates = {}
+        
+        # 设置界面
+        self.setup_ui()
+        self.process_ui_queue()
+        
+        # 启动时检查 FFmpeg
+        self.check_ffmpeg_on_startup()
+        self.root.after(200, self.restore_unfinished_batch)
+    
+    def set_window_icon(self):
+        """设置窗口图标"""
+        try:
+            # 方法1: 尝试从ICO文件加载
+            icon_path = self.find_icon_file()
+            if icon_path and os.path.exists(icon_path):
+                self.root.iconbitmap(icon_path)
+                print(f"✅ 已设置程序图标: {icon_path}")
+                return
+            
+            # 方法2: 尝试从可执行文件资源加载（打包后）
+            if getattr(sys, 'frozen', False):
+                # 打包环境：尝试从exe文件加载图标
+                exe_path = sys.executable
+                self.root.iconbitmap(exe_path)
+                print("✅ 已使用可执行文件图标")
+                return
+                
+            # 方法3: 使用默认图标或创建空图标
+            self.root.iconbitmap(default="")
+            print("ℹ️  使用默认图标")
+            
+        except Exception as e:
+            print(f"⚠️  设置图标失败: {e}")
+            # 设置空图标作为后备
+            try:
+                self.root.iconbitmap(default="")
+            except:
+                pass
+
+    def find_icon_file(self):
+        """查找图标文件"""
+        possible_paths = []
+        
+        # 打包环境
+        if getattr(sys, 'frozen', False):
+            base_dir = os.path.dirname(sys.executable)
+            possible_paths.extend([
+                os.path.join(base_dir, 'icon.ico'),
+                os.path.join(base_dir, 'resources', 'icon.ico'),
+                os.path.join(base_dir, '_internal', 'icon.ico')
+            ])
+            
+            if hasattr(sys, '_MEIPASS'):
+                possible_paths.append(os.path.join(sys._MEIPASS, 'icon.ico'))
+        
+        # 开发环境
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        possible_paths.extend([
+            os.path.join(script_dir, 'icon.ico'),
+            os.path.join(script_dir, 'resources', 'icon.ico'),
+            os.path.join(script_dir, '..', 'resources', 'icon.ico')
+        ])
+        
+        # 检查所有可能的路径
+        for path in possible_paths:
+            if os.path.exists(path):
+                return path
+        
+        return None
+    
+    
+    def setup_ui(self):
+        """设置用户界面"""
+        # 主框架
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 左侧视频列表框架
+        left_frame = ttk.LabelFrame(main_frame, text="视频文件列表", padding="10")
+        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        
+        # 右侧控制和日志框架
+        right_frame = ttk.Frame(main_frame)
+        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        
+        # 设置各个部分
+        self.setup_video_list(left_frame)
+        self.setup_control_panel(right_frame)
+        self.setup_log_panel(right_frame)
+    
+    def setup_video_list(self, parent):
+        """设置视频列表界面"""
+        # 按钮框架
+        button_frame = ttk.Frame(parent)
+        button_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Button(button_frame, text="添加文件", command=self.add_files).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="添加文件夹", command=self.add_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="添加链接", command=self.add_urls).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="移除选中", command=self.remove_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="清空列表", command=self.clear_list).pack(side=tk.LEFT, padx=5)
         
-    def find_ffmpeg(self):
-        """自动查找 ffmpeg 可执行文件 - 优化版本"""
-        possible_paths = []
+        ttk.Button(button_frame, text="全选", command=self.select_all).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(button_frame, text="取消全选", command=self.deselect_all).pack(side=tk.RIGHT, padx=5)
         
-        # 1. 检查打包后的环境
-        if getattr(sys, 'frozen', False):
-            base_dir = os.path.dirname(sys.executable)
-            possible_paths.append(os.path.join(base_dir, 'ffmpeg.exe'))
-            
-            if hasattr(sys, '_MEIPASS'):
-                possible_paths.append(os.path.join(sys._MEIPASS, 'ffmpeg.exe'))
+        # 文件夹扫描选项
+        scan_frame = ttk.Frame(parent)
+        scan_frame.pack(fill=tk.X, pady=(0, 10))
+        self.recursive_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(scan_frame, text="包含子文件夹", variable=self.recursive_var).pack(side=tk.LEFT)
+        ttk.Label(scan_frame, text="包含:").pack(side=tk.LEFT, padx=(10, 0))
+        self.include_entry = ttk.Entry(scan_frame, width=12)
+        self.include_entry.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(scan_frame, text="排除:").pack(side=tk.LEFT, padx=(10, 0))
+        self.exclude_entry = ttk.Entry(scan_frame, width=12)
+        self.exclude_entry.pack(side=tk.LEFT, padx=(5, 0))
+        self.scan_status_label = ttk.Label(scan_frame, text="")
+        self.scan_status_label.pack(side=tk.RIGHT)
         
-        # 2. 检查开发环境
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        possible_paths.append(os.path.join(script_dir, 'resources', 'ffmpeg.exe'))
-        possible_paths.append(os.path.join(script_dir, 'ffmpeg.exe'))
+        # 视频列表
+        list_frame = ttk.Frame(parent)
+        list_frame.pack(fill=tk.BOTH, expand=True)
         
-        # 3. 检查路径
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
+        columns = ("选择", "文件名", "大小", "状态")
+        self.video_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        
+        self.video_tree.heading("选择", text="✓")
+        self.video_tree.heading("文件名", text="文件名")
+        self.video_tree.heading("大小", text="文件大小")
+        self.video_tree.heading("状态", text="状态")
+        
+        self.video_tree.column("选择", width=40, anchor="center")
+        self.video_tree.column("文件名", width=250)
+        self.video_tree.column("大小", width=100, anchor="center")
+        self.video_tree.column("状态", width=80, anchor="center")
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.video_tree.yview)
+        self.video_tree.configure(yscrollcommand=scrollbar.set)
+        
+        self.video_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.video_tree.bind("<Double-1>", self.on_item_double_click)
+    
+    def setup_control_panel(self, parent):
+        """设置控制面板"""
+        control_frame = ttk.LabelFrame(parent, text="转换设置", padding="10")
+        control_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # 输出目录
+        output_frame = ttk.Frame(control_frame)
+        output_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(output_frame, text="输出目录:").pack(side=tk.LEFT)
+        
+        output_input_frame = ttk.Frame(output_frame)
+        output_input_frame.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(10, 5))
+        self.output_entry = ttk.Entry(output_input_frame)
+        self.output_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(output_input_frame, text="浏览", command=self.browse_output_dir, width=8).pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # 片段时长
+        duration_frame = ttk.Frame(control_frame)
+        duration_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(duration_frame, text="片段时长:").pack(side=tk.LEFT)
+        self.duration_entry = ttk.Entry(duration_frame, width=10)
+        self.duration_entry.insert(0, "10")
+        self.duration_entry.pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Label(duration_frame, text="秒").pack(side=tk.LEFT)
+        ttk.Label(duration_frame, text="关键帧分析:").pack(side=tk.LEFT, padx=(15, 0))
+        self.gop_plan_var = tk.StringVar(value=GOP_PLAN_MODES['off'])
+        ttk.Combobox(duration_frame, textvariable=self.gop_plan_var, state="readonly", width=8,
+                     values=list(GOP_PLAN_MODES.values())).pack(side=tk.LEFT, padx=(10, 5))
+        
+        # 多码率阶梯
+        abr_frame = ttk.Frame(control_frame)
+        abr_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(abr_frame, text="多码率阶梯:").pack(side=tk.LEFT)
+        self.abr_entry = ttk.Entry(abr_frame, width=24)
+        self.abr_entry.pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Label(abr_frame, text="如 720:2800k,480:1400k，留空则仅复制源流").pack(side=tk.LEFT)
+        
+        # 视频编码
+        codec_frame = ttk.Frame(control_frame)
+        codec_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(codec_frame, text="视频编码:").pack(side=tk.LEFT)
+        self.transcode_var = tk.StringVar(value="copy")
+        ttk.Combobox(codec_frame, textvariable=self.transcode_var, state="readonly", width=10,
+                     values=["copy"] + list(TRANSCODE_PRESETS)).pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Label(codec_frame, text="copy 为直接复制；其余为 x264/AAC 转码预设").pack(side=tk.LEFT)
+        
+        # 输出格式
+        mode_frame = ttk.Frame(control_frame)
+        mode_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(mode_frame, text="输出格式:").pack(side=tk.LEFT)
+        self.output_mode_var = tk.StringVar(value=OUTPUT_MODES['ts'])
+        ttk.Combobox(mode_frame, textvariable=self.output_mode_var, state="readonly", width=22,
+                     values=list(OUTPUT_MODES.values())).pack(side=tk.LEFT, padx=(10, 5))
+        
+        # 并行任务
+        parallel_frame = ttk.Frame(control_frame)
+        parallel_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(parallel_frame, text="并行任务数:").pack(side=tk.LEFT)
+        self.parallel_var = tk.StringVar(value=str(self.max_workers))
+        self.thread_parallel_limit = min(8, self.max_workers * 2)
+        self.parallel_spinbox = ttk.Spinbox(parallel_frame, from_=1, to=self.thread_parallel_limit,
+                                             textvariable=self.parallel_var, width=5)
+        self.parallel_spinbox.pack(side=tk.LEFT, padx=(10, 5))
+        self.auto_parallel_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(parallel_frame, text="自动（按磁盘吞吐调整）",
+                        variable=self.auto_parallel_var).pack(side=tk.LEFT, padx=5)
+        self.async_engine_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(parallel_frame, text="异步引擎（大量流复制任务）", variable=self.async_engine_var,
+                        command=self.update_parallel_limit).pack(side=tk.LEFT, padx=5)
+        
+        # 调度方式
+        schedule_frame = ttk.Frame(control_frame)
+        schedule_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(schedule_frame, text="调度方式:").pack(side=tk.LEFT)
+        self.schedule_var = tk.StringVar(value=SCHEDULE_MODES['fifo'])
+        schedule_combo = ttk.Combobox(schedule_frame, textvariable=self.schedule_var, state="readonly",
+                                      values=list(SCHEDULE_MODES.values()), width=10)
+        schedule_combo.pack(side=tk.LEFT, padx=(10, 5))
+        self.skip_unchanged_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(schedule_frame, text="跳过未变化的文件",
+                        variable=self.skip_unchanged_var).pack(side=tk.LEFT, padx=5)
+        
+        # 控制按钮
+        button_frame = ttk.Frame(control_frame)
+        button_frame.pack(fill=tk.X, pady=10)
+        
+        self.start_selected_btn = ttk.Button(button_frame, text="开始转换选中项", 
+                                           command=self.start_selected_conversion, width=18)
+        self.start_selected_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.start_all_btn = ttk.Button(button_frame, text="开始转换全部", 
+                                      command=self.start_all_conversion, width=18)
+        self.start_all_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.stop_btn = ttk.Button(button_frame, text="停止转换", 
+                                 command=self.stop_conversion, state=tk.DISABLED, width=18)
+        self.stop_btn.pack(side=tk.LEFT, padx=5)
+        
+        # 单个任务控制（作用于列表中选中的任务）
+        task_button_frame = ttk.Frame(control_frame)
+        task_button_frame.pack(fill=tk.X, pady=(0, 5))
+        self.cancel_task_btn = ttk.Button(task_button_frame, text="取消选中任务",
+                                          command=self.cancel_selected_tasks, state=tk.DISABLED, width=18)
+        self.cancel_task_btn.pack(side=tk.LEFT, padx=5)
+        self.pause_task_btn = ttk.Button(task_button_frame, text="暂停/继续选中任务",
+                                         command=self.toggle_pause_selected_tasks, state=tk.DISABLED, width=18)
+        self.pause_task_btn.pack(side=tk.LEFT, padx=5)
+        
+        # 进度显示
+        progress_frame = ttk.Frame(control_frame)
+        progress_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(progress_frame, text="总体进度:").pack(side=tk.LEFT)
+        self.progress_label = ttk.Label(progress_frame, text="0/0")
+        self.progress_label.pack(side=tk.LEFT, padx=(10, 0))
+        
+        self.overall_progress = ttk.Progressbar(control_frame, mode='determinate')
+        self.overall_progress.pack(fill=tk.X, pady=5)
+        
+        # 并行任务状态
+        parallel_status_frame = ttk.Frame(control_frame)
+        parallel_status_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(parallel_status_frame, text="运行中任务:").pack(side=tk.LEFT)
+        self.parallel_status_label = ttk.Label(parallel_status_frame, text="0")
+        self.parallel_status_label.pack(side=tk.LEFT, padx=(10, 0))
+    
+    def setup_log_panel(self, parent):
+        """设置日志面板"""
+        log_frame = ttk.LabelFrame(parent, text="转换日志", padding="10")
+        log_frame.pack(fill=tk.BOTH, expand=True)
         
-        # 4. 检查系统PATH
+        self.log_text = ScrolledText(log_frame, width=80, height=20, state=tk.DISABLED, font=("Consolas", 9))
+        self.log_text.pack(fill=tk.BOTH, expand=True)
+    
+    def update_parallel_limit(self):
+        """按所选引擎调整并行任务数的上限：异步引擎可达 ASYNC_MAX_PARALLEL"""
+        limit = ASYNC_MAX_PARALLEL if self.async_engine_var.get() else self.thread_parallel_limit
+        self.parallel_spinbox.config(to=limit)
         try:
-            # 使用不显示窗口的方式检查
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = 0
-            
-            subprocess.run(["ffmpeg", "-version"], 
-                         capture_output=True, 
-                         check=True,
-                         startupinfo=startupinfo)
-            return "ffmpeg"
-        except:
+            if int(self.parallel_var.get()) > limit:
+                self.parallel_var.set(str(limit))
+        except ValueError:
             pass
-                
-        return "ffmpeg"
     
-    def check_ffmpeg(self):
-        """检查 ffmpeg 是否可用"""
-        try:
-            # 隐藏ffmpeg检查时的窗口
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = 0
-            
-            result = subprocess.run([self.ffmpeg_path, "-version"], 
-                                  capture_output=True, 
-                                  check=True,
-                                  startupinfo=startupinfo)
-            return True, f"FFmpeg 检测成功: {self.ffmpeg_path}"
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False, "未找到 FFmpeg，请确保已安装并添加到系统PATH中"
+    def check_ffmpeg_on_startup(self):
+        """启动时在后台检查 FFmpeg，首次探测能力信息时界面也不会卡住"""
+        self.converter = M3U8Converter()
+        
+        def check():
+            success, message = self.converter.check_ffmpeg()
+            if success:
+                self.log_message(f"✅ {message}")
+            else:
+                self.log_message(f"⚠️ {message}")
+        
+        threading.Thread(target=check, daemon=True).start()
     
-    def convert_to_m3u8_optimized(self, input_file, output_dir, segment_duration=10, 
-                                output_filename=None, log_callback=None, task_id=None):
-        """优化的视频转换方法"""
+    def restore_unfinished_batch(self):
+        """上次批次有未完成的任务（程序被关闭或崩溃）时询问是否重新加入列表"""
         try:
-            self.is_running = True
-            input_path = Path(input_file)
-            output_path = Path(output_dir)
-            
-            output_path.mkdir(parents=True, exist_ok=True)
-            
-            if not output_filename:
-                output_filename = input_path.stem
-            
-            m3u8_file = output_path / f"{output_filename}.m3u8"
-            ts_pattern = output_path / f"{output_filename}_%03d.ts"
-            
-            if log_callback:
-                log_callback(f"[任务{task_id}] 开始转换: {input_path.name}", task_id)
-            
-            # 构建优化的FFmpeg命令
-            cmd = [
-                self.ffmpeg_path,
-                "-i", str(input_path),
-                "-c", "copy",
-                "-f", "hls",
-                "-hls_time", str(segment_duration),
-                "-hls_list_size", "0",
-                "-hls_segment_filename", str(ts_pattern),
-                "-avoid_negative_ts", "make_zero",
-                "-fflags", "+genpts",
-                "-y",
-                str(m3u8_file)
-            ]
-            
-            # 隐藏FFmpeg窗口
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = 0
-            
-            # 执行转换
-            self.current_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=False,
-                bufsize=8192,
-                startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            # 快速读取输出
-            output, _ = self.current_process.communicate()
-            
-            return_code = self.current_process.wait()
-            
-            if return_code == 0 and self.is_running:
-                m3u8_exists = m3u8_file.exists()
-                ts_files = list(output_path.glob(f"{output_filename}_*.ts"))
-                
-                if m3u8_exists and ts_files:
-                    success_msg = f"转换成功！生成 {len(ts_files)} 个TS片段"
-                    if log_callback:
-                        log_callback(f"[任务{task_id}] ✅ {success_msg}", task_id)
-                    return True, success_msg
-                else:
-                    error_msg = "转换完成但未生成预期文件"
-                    if log_callback:
-                        log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
-                    return False, error_msg
-            else:
-                error_msg = f"转换失败，返回码: {return_code}"
-                if log_callback:
-                    log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
-                return False, error_msg
-                
-        except Exception as e:
-            error_msg = f"转换过程中出错: {str(e)}"
-            if log_callback:
-                log_callback(f"[任务{task_id}] ❌ {error_msg}", task_id)
-            return False, error_msg
-        finally:
-            self.is_running = False
-            self.current_process = None
+            self.job_store = JobStore(app_cache_dir("gui_jobs.sqlite"))
+            counts = self.job_store.counts()
+        except (OSError, sqlite3.Error) as e:
+            self.job_store = None
+            self.log_message(f"⚠️ 无法打开任务记录: {e}")
+            return
+        unfinished = counts['queued'] + counts['running']
+        if not unfinished:
+            return
+        if messagebox.askyesno("恢复批次", f"上次批量转换有 {unfinished} 个文件未完成，是否重新加入列表？"):
+            # 按页读取，只保留各任务的设置；开始转换时沿用，续转指纹才能与中断前一致
+            output_dir = None
+            for page in self.job_store.unfinished_tasks():
+                output_dir = output_dir or page[0]['output_dir']
+                for task in page:
+                    self.restored_tasks[task['file_path']] = {key: task[key] for key in JOB_TASK_FIELDS
+                                                              if key in task}
+            self.output_entry.delete(0, tk.END)
+            self.output_entry.insert(0, str(Path(output_dir).parent))
+            self.add_video_paths(list(self.restored_tasks))
+            self.log_message(f"♻️ 已恢复上次未完成的 {len(self.restored_tasks)} 个文件，"
+                             f"开始转换时沿用中断前的输出目录与转换设置")
+        else:
+            self.job_store.clear()
+    
+    def add_files(self):
+        """添加文件到列表"""
+        filetypes = [
+            ("所有视频文件", "*.mp4 *.mkv *.avi *.mov *.wmv *.flv *.webm *.m4v *.3gp *.ts *.m2ts"),
+            ("所有文件", "*.*")
+        ]
+        
+        files = filedialog.askopenfilenames(title="选择视频文件", filetypes=filetypes)
+        if files:
+            self.add_video_paths(files)
+    
+    def add_urls(self):
+        """添加 HTTP(S) 视频或 HLS 播放列表地址（多个地址以空白分隔），转换时由 ffmpeg 直接读取"""
+        text = simpledialog.askstring("添加链接", "视频或 m3u8 地址（http/https，多个以空格分隔）:",
+                                      parent=self.root)
+        if not text:
+            return
+        urls = text.split()
+        invalid = [url for url in urls if not is_source_url(url)]
+        if invalid:
+            self.log_message(f"⚠️ 已忽略不是 http/https 地址的输入: {', '.join(invalid)}")
+        urls = [url for url in urls if is_source_url(url)]
+        if urls:
+            self.add_video_paths(urls)
+    
+    def add_folder(self):
+        """添加文件夹（后台扫描，结果边发现边加入列表）"""
+        folder = filedialog.askdirectory(title="选择视频文件夹")
+        if not folder:
+            return
+        if self.folder_scanner:
+            self.folder_scanner.cancel()
+        
+        scanner = FolderScanner(include=split_patterns(self.include_entry.get()),
+                                exclude=split_patterns(self.exclude_entry.get()),
+                                recursive=self.recursive_var.get())
+        self.folder_scanner = scanner
+        self.scan_status_label.config(text="正在扫描...")
+        self.log_message(f"🔍 开始扫描: {folder}")
+        threading.Thread(target=self.scan_folder_in_background, args=(scanner, folder), daemon=True).start()
+    
+    def scan_folder_in_background(self, scanner, folder):
+        """后台扫描文件夹并把结果分批送到界面线程"""
+        import_state = {'added': 0}
+        start_time = time.perf_counter()
+        
+        def on_batch(files):
+            rows = [(path, format_file_size(size)) for path, size in files]
+            self.call_in_ui(self.insert_video_rows, rows, import_state)
+            self.call_in_ui(self.update_scan_status, scanner, f"已发现 {scanner.file_count} 个文件...")
+        
+        scanner.scan([folder], on_batch)
+        elapsed = time.perf_counter() - start_time
+        summary = (f"扫描{'已取消' if scanner.cancelled else '完成'}: {scanner.dir_count} 个目录, "
+                   f"发现 {scanner.file_count} 个文件, 耗时 {elapsed:.1f}s")
+        if scanner.error_count:
+            summary += f", {scanner.error_count} 个条目无法访问"
+        self.call_in_ui(self.update_scan_status, scanner, f"已发现 {scanner.file_count} 个文件")
+        self.call_in_ui(lambda: self.log_message(f"✅ {summary}，成功添加 {import_state['added']} 个文件"))
+    
+    def update_scan_status(self, scanner, text):
+        """更新扫描计数（忽略已被替换的扫描）"""
+        if scanner is self.folder_scanner:
+            self.scan_status_label.config(text=text)
+    
+    def add_video_paths(self, file_paths):
+        """批量添加视频：后台线程读取文件大小，界面线程按块插入列表（HTTP(S) 地址原样加入）"""
+        pending = [file_path if is_source_url(file_path) else os.path.abspath(file_path)
+                   for file_path in file_paths]
+        pending = [abs_path for abs_path in dict.fromkeys(pending) if abs_path not in self.video_files]
+        if not pending:
+            self.log_message("ℹ️ 没有新的文件需要添加")
+            return
+        
+        import_state = {'added': 0}
+        threading.Thread(target=self.stat_video_paths, args=(pending, import_state), daemon=True).start()
+    
+    def stat_video_paths(self, abs_paths, import_state):
+        """后台读取文件大小并分块提交给界面线程"""
+        rows = []
+        for abs_path in abs_paths:
+            if is_source_url(abs_path):
+                # 不为显示大小发起网络请求，转换时由 ffmpeg 直接读取
+                rows.append((abs_path, "网络"))
+                continue
+            try:
+                rows.append((abs_path, format_file_size(os.path.getsize(abs_path))))
+            except OSError as e:
+                self.log_message(f"❌ 添加文件失败 {abs_path}: {str(e)}")
+                continue
+            if len(rows) >= INSERT_CHUNK_SIZE:
+                self.call_in_ui(self.insert_video_rows, rows, import_state)
+                rows = []
+        if rows:
+            self.call_in_ui(self.insert_video_rows, rows, import_state)
+        self.call_in_ui(lambda: self.log_message(f"✅ 成功添加 {import_state['added']} 个文件"))
+    
+    def insert_video_rows(self, rows, import_state):
+        """在界面线程插入一块文件行"""
+        for abs_path, size_str in rows:
+            if abs_path in self.video_files:
+                continue
+            item_id = self.video_tree.insert("", tk.END, values=("✓", source_name(abs_path), size_str, "等待"))
+            self.video_files[abs_path] = item_id
+            self.file_paths[item_id] = abs_path
+            import_state['added'] += 1
+    
+    def remove_selected(self):
+        """移除选中项"""
+        selected_items = self.video_tree.selection()
+        if selected_items:
+            for item in selected_items:
+                file_path = self.file_paths.pop(item, None)
+                if file_path is not None:
+                    self.video_files.pop(file_path, None)
+                    self.restored_tasks.pop(file_path, None)
+            self.video_tree.delete(*selected_items)
+            self.log_message(f"✅ 已移除 {len(selected_items)} 个文件")
+    
+    def clear_list(self):
+        """清空列表"""
+        if self.folder_scanner:
+            self.folder_scanner.cancel()
+            self.folder_scanner = None
+            self.scan_status_label.config(text="")
+        if self.file_paths:
+            self.video_tree.delete(*self.video_tree.get_children())
+            self.video_files.clear()
+            self.file_paths.clear()
+            self.restored_tasks.clear()
+            self.log_message("✅ 已清空文件列表")
+    
+    def select_all(self):
+        """全选"""
+        for item in self.video_tree.get_children():
+            self.video_tree.set(item, "选择", "✓")
+    
+    def deselect_all(self):
+        """取消全选"""
+        for item in self.video_tree.get_children():
+            self.video_tree.set(item, "选择", "")
+    
+    def on_item_double_click(self, event):
+        """双击切换选择"""
+        item = self.video_tree.identify_row(event.y)
+        if item:
+            current_value = self.video_tree.set(item, "选择")
+            new_value = "✓" if current_value == "" else ""
+            self.video_tree.set(item, "选择", new_value)
+    
+    def browse_output_dir(self):
+        """浏览输出目录"""
+        directory = filedialog.askdirectory(title="选择输出目录")
+        if directory:
+            self.output_entry.delete(0, tk.END)
+            self.output_entry.insert(0, directory)
+    
+    def get_selected_videos(self):
+        """获取选中的视频"""
+        selected_videos = []
+        for item in self.video_tree.get_children():
+            if self.video_tree.set(item, "选择") == "✓":
+                if item in self.file_paths:
+                    file_path = self.file_paths[item]
+                    selected_videos.append((item, file_path))
+        return selected_videos
+    
+    def start_selected_conversion(self):
+        """开始转换选中项"""
+        selected = self.get_selected_videos()
+        if not selected:
+            messagebox.showwarning("警告", "请先选择要转换的视频文件")
+            return
+        output_dir = self.output_entry.get().strip()
+        if not output_dir:
+            messagebox.showerror("错误", "请选择输出目录")
+            return
+        self.start_conversion(selected)
+    
+    def start_all_conversion(self):
+        """开始转换全部"""
+        all_videos = []
+        for item in self.video_tree.get_children():
+            if item in self.file_paths:
+                file_path = self.file_paths[item]
+                all_videos.append((item, file_path))
+        if not all_videos:
+            messagebox.showwarning("警告", "视频列表为空")
+            return
+        output_dir = self.output_entry.get().strip()
+        if not output_dir:
+            messagebox.showerror("错误", "请选择输出目录")
+            return
+        self.start_conversion(all_videos)
     
-    def stop_conversion(self):
-        """停止转换过程"""
-        self.is_running = False
-        if self.current_process:
-            self.current_process.terminate()
+    def start_conversion(self, task_list):
+        """开始转换"""
+        output_dir = self.output_entry.get().strip()
+        duration_str = self.duration_entry.get().strip()
+        
+        if not output_dir:
+            messagebox.showerror("错误", "请设置输出目录")
+            return
+        
+        try:
+            segment_duration = int(duration_str)
+            if segment_duration <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的片段时长")
+            return
+        
+        try:
+            abr_ladder = parse_abr_ladder(self.abr_entry.get()) or None
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        transcode = self.transcode_var.get()
+        transcode = transcode if transcode in TRANSCODE_PRESETS else None
+        gop_plan = next((mode for mode, label in GOP_PLAN_MODES.items()
+                         if label == self.gop_plan_var.get()), 'off')
+        output_mode = next((mode for mode, label in OUTPUT_MODES.items()
+                            if label == self.output_mode_var.get()), 'ts')
+        
+        use_async = self.async_engine_var.get()
+        try:
+            parallel_tasks = int(self.parallel_var.get())
+            parallel_tasks = max(1, min(parallel_tasks, ASYNC_MAX_PARALLEL if use_async else self.max_workers * 2))
+        except:
+            parallel_tasks = self.max_workers
+        
+        self.autotuner = None
+        if use_async and self.auto_parallel_var.get():
+            self.log_message("⚠️ 异步引擎不支持自动并发，按设定的并行任务数执行")
+        elif self.auto_parallel_var.get():
+            self.autotuner = ConcurrencyAutotuner(maximum=AUTO_MAX_PARALLEL, log_callback=self.log_message)
+            parallel_tasks = self.autotuner.maximum
+        
+        output_path = Path(output_dir)
+        if not output_path.exists():
             try:
-                self.current_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.current_process.kill()
-
-class M3U8BatchConverterGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("M3U8 批量视频分割工具 v2.0")
-        self.root.geometry("1200x800")
+                output_path.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                messagebox.showerror("错误", f"无法创建输出目录: {e}")
+                return
         
-        # 设置程序图标 - 新增代码
-        self.set_window_icon()
+        self.cache = ConversionCache(output_path / CACHE_FILENAME) if self.skip_unchanged_var.get() else None
         
-        # 初始化变量
-        self.video_files = []
-        self.conversion_tasks = []
-        self.is_converting = False
-        self.file_paths = {}
-        self.max_workers = min(4, (os.cpu_count() or 1))
+        # 重置状态
         self.completed_tasks = 0
         self.submitted_tasks = 0
         self.task_results = {}
+        self.task_progress = {}
+        self.cancelled_tasks = set()
+        self.next_task_index = 0
+        self.conversion_tasks = []
         
-        # 设置界面
-        self.setup_ui()
-        
-        # 启动时检查 FFmpeg
-        self.check_ffmpeg_on_startup()
-    
-    def set_window_icon(self):
-        """设置窗口图标"""
-        try:
-            # 方法1: 尝试从ICO文件加载
-            icon_path = self.find_icon_file()
-            if icon_path and os.path.exists(icon_path):
-                self.root.iconbitmap(icon_path)
-                print(f"✅ 已设置程序图标: {icon_path}")
-                return
-            
-            # 方法2: 尝试从可执行文件资源加载（打包后）
-            if getattr(sys, 'frozen', False):
-                # 打包环境：尝试从exe文件加载图标
-                exe_path = sys.executable
-                self.root.iconbitmap(exe_path)
-                print("✅ 已使用可执行文件图标")
-                return
-                
-            # 方法3: 使用默认图标或创建空图标
-            self.root.iconbitmap(default="")
-            print("ℹ️  使用默认图标")
-            
-        except Exception as e:
-            print(f"⚠️  设置图标失败: {e}")
-            # 设置空图标作为后备
-            try:
-                self.root.iconbitmap(default="")
-            except:
-                pass
-
-    def find_icon_file(self):
-        """查找图标文件"""
-        possible_paths = []
+        # 恢复的任务沿用中断前保存的设置，新名称不能与它们的输出名重复
+        namer = OutputNamer()
+        restored = {file_path: self.restored_tasks[file_path] for _, file_path in task_list
+                    if file_path in self.restored_tasks}
+        for file_path, task in restored.items():
+            namer.reserve(file_path, task['output_filename'])
+        for item, file_path in task_list:
+            if file_path in restored:
+                task = dict(restored[file_path], item=item)
+            else:
+                task = make_conversion_task(file_path, output_path, segment_duration, item=item,
+                                            abr_ladder=abr_ladder, transcode=transcode, gop_plan=gop_plan,
+                                            output_mode=output_mode, output_name=namer.name_for(file_path))
+            self.conversion_tasks.append(task)
+            self.set_item_status(item, "等待")
+        if restored:
+            self.log_message(f"♻️ {len(restored)} 个恢复的任务沿用中断前的输出目录与转换设置")
         
-        # 打包环境
-        if getattr(sys, 'frozen', False):
-            base_dir = os.path.dirname(sys.executable)
-            possible_paths.extend([
-                os.path.join(base_dir, 'icon.ico'),
-                os.path.join(base_dir, 'resources', 'icon.ico'),
-                os.path.join(base_dir, '_internal', 'icon.ico')
-            ])
-            
-            if hasattr(sys, '_MEIPASS'):
-                possible_paths.append(os.path.join(sys._MEIPASS, 'icon.ico'))
+        self.is_converting = True
+        self.start_selected_btn.config(state=tk.DISABLED)
+        self.start_all_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
+        self.cancel_task_btn.config(state=tk.NORMAL)
+        self.pause_task_btn.config(state=tk.NORMAL)
         
-        # 开发环境
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        possible_paths.extend([
-            os.path.join(script_dir, 'icon.ico'),
-            os.path.join(script_dir, 'resources', 'icon.ico'),
-            os.path.join(script_dir, '..', 'resources', 'icon.ico')
-        ])
+        self.overall_progress.config(maximum=len(self.conversion_tasks), value=0)
+        self.progress_label.config(text=f"0/{len(self.conversion_tasks)}")
+        self.parallel_status_label.config(text="0")
         
-        # 检查所有可能的路径
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
+        self.log_message("🚀 开始批量转换...")
+        self.log_message(f"📋 总任务数: {len(self.conversion_tasks)}")
         
-        return None
+        self.schedule_plan = None
+        if self.schedule_var.get() == SCHEDULE_MODES['lpt']:
+            # 探测时长需要启动 ffprobe，放到后台线程避免阻塞界面
+            self.log_message("🔍 正在探测视频时长与大小...")
+            threading.Thread(target=self.plan_schedule_in_background,
+                             args=(parallel_tasks,), daemon=True).start()
+        else:
+            self.launch_tasks(parallel_tasks)
     
+    def plan_schedule_in_background(self, parallel_tasks):
+        """后台探测并按最长优先排序任务"""
+        ordered, plan = plan_longest_first(self.conversion_tasks, parallel_tasks, self.converter)
+        self.call_in_ui(self.apply_schedule_plan, ordered, plan, parallel_tasks)
     
-    def setup_ui(self):
-        """设置用户界面"""
-        # 主框架
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
+    def apply_schedule_plan(self, ordered, plan, parallel_tasks):
+        """应用调度计划并提交任务"""
+        if not self.is_converting:
+            return
+        self.conversion_tasks = ordered
+        self.schedule_plan = plan
+        self.log_message(describe_schedule_plan(plan))
+        self.launch_tasks(parallel_tasks)
+    
+    def launch_tasks(self, parallel_tasks):
+        """创建线程池并提交第一批任务"""
+        self.parallel_tasks = parallel_tasks
+        if any(task_needs_encoding(task) for task in self.conversion_tasks):
+            jobs = self.autotuner.limit if self.autotuner else parallel_tasks
+            self.log_message(describe_thread_plan(plan_thread_budget(jobs)))
+        self.batch_start_time = time.perf_counter()
+        self.metrics = BatchMetrics()
+        if self.autotuner:
+            self.autotuner.start()
+        self.engine = None
+        if self.async_engine_var.get():
+            self.engine = AsyncConversionEngine(parallel_tasks, log_callback=self.log_message).start()
+            self.log_message(f"⚡ 异步引擎: 最多 {parallel_tasks} 个 ffmpeg 同时运行")
+        self.claim_from_store = self.fill_job_store()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=parallel_tasks)
+        self.submit_next_tasks()
+    
+    def fill_job_store(self):
+        """按执行顺序把本批次写入任务记录，返回是否改为从任务记录领取任务"""
+        if not self.job_store:
+            return False
+        self.task_ids = {(str(task['file_path']), str(task['output_dir'])): index + 1
+                         for index, task in enumerate(self.conversion_tasks)}
+        try:
+            self.job_store.clear()
+            self.job_store.add_tasks(self.conversion_tasks)
+        except sqlite3.Error as e:
+            self.log_message(f"⚠️ 任务记录写入失败，本批次中断后将无法恢复: {e}")
+            return False
+        return True
+    
+    def next_task_batch(self, count):
+        """领取至多 count 个待提交的任务，返回 [(任务编号, 任务), ...]
         
-        # 左侧视频列表框架
-        left_frame = ttk.LabelFrame(main_frame, text="视频文件列表", padding="10")
-        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        有任务记录时通过 JobStore.claim() 领取（领取即标记为运行中，崩溃后可恢复），
+        否则按列表顺序取下一批。
+        """
+        if self.claim_from_store:
+            try:
+                claimed = self.job_store.claim(count)
+            except sqlite3.Error as e:
+                self.log_message(f"⚠️ 任务记录读取失败，剩余任务按列表提交: {e}")
+                self.claim_from_store = False
+            else:
+                batch = []
+                for stored in claimed:
+                    # 使用内存中的任务字典（带界面列表项），仅记下任务记录的 job_id
+                    task_id = self.task_ids[(stored['file_path'], stored['output_dir'])]
+                    task = self.conversion_tasks[task_id - 1]
+                    task['job_id'] = stored['job_id']
+                    self.next_task_index = max(self.next_task_index, task_id)
+                    batch.append((task_id, task))
+                return batch
+        tasks = self.conversion_tasks[self.next_task_index:self.next_task_index + count]
+        batch = [(self.next_task_index + offset + 1, task) for offset, task in enumerate(tasks)]
+        self.next_task_index += len(tasks)
+        return batch
+    
+    def submit_next_tasks(self):
+        """补充提交任务，使线程池中运行与排队的任务不超过 并行数 × IN_FLIGHT_FACTOR"""
+        window = self.parallel_tasks * IN_FLIGHT_FACTOR
+        while self.is_converting and self.submitted_tasks - self.completed_tasks < window:
+            batch = self.next_task_batch(window - (self.submitted_tasks - self.completed_tasks))
+            if not batch:
+                break
+            for task_id, task in batch:
+                if self.submit_single_task(task, task_id):
+                    self.submitted_tasks += 1
+                else:
+                    # 提交失败的任务直接计为完成，保证批次能够结束
+                    self.task_results[task_id] = (False, "提交失败")
+                    self.completed_tasks += 1
+                    self.finish_stored_task(task, task_id, False, "提交失败")
+    
+    def submit_single_task(self, task, task_id):
+        """提交单个任务"""
+        if not self.is_converting:
+            return None
         
-        # 右侧控制和日志框架
-        right_frame = ttk.Frame(main_frame)
-        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        file_name = source_name(task['file_path'])
+        self.set_item_status(task['item'], "转换中")
+        self.log_message(f"🔧 提交任务 {task_id}/{len(self.conversion_tasks)}: {file_name}")
         
-        # 设置各个部分
-        self.setup_video_list(left_frame)
-        self.setup_control_panel(right_frame)
-        self.setup_log_panel(right_frame)
+        try:
+            task['queued_at'] = time.time()
+            if self.engine:
+                future = self.engine.submit(task_id, self.run_single_task_async(task, task_id))
+            else:
+                future = self.executor.submit(self.run_single_task_optimized, task, task_id)
+            future.add_done_callback(self.task_finished_callback)
+            return future
+        except Exception as e:
+            self.log_message(f"❌ 提交任务失败: {str(e)}")
+            self.set_item_status(task['item'], "失败")
+            return None
     
-    def setup_video_list(self, parent):
-        """设置视频列表界面"""
-        # 按钮框架
-        button_frame = ttk.Frame(parent)
-        button_frame.pack(fill=tk.X, pady=(0, 10))
+    def run_single_task_optimized(self, task, task_id):
+        """运行单个任务，并把结果计入本批次的指标"""
+        queue_wait = time.time() - task['queued_at'] if 'queued_at' in task else 0.0
+        self.metrics.task_started()
+        result = self.execute_single_task(task, task_id)
+        self.record_single_task(result, queue_wait)
+        return result
+    
+    async def run_single_task_async(self, task, task_id):
+        """run_single_task_optimized 的协程版本（异步引擎）；被取消时按已取消或已停止结束"""
+        queue_wait = time.time() - task['queued_at'] if 'queued_at' in task else 0.0
+        self.metrics.task_started()
+        try:
+            result = await self.execute_single_task_async(task, task_id)
+        except asyncio.CancelledError:
+            result = (task, task_id, False, "已取消" if task_id in self.cancelled_tasks else "已停止")
+        self.record_single_task(result, queue_wait)
+        return result
+    
+    def record_single_task(self, result, queue_wait):
+        """把任务结果写入批次指标与任务记录"""
+        task, task_id, success, message = result
+        record = {'task_id': task_id, 'file_path': task['file_path'], 'success': success,
+                  'skipped': task.get('skipped', False), 'message': message, 'queue_wait': queue_wait}
+        record.update(task.get('metrics', {}))
+        self.metrics.observe_task(record)
+        self.finish_stored_task(task, task_id, success, message)
+    
+    def finish_stored_task(self, task, task_id, success, message):
+        """把任务结果写入任务记录：取消的不再恢复，批次停止时未完成的回到队列"""
+        if not self.job_store:
+            return
+        outcome = None
+        if not success and task_id in self.cancelled_tasks:
+            outcome = 'cancelled'
+        elif not success and not self.is_converting:
+            outcome = 'stopped'
+        try:
+            self.job_store.finish(task, success, message, task.get('elapsed'), outcome=outcome)
+        except sqlite3.Error:
+            pass
+    
+    def begin_single_task(self, task, task_id):
+        """转换前的检查，返回 (提前结束的结果或 None, 输入大小)"""
+        if task_id in self.cancelled_tasks:
+            return (task, task_id, False, "已取消"), 0
+        cache = self.cache
+        if cache and cache.is_fresh(task):
+            task['skipped'] = True
+            return (task, task_id, True, "未变化，已跳过"), 0
         
-        ttk.Button(button_frame, text="添加文件", command=self.add_files).pack(side=tk.LEFT, padx=(0, 5))
-        ttk.Button(button_frame, text="添加文件夹", command=self.add_folder).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="移除选中", command=self.remove_selected).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="清空列表", command=self.clear_list).pack(side=tk.LEFT, padx=5)
+        autotuner = self.autotuner
+        if autotuner and not autotuner.acquire():
+            return (task, task_id, False, "已停止"), 0
         
-        ttk.Button(button_frame, text="全选", command=self.select_all).pack(side=tk.RIGHT, padx=(5, 0))
-        ttk.Button(button_frame, text="取消全选", command=self.deselect_all).pack(side=tk.RIGHT, padx=5)
+        input_size = source_size(task['file_path'], task.get('size') or 0)
         
-        # 视频列表
-        list_frame = ttk.Frame(parent)
-        list_frame.pack(fill=tk.BOTH, expand=True)
+        if task_needs_encoding(task):
+            jobs = autotuner.limit if autotuner else self.parallel_tasks
+            task['threads'] = plan_thread_budget(jobs)['threads']
+        return None, input_size
+    
+    def single_task_progress_callback(self, task, input_size):
+        autotuner = self.autotuner
         
-        columns = ("选择", "文件名", "大小", "状态")
-        self.video_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        def on_progress(tid, progress):
+            if autotuner and progress['percent'] is not None:
+                autotuner.record_progress(tid, input_size * progress['percent'] / 100)
+            with self.progress_lock:
+                self.pending_progress[tid] = (task, progress)
+        return on_progress
+    
+    def start_single_converter(self, task_id):
+        """登记运行中的转换器；任务已取消或批次已停止时直接请求停止"""
+        converter = M3U8Converter()
+        with self.converters_lock:
+            self.active_converters[task_id] = converter
+        if task_id in self.cancelled_tasks or not self.is_converting:
+            converter.request_stop()
+        return converter
+    
+    def finish_single_task(self, task, task_id, converter, success, message, started_at, elapsed, input_size):
+        """转换结束后记录指标并更新缓存"""
+        task['elapsed'] = elapsed
+        task['metrics'] = {
+            'bytes': input_size,
+            'output_bytes': converter.output_stats.get('bytes', 0),
+            'segments': converter.output_stats.get('segments', 0),
+            'started_at': started_at,
+            'elapsed': elapsed,
+            'timings': dict(converter.timings),
+            'failure': task.get('failure'),
+            'fixes': task.get('fixes', []),
+            'stream_path': task.get('stream_path')
+        }
+        if self.cache:
+            if success:
+                self.cache.record(task)
+            else:
+                self.cache.forget(task)
+        return task, task_id, success, message
+    
+    def execute_single_task(self, task, task_id):
+        """执行单个任务"""
+        early_result, input_size = self.begin_single_task(task, task_id)
+        if early_result:
+            return early_result
         
-        self.video_tree.heading("选择", text="✓")
-        self.video_tree.heading("文件名", text="文件名")
-        self.video_tree.heading("大小", text="文件大小")
-        self.video_tree.heading("状态", text="状态")
+        autotuner = self.autotuner
+        converter = self.start_single_converter(task_id)
+        try:
+            started_at = time.time()
+            start_time = time.perf_counter()
+            success, message = run_conversion_task(converter, task, task_id,
+                                                   log_callback=self.log_message,
+                                                   progress_callback=self.single_task_progress_callback(task, input_size),
+                                                   keyframe_index=self.keyframe_index)
+            elapsed = time.perf_counter() - start_time
+        finally:
+            with self.converters_lock:
+                self.active_converters.pop(task_id, None)
+            if autotuner:
+                autotuner.task_finished(task_id, input_size)
+                autotuner.release()
+        if autotuner and success:
+            autotuner.record_task_time(elapsed, input_size)
+        return self.finish_single_task(task, task_id, converter, success, message, started_at, elapsed, input_size)
+    
+    async def execute_single_task_async(self, task, task_id):
+        """execute_single_task 的协程版本，阻塞步骤在引擎线程池中执行"""
+        engine = self.engine
+        early_result, input_size = await engine.run_blocking(self.begin_single_task, task, task_id)
+        if early_result:
+            return early_result
         
-        self.video_tree.column("选择", width=40, anchor="center")
-        self.video_tree.column("文件名", width=250)
-        self.video_tree.column("大小", width=100, anchor="center")
-        self.video_tree.column("状态", width=80, anchor="center")
+        converter = self.start_single_converter(task_id)
+        try:
+            started_at = time.time()
+            start_time = time.perf_counter()
+            success, message = await engine.convert(converter, task, task_id,
+                                                    progress_callback=self.single_task_progress_callback(task, input_size),
+                                                    keyframe_index=self.keyframe_index)
+            elapsed = time.perf_counter() - start_time
+        finally:
+            with self.converters_lock:
+                self.active_converters.pop(task_id, None)
+        return await engine.run_blocking(self.finish_single_task, task, task_id, converter, success, message,
+                                         started_at, elapsed, input_size)
+    
+    def handle_task_progress(self, task, task_id, progress):
+        """处理任务进度（在界面线程中执行）"""
+        if (not self.is_converting or task_id in self.task_results or task_id in self.cancelled_tasks
+                or process_registry.is_paused(task_id)):
+            return
+        self.set_item_status(task['item'], format_progress(progress))
+        if progress['percent'] is not None:
+            self.task_progress[task_id] = progress['percent'] / 100
+    
+    def update_overall_progress(self):
+        """按已完成任务与运行中任务的进度更新总体进度条"""
+        value = self.completed_tasks + sum(self.task_progress.values())
+        self.overall_progress.config(value=value)
+    
+    def task_finished_callback(self, future):
+        """任务完成回调"""
+        if not self.is_converting:
+            return
+        try:
+            task, task_id, success, message = future.result()
+            self.call_in_ui(self.handle_task_result, task, task_id, success, message)
+        except Exception as e:
+            self.log_message(f"❌ 任务执行异常: {str(e)}")
+    
+    def handle_task_result(self, task, task_id, success, message):
+        """处理任务结果"""
+        if not self.is_converting:
+            return
         
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.video_tree.yview)
-        self.video_tree.configure(yscrollcommand=scrollbar.set)
+        if task.get('skipped'):
+            status = "已跳过"
+        elif task_id in self.cancelled_tasks:
+            status = "已取消"
+        else:
+            status = "成功" if success else "失败"
+        self.set_item_status(task['item'], status)
+        self.task_results[task_id] = (success, message)
+        self.task_progress.pop(task_id, None)
+        self.completed_tasks += 1
         
-        self.video_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.progress_label.config(text=f"{self.completed_tasks}/{len(self.conversion_tasks)}")
         
-        self.video_tree.bind("<Double-1>", self.on_item_double_click)
+        self.submit_next_tasks()
+        running_count = self.submitted_tasks - self.completed_tasks
+        self.parallel_status_label.config(text=str(running_count))
     
-    def setup_control_panel(self, parent):
-        """设置控制面板"""
-        control_frame = ttk.LabelFrame(parent, text="转换设置", padding="10")
-        control_frame.pack(fill=tk.X, pady=(0, 10))
+    def call_in_ui(self, func, *args):
+        """从任意线程安排函数在界面线程的下一个节拍执行"""
+        self.ui_queue.put(("call", (func, args)))
+    
+    def set_item_status(self, item, status):
+        """登记列表状态更新，同一行在一个节拍内只刷新最后一次"""
+        self.status_updates[item] = status
+    
+    def process_ui_queue(self):
+        """界面节拍：批量处理日志、进度与任务结果"""
+        self.root.after(UI_TICK_MS, self.process_ui_queue)
+        
+        log_lines = deque(maxlen=LOG_MAX_LINES)
+        calls = 0
+        tick_start = time.perf_counter()
+        deadline = tick_start + UI_TICK_BUDGET
+        # 单个节拍的处理时间有上限，剩余的调用留到下一个节拍
+        while time.perf_counter() < deadline:
+            try:
+                kind, payload = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                log_lines.append(payload)
+            else:
+                func, args = payload
+                func(*args)
+                calls += 1
+        
+        with self.progress_lock:
+            pending_progress, self.pending_progress = self.pending_progress, {}
+        for task_id, (task, progress) in pending_progress.items():
+            self.handle_task_progress(task, task_id, progress)
         
-        # 输出目录
-        output_frame = ttk.Frame(control_frame)
-        output_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(output_frame, text="输出目录:").pack(side=tk.LEFT)
+        if pending_progress or calls:
+            self.update_overall_progress()
+        self.flush_status_updates()
+        if log_lines:
+            self.append_log_lines(log_lines)
+        if self.is_converting and self.metrics:
+            self.metrics.observe_ui_tick(time.perf_counter() - tick_start)
         
-        output_input_frame = ttk.Frame(output_frame)
-        output_input_frame.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(10, 5))
-        self.output_entry = ttk.Entry(output_input_frame)
-        self.output_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
-        ttk.Button(output_input_frame, text="浏览", command=self.browse_output_dir, width=8).pack(side=tk.RIGHT, padx=(5, 0))
+        if (self.is_converting and self.conversion_tasks and hasattr(self, 'executor')
+                and self.completed_tasks >= len(self.conversion_tasks)):
+            self.finalize_conversion()
+    
+    def flush_status_updates(self):
+        """把登记的状态更新写入列表"""
+        updates, self.status_updates = self.status_updates, {}
+        for item, status in updates.items():
+            if self.video_tree.exists(item):
+                self.video_tree.set(item, "状态", status)
+    
+    def finalize_conversion(self):
+        """完成转换"""
+        if self.autotuner:
+            self.autotuner.stop()
+        if hasattr(self, 'executor'):
+            self.executor.shutdown(wait=True)
+        if self.engine:
+            self.engine.close()
+            self.engine = None
+        if self.cache:
+            self.cache.flush()
         
-        # 片段时长
-        duration_frame = ttk.Frame(control_frame)
-        duration_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(duration_frame, text="TS片段时长:").pack(side=tk.LEFT)
-        self.duration_entry = ttk.Entry(duration_frame, width=10)
-        self.duration_entry.insert(0, "10")
-        self.duration_entry.pack(side=tk.LEFT, padx=(10, 5))
-        ttk.Label(duration_frame, text="秒").pack(side=tk.LEFT)
+        self.is_converting = False
+        self.start_selected_btn.config(state=tk.NORMAL)
+        self.start_all_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.cancel_task_btn.config(state=tk.DISABLED)
+        self.pause_task_btn.config(state=tk.DISABLED)
         
-        # 并行任务
-        parallel_frame = ttk.Frame(control_frame)
-        parallel_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(parallel_frame, text="并行任务数:").pack(side=tk.LEFT)
-        self.parallel_var = tk.StringVar(value=str(self.max_workers))
-        parallel_spinbox = ttk.Spinbox(parallel_frame, from_=1, to=min(8, self.max_workers * 2), 
-                                     textvariable=self.parallel_var, width=5)
-        parallel_spinbox.pack(side=tk.LEFT, padx=(10, 5))
+        success_count = sum(1 for result in self.task_results.values() if result[0])
+        skipped_count = sum(1 for task in self.conversion_tasks if task.get('skipped'))
+        self.log_message("🎉 批量转换完成！")
+        self.log_message(f"📊 转换结果: 成功 {success_count}/{len(self.conversion_tasks)} (跳过 {skipped_count})")
+        if self.metrics and self.metrics.paths:
+            self.log_message(f"🎛️ 编码路径: {describe_stream_paths(self.metrics.paths)}")
+        if self.schedule_plan:
+            actual_makespan = time.perf_counter() - self.batch_start_time
+            self.log_message(describe_schedule_result(self.schedule_plan, self.conversion_tasks,
+                                                      actual_makespan))
+        self.write_batch_report()
         
-        # 控制按钮
-        button_frame = ttk.Frame(control_frame)
-        button_frame.pack(fill=tk.X, pady=10)
+        messagebox.showinfo("完成", f"批量转换完成！\n成功: {success_count}/{len(self.conversion_tasks)}")
+    
+    def write_batch_report(self):
+        """把本批次的 JSON 报告写入缓存目录下的 reports"""
+        if not self.metrics:
+            return
+        report_file = app_cache_dir("reports") / f"batch-{datetime.now():%Y%m%d-%H%M%S}.json"
+        try:
+            self.metrics.write_report(report_file)
+            self.log_message(f"📄 批次报告已写入: {report_file}")
+        except OSError as e:
+            self.log_message(f"⚠️ 批次报告写入失败: {e}")
+    
+    def stop_conversion(self):
+        """停止转换：丢弃排队的任务，并在后台结束全部 ffmpeg 进程组"""
+        self.is_converting = False
+        if self.autotuner:
+            self.autotuner.stop()
+        if hasattr(self, 'executor'):
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.engine:
+            # close() 取消全部协程并等待各自结束 ffmpeg 进程组，放到后台线程避免阻塞界面
+            threading.Thread(target=self.engine.close, daemon=True).start()
+            self.engine = None
+        with self.converters_lock:
+            converters = list(self.active_converters.values())
+        for converter in converters:
+            converter.request_stop()
+        threading.Thread(target=process_registry.terminate,
+                         args=([converter.process_key for converter in converters],),
+                         daemon=True).start()
+        if self.cache:
+            self.cache.flush()
         
-        self.start_selected_btn = ttk.Button(button_frame, text="开始转换选中项", 
-                                           command=self.start_selected_conversion, width=18)
-        self.start_selected_btn.pack(side=tk.LEFT, padx=5)
+        for task_index, task in enumerate(self.conversion_tasks):
+            if task_index + 1 not in self.task_results:
+                self.set_item_status(task['item'], "已停止")
         
-        self.start_all_btn = ttk.Button(button_frame, text="开始转换全部", 
-                                      command=self.start_all_conversion, width=18)
-        self.start_all_btn.pack(side=tk.LEFT, padx=5)
+        self.start_selected_btn.config(state=tk.NORMAL)
+        self.start_all_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.cancel_task_btn.config(state=tk.DISABLED)
+        self.pause_task_btn.config(state=tk.DISABLED)
+        self.log_message("⏹️ 用户停止转换")
+    
+    def selected_task_ids(self):
+        """返回列表中选中、且属于当前批次未完成任务的 (任务编号, 任务) 列表"""
+        selected = set(self.video_tree.selection())
+        return [(index + 1, task) for index, task in enumerate(self.conversion_tasks)
+                if task['item'] in selected and index + 1 not in self.task_results]
+    
+    def cancel_selected_tasks(self):
+        """取消选中的任务：排队中的不再启动，运行中的结束其 ffmpeg 进程组"""
+        if not self.is_converting:
+            return
+        keys = []
+        for task_id, task in self.selected_task_ids():
+            if task_id in self.cancelled_tasks:
+                continue
+            self.cancelled_tasks.add(task_id)
+            self.set_item_status(task['item'], "已取消")
+            with self.converters_lock:
+                converter = self.active_converters.get(task_id)
+            if converter:
+                converter.request_stop()
+                keys.append(converter.process_key)
+            if self.engine:
+                self.engine.cancel([task_id])
+            self.log_message(f"⏹️ 已取消任务 {task_id}: {source_name(task['file_path'])}")
+        if keys:
+            threading.Thread(target=process_registry.terminate, args=(keys,), daemon=True).start()
+    
+    def toggle_pause_selected_tasks(self):
+        """暂停或继续选中的运行中任务"""
+        if not self.is_converting:
+            return
+        for task_id, task in self.selected_task_ids():
+            if task_id in self.cancelled_tasks:
+                continue
+            if process_registry.is_paused(task_id):
+                if process_registry.resume(task_id):
+                    self.set_item_status(task['item'], "转换中")
+                    self.log_message(f"▶️ 继续任务 {task_id}")
+            elif process_registry.pause(task_id):
+                self.set_item_status(task['item'], "已暂停")
+                self.log_message(f"⏸️ 暂停任务 {task_id}")
+    
+    def log_message(self, message, task_id=None):
+        """添加日志（线程安全，实际写入在界面节拍中完成）"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.ui_queue.put(("log", f"[{timestamp}] {message}"))
+    
+    def append_log_lines(self, lines):
+        """一次性写入多行日志，并只保留最近 LOG_MAX_LINES 行"""
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_MAX_LINES:
+            self.log_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+        self.log_text.see(tk.END)
+        self.log_text.config(state=tk.DISABLED)
+
+
+class FolderScanner:
+    """基于 os.scandir 的并行目录扫描
+    
+    多个线程同时列举不同目录，发现的文件以 (路径, 大小) 分批回调，
+    调用方可以边扫描边处理结果。include 给出时替代默认的视频扩展名过滤，
+    exclude 同时作用于文件与目录（匹配的目录整体跳过）。skip_dirs 中的目录
+    （如位于监视目录内的输出目录）连同子目录一起跳过。
+    """
+    
+    def __init__(self, include=None, exclude=None, recursive=True, workers=8,
+                 extensions=VIDEO_EXTENSIONS, skip_dirs=None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.skip_dirs = [os.path.normcase(os.path.abspath(directory)) for directory in skip_dirs or []]
+        self.recursive = recursive
+        self.workers = max(1, workers)
+        self.extensions = extensions
+        self.cancelled = False
+        self.file_count = 0
+        self.dir_count = 0
+        self.error_count = 0
+        self.lock = threading.Lock()  # error_count 由多个扫描线程累加
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def count_error(self):
+        with self.lock:
+            self.error_count += 1
+    
+    @staticmethod
+    def matches(patterns, name, path):
+        normalized = path.replace(os.sep, "/")
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(normalized, pattern)
+                   for pattern in patterns)
+    
+    def is_skipped(self, path):
+        path = os.path.normcase(os.path.abspath(path))
+        return any(path == directory or path.startswith(directory + os.sep) for directory in self.skip_dirs)
+    
+    def accept_dir(self, name, path):
+        if self.skip_dirs and self.is_skipped(path):
+            return False
+        return not (self.exclude and self.matches(self.exclude, name, path))
+    
+    def accept_file(self, name, path):
+        if self.skip_dirs and self.is_skipped(path):
+            return False
+        if self.exclude and self.matches(self.exclude, name, path):
+            return False
+        if self.include:
+            return self.matches(self.include, name, path)
+        return os.path.splitext(name)[1].lower() in self.extensions
+    
+    def scan_dir(self, directory):
+        """列举单个目录，返回 (文件列表, 子目录列表)"""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive and self.accept_dir(entry.name, entry.path):
+                                subdirs.append(entry.path)
+                        elif entry.is_file() and self.accept_file(entry.name, entry.path):
+                            files.append((os.path.abspath(entry.path), entry.stat().st_size))
+                    except OSError:
+                        self.count_error()
+        except OSError:
+            self.count_error()
+        return files, subdirs
+    
+    def scan(self, roots, on_batch, batch_size=500):
+        """扫描全部根目录，每发现 batch_size 个文件调用一次 on_batch(files)，返回文件总数"""
+        dir_queue = queue.Queue()
+        result_queue = queue.Queue()
+        outstanding = [len(roots)]
+        lock = threading.Lock()
         
-        self.stop_btn = ttk.Button(button_frame, text="停止转换", 
-                                 command=self.stop_conversion, state=tk.DISABLED, width=18)
-        self.stop_btn.pack(side=tk.LEFT, padx=5)
+        def worker():
+            while True:
+                directory = dir_queue.get()
+                if directory is None:
+                    return
+                files, subdirs = ([], []) if self.cancelled else self.scan_dir(directory)
+                with lock:
+                    outstanding[0] += len(subdirs)
+                for subdir in subdirs:
+                    dir_queue.put(subdir)
+                result_queue.put(files)
+                with lock:
+                    outstanding[0] -= 1
+                    finished = outstanding[0] == 0
+                if finished:
+                    result_queue.put(None)
         
-        # 进度显示
-        progress_frame = ttk.Frame(control_frame)
-        progress_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(progress_frame, text="总体进度:").pack(side=tk.LEFT)
-        self.progress_label = ttk.Label(progress_frame, text="0/0")
-        self.progress_label.pack(side=tk.LEFT, padx=(10, 0))
+        if not roots:
+            return 0
+        for root in roots:
+            dir_queue.put(root)
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
         
-        self.overall_progress = ttk.Progressbar(control_frame, mode='determinate')
-        self.overall_progress.pack(fill=tk.X, pady=5)
+        batch = []
+        while True:
+            files = result_queue.get()
+            if files is None:
+                break
+            self.dir_count += 1
+            self.file_count += len(files)
+            batch.extend(files)
+            if len(batch) >= batch_size:
+                on_batch(batch)
+                batch = []
+        if batch:
+            on_batch(batch)
         
-        # 并行任务状态
-        parallel_status_frame = ttk.Frame(control_frame)
-        parallel_status_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(parallel_status_frame, text="运行中任务:").pack(side=tk.LEFT)
-        self.parallel_status_label = ttk.Label(parallel_status_frame, text="0")
-        self.parallel_status_label.pack(side=tk.LEFT, padx=(10, 0))
+        for _ in threads:
+            dir_queue.put(None)
+        return self.file_count
+
+
+def collect_input_files(sources, manifest=None, recursive=False, include=None, exclude=None):
+    """从目录、通配符或清单文件收集输入视频（按出现顺序去重），HTTP(S) 地址原样保留"""
+    candidates = []
+    for source in sources:
+        if is_source_url(source):
+            candidates.append(source)
+        elif os.path.isdir(source):
+            found = []
+            scanner = FolderScanner(include=include, exclude=exclude, recursive=recursive)
+            scanner.scan([source], lambda files: found.extend(path for path, _ in files))
+            candidates.extend(sorted(found))
+        elif glob.has_magic(source):
+            candidates.extend(sorted(glob.glob(source, recursive=True)))
+        else:
+            candidates.append(source)
     
-    def setup_log_panel(self, parent):
-        """设置日志面板"""
-        log_frame = ttk.LabelFrame(parent, text="转换日志", padding="10")
-        log_frame.pack(fill=tk.BOTH, expand=True)
-        
-        self.log_text = ScrolledText(log_frame, width=80, height=20, state=tk.DISABLED, font=("Consolas", 9))
-        self.log_text.pack(fill=tk.BOTH, expand=True)
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    candidates.append(line)
     
-    def check_ffmpeg_on_startup(self):
-        """启动时检查 FFmpeg"""
-        self.converter = M3U8Converter()
-        success, message = self.converter.check_ffmpeg()
-        if success:
-            self.log_message(f"✅ {message}")
-        else:
-            self.log_message(f"⚠️ {message}")
+    files = []
+    seen = set()
+    for candidate in candidates:
+        if is_source_url(candidate):
+            if candidate not in seen:
+                seen.add(candidate)
+                files.append(candidate)
+            continue
+        abs_path = os.path.abspath(candidate)
+        if abs_path not in seen and os.path.isfile(abs_path):
+            seen.add(abs_path)
+            files.append(abs_path)
+    return files
+
+
+WATCH_STABLE_SECONDS = 10.0
+WATCH_POLL_INTERVAL = 2.0
+WATCH_CACHE_FLUSH_SECONDS = 5.0  # 监视模式下增量缓存的写入间隔
+
+
+class StabilityTracker:
+    """写入完成检测：文件大小与修改时间在 stable_seconds 内保持不变才视为就绪"""
     
-    def add_files(self):
-        """添加文件到列表"""
-        filetypes = [
-            ("所有视频文件", "*.mp4 *.mkv *.avi *.mov *.wmv *.flv *.webm *.m4v *.3gp *.ts *.m2ts"),
-            ("所有文件", "*.*")
-        ]
+    def __init__(self, stable_seconds=WATCH_STABLE_SECONDS):
+        self.stable_seconds = stable_seconds
+        self.candidates = {}  # 路径 -> ((大小, 修改时间), 开始稳定的时刻)
+    
+    def touch(self, path):
+        """登记（或重新登记）一个可能仍在写入的文件"""
+        self.candidates[path] = None
+    
+    def poll(self):
+        """检查全部候选文件，返回已稳定的文件路径"""
+        now = time.monotonic()
+        ready = []
+        for path, state in list(self.candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.candidates[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if state is None or state[0] != signature:
+                self.candidates[path] = (signature, now)
+            elif stat.st_size > 0 and now - state[1] >= self.stable_seconds:
+                del self.candidates[path]
+                ready.append(path)
+        return ready
+
+
+class InotifyWatcher:
+    """Linux inotify 目录监视（通过 ctypes 调用 libc，无需第三方库）
+    
+    为每个目录注册监视，新建的子目录自动加入；wait() 返回有变化的文件路径。
+    """
+    
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT_HEADER = struct.Struct("iIII")
+    
+    def __init__(self, roots, scanner):
+        import ctypes
+        import ctypes.util
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.scanner = scanner
+        self.watches = {}  # 监视描述符 -> 目录
+        self.initial_files = []
+        for root in roots:
+            self.add_tree(os.path.abspath(root), self.initial_files)
+    
+    def add_tree(self, directory, found):
+        """为目录（递归时含子目录）注册监视，并把其中已有的文件加入 found
         
-        files = filedialog.askopenfilenames(title="选择视频文件", filetypes=filetypes)
-        if files:
-            added_count = 0
-            for file in files:
-                if self.add_video_to_list(file):
-                    added_count += 1
-            self.log_message(f"✅ 成功添加 {added_count} 个文件")
+        先注册再列举，注册之前写入的文件不会漏掉。
+        """
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(current), self.WATCH_MASK)
+            if wd < 0:
+                # 常见原因是超过 fs.inotify.max_user_watches
+                self.scanner.count_error()
+                continue
+            self.watches[wd] = current
+            files, subdirs = self.scanner.scan_dir(current)
+            found.extend(path for path, _ in files)
+            pending.extend(subdirs)
     
-    def add_folder(self):
-        """添加文件夹"""
-        folder = filedialog.askdirectory(title="选择视频文件夹")
-        if folder:
-            video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.ts', '.m2ts'}
-            folder_path = Path(folder)
-            added_count = 0
-            for file_path in folder_path.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in video_extensions:
-                    if self.add_video_to_list(str(file_path)):
-                        added_count += 1
-            if added_count > 0:
-                self.log_message(f"✅ 成功添加 {added_count} 个文件")
-    
-    def add_video_to_list(self, file_path):
-        """添加视频到列表"""
-        try:
-            abs_path = os.path.abspath(file_path)
-            for item_id in self.video_tree.get_children():
-                if item_id in self.file_paths and self.file_paths[item_id] == abs_path:
-                    return False
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + self.EVENT_HEADER.size:offset + self.EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += self.EVENT_HEADER.size + length
             
-            file_size = os.path.getsize(abs_path)
-            size_str = self.format_file_size(file_size)
-            self.video_files.append(abs_path)
-            path = Path(file_path)
+            if mask & self.IN_Q_OVERFLOW:
+                # 事件队列溢出：重新列举全部已监视目录
+                for directory in list(self.watches.values()):
+                    files, _ = self.scanner.scan_dir(directory)
+                    changed.extend(path for path, _ in files)
+                continue
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & self.IN_ISDIR:
+                if (mask & (self.IN_CREATE | self.IN_MOVED_TO) and self.scanner.recursive
+                        and self.scanner.accept_dir(os.fsdecode(name), path)):
+                    self.add_tree(path, changed)
+                continue
+            changed.append(path)
+        return changed
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """轮询目录监视（inotify 不可用时使用）
+    
+    每轮只 stat 已知目录，仅重新列举修改时间变化的目录（增删、重命名文件会更新目录修改时间），
+    不会整树重新扫描。
+    """
+    
+    def __init__(self, roots, scanner, interval=WATCH_POLL_INTERVAL):
+        self.scanner = scanner
+        self.interval = interval
+        self.dir_mtimes = {}  # 目录 -> 上次列举时的修改时间（None 表示下轮需重新列举）
+        self.known_files = {}  # 目录 -> 文件路径集合
+        self.initial_files = []
+        for root in roots:
+            self.list_tree(os.path.abspath(root), self.initial_files)
+    
+    def list_tree(self, directory, found):
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            try:
+                mtime = os.stat(current).st_mtime_ns
+            except OSError:
+                self.dir_mtimes.pop(current, None)
+                self.known_files.pop(current, None)
+                continue
+            files, subdirs = self.scanner.scan_dir(current)
+            paths = {path for path, _ in files}
+            found.extend(paths - self.known_files.get(current, set()))
+            self.known_files[current] = paths
+            # 修改时间精度较粗的文件系统（FAT、部分网络共享）上，刚变化的目录下一轮再列举一次
+            recent = time.time_ns() - mtime < 2 * 10 ** 9
+            self.dir_mtimes[current] = None if recent else mtime
+            pending.extend(subdir for subdir in subdirs if subdir not in self.dir_mtimes)
+    
+    def wait(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        changed = []
+        for directory, mtime in list(self.dir_mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self.dir_mtimes.pop(directory, None)
+                self.known_files.pop(directory, None)
+                continue
+            if current != mtime:
+                self.list_tree(directory, changed)
+        return changed
+    
+    def close(self):
+        pass
+
+
+class WatchFolderDaemon:
+    """监视目录，新文件写入完成后回调 on_ready(路径)
+    
+    Linux 上使用 inotify，其他平台或 inotify 不可用时退回按目录修改时间轮询。
+    文件需在 stable_seconds 内大小与修改时间都不变才视为写入完成。
+    输出目录位于监视目录内时应放入 skip_dirs，否则转换生成的 .ts 片段会被当作新输入。
+    """
+    
+    def __init__(self, roots, on_ready, include=None, exclude=None, recursive=True,
+                 stable_seconds=WATCH_STABLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL,
+                 use_inotify=True, include_existing=True, log_callback=None, skip_dirs=None, on_tick=None):
+        self.roots = list(roots)
+        self.on_ready = on_ready
+        self.scanner = FolderScanner(include=include, exclude=exclude, recursive=recursive,
+                                     skip_dirs=skip_dirs)
+        self.tracker = StabilityTracker(stable_seconds)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.include_existing = include_existing
+        self.log_callback = log_callback
+        self.on_tick = on_tick  # 每轮检查后调用（约每秒一次），用于定期写盘等维护工作
+        self.is_running = False
+    
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+    
+    def create_watcher(self):
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                return InotifyWatcher(self.roots, self.scanner)
+            except (OSError, AttributeError) as e:
+                self.log(f"⚠️ inotify 不可用（{e}），改为轮询")
+        return PollingWatcher(self.roots, self.scanner, self.poll_interval)
+    
+    def run(self):
+        """阻塞运行，直到 stop() 被调用"""
+        self.is_running = True
+        watcher = self.create_watcher()
+        mode = "inotify" if isinstance(watcher, InotifyWatcher) else f"轮询 {self.poll_interval:g}s"
+        self.log(f"👀 开始监视 {len(self.roots)} 个目录（{mode}），"
+                 f"文件 {self.tracker.stable_seconds:g}s 内无变化后开始转换")
+        if self.include_existing:
+            for path in watcher.initial_files:
+                self.tracker.touch(path)
+        try:
+            while self.is_running:
+                for path in watcher.wait(1.0):
+                    if self.scanner.accept_file(os.path.basename(path), path):
+                        self.tracker.touch(path)
+                for path in self.tracker.poll():
+                    self.on_ready(path)
+                if self.on_tick:
+                    self.on_tick()
+        finally:
+            watcher.close()
+    
+    def stop(self):
+        self.is_running = False
+
+
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+THROUGHPUT_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+UI_TICK_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+METRICS_RECENT_TASKS = 1000  # JSON 报告保留的逐任务记录数（监视模式可长期运行）
+
+
+class Histogram:
+    """Prometheus 风格的累计直方图（调用方负责加锁）"""
+    
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+    
+    def render(self, name, labels=""):
+        separator = "," if labels else ""
+        lines = [f'{name}_bucket{{{labels}{separator}le="{bound:g}"}} {count}'
+                 for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class BatchMetrics:
+    """转换指标：逐任务记录阶段耗时、输入输出字节与片段数，并汇总为计数器与直方图
+    
+    可导出 Prometheus 文本格式（写入文件供 node_exporter textfile 采集，或通过本地 HTTP /metrics），
+    以及每个批次的 JSON 报告。设置 textfile 时每个任务结束后重写该文件。
+    汇总值随任务累加，逐任务记录只保留最近 recent_tasks 个，内存占用与任务总数无关。
+    """
+    
+    def __init__(self, textfile=None, recent_tasks=METRICS_RECENT_TASKS):
+        self.textfile = textfile
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.tasks = deque(maxlen=recent_tasks)
+        self.task_count = 0
+        self.status_counts = {}
+        self.in_progress = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.segments = 0
+        self.failures = {}  # 失败类别 -> 次数
+        self.fixes = {}  # 自动修复 -> 使用次数
+        self.paths = {}  # 编码路径（STREAM_PATHS）-> 任务数
+        self.task_latency = Histogram(LATENCY_BUCKETS)
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+        self.throughput = Histogram(THROUGHPUT_BUCKETS)
+        self.phases = {}
+        self.ui_tick = Histogram(UI_TICK_BUCKETS)
+        self.server = None
+    
+    def task_started(self):
+        with self.lock:
+            self.in_progress += 1
+    
+    def observe_task(self, record):
+        """记录一个已结束的任务
+        
+        record 为 BatchRunner.run_task 的结果字典：success、skipped、message、elapsed、queue_wait、
+        bytes、output_bytes、segments、timings。
+        """
+        if record.get('skipped'):
+            status = 'skipped'
+        elif record.get('success'):
+            status = 'success'
+        elif record.get('message') in ("已停止", "已取消"):
+            status = 'stopped'
+        else:
+            status = 'failed'
+        with self.lock:
+            self.in_progress = max(0, self.in_progress - 1)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.task_count += 1
+            self.tasks.append(dict(record, status=status))
+            if status != 'skipped':
+                self.record_totals(record)
+        if self.textfile:
+            self.write_prometheus(self.textfile)
+    
+    def record_totals(self, record):
+        """累加计数器与直方图（调用方持有锁）"""
+        self.bytes_in += record.get('bytes', 0)
+        self.bytes_out += record.get('output_bytes', 0)
+        self.segments += record.get('segments', 0)
+        if record.get('failure'):
+            self.failures[record['failure']] = self.failures.get(record['failure'], 0) + 1
+        for fix in record.get('fixes', ()):
+            self.fixes[fix] = self.fixes.get(fix, 0) + 1
+        if record.get('stream_path'):
+            self.paths[record['stream_path']] = self.paths.get(record['stream_path'], 0) + 1
+        elapsed = record.get('elapsed', 0.0)
+        self.task_latency.observe(elapsed)
+        self.queue_wait.observe(record.get('queue_wait', 0.0))
+        if elapsed > 0 and record.get('success'):
+            self.throughput.observe(record.get('bytes', 0) / elapsed)
+        for phase, seconds in record.get('timings', {}).items():
+            self.phases.setdefault(phase, Histogram(PHASE_BUCKETS)).observe(seconds)
+    
+    def observe_ui_tick(self, seconds):
+        with self.lock:
+            self.ui_tick.observe(seconds)
+    
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        with self.lock:
+            lines = ["# HELP m3u8_tasks_total 已结束的转换任务数",
+                     "# TYPE m3u8_tasks_total counter"]
+            for status, count in sorted(self.status_counts.items()):
+                lines.append(f'm3u8_tasks_total{{status="{status}"}} {count}')
+            lines += ["# HELP m3u8_tasks_in_progress 运行中的转换任务数",
+                      "# TYPE m3u8_tasks_in_progress gauge",
+                      f"m3u8_tasks_in_progress {self.in_progress}",
+                      "# TYPE m3u8_input_bytes_total counter",
+                      f"m3u8_input_bytes_total {self.bytes_in}",
+                      "# TYPE m3u8_output_bytes_total counter",
+                      f"m3u8_output_bytes_total {self.bytes_out}",
+                      "# TYPE m3u8_segments_total counter",
+                      f"m3u8_segments_total {self.segments}"]
+            if self.failures:
+                lines += ["# HELP m3u8_task_failures_total 最终失败的任务数（按失败类别）",
+                          "# TYPE m3u8_task_failures_total counter"]
+                lines += [f'm3u8_task_failures_total{{category="{category}"}} {count}'
+                          for category, count in sorted(self.failures.items())]
+            if self.paths:
+                lines += ["# HELP m3u8_task_paths_total 按编码路径（全部复制、仅重编码音频……）统计的任务数",
+                          "# TYPE m3u8_task_paths_total counter"]
+                lines += [f'm3u8_task_paths_total{{path="{path}"}} {count}'
+                          for path, count in sorted(self.paths.items())]
+            if self.fixes:
+                lines += ["# HELP m3u8_task_fixes_total 自动修复重试次数（按修复方式）",
+                          "# TYPE m3u8_task_fixes_total counter"]
+                lines += [f'm3u8_task_fixes_total{{fix="{fix}"}} {count}'
+                          for fix, count in sorted(self.fixes.items())]
+            for name, histogram, help_text in (
+                    ("m3u8_task_duration_seconds", self.task_latency, "单个任务从开始到结束的耗时"),
+                    ("m3u8_queue_wait_seconds", self.queue_wait, "任务提交后等待执行的时间"),
+                    ("m3u8_task_throughput_bytes_per_second", self.throughput, "成功任务的输入吞吐"),
+                    ("m3u8_ui_tick_seconds", self.ui_tick, "界面节拍处理耗时")):
+                if histogram.count or name != "m3u8_ui_tick_seconds":
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                    lines += histogram.render(name)
+            if self.phases:
+                lines += ["# HELP m3u8_phase_duration_seconds 任务各阶段耗时",
+                          "# TYPE m3u8_phase_duration_seconds histogram"]
+                for phase, histogram in sorted(self.phases.items()):
+                    lines += histogram.render("m3u8_phase_duration_seconds", f'phase="{phase}"')
+        return "\n".join(lines) + "\n"
+    
+    def write_prometheus(self, path):
+        """原子写入 Prometheus 文本文件（node_exporter textfile 采集器要求整文件替换）"""
+        path = Path(path)
+        tmp_file = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_file, path)
+        except OSError:
+            pass
+    
+    def serve(self, port, host="127.0.0.1"):
+        """在后台线程提供 HTTP /metrics，返回实际端口"""
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
             
-            item_id = self.video_tree.insert("", tk.END, values=("✓", path.name, size_str, "等待"))
-            self.file_paths[item_id] = abs_path
-            return True
-        except Exception as e:
-            self.log_message(f"❌ 添加文件失败 {file_path}: {str(e)}")
-            return False
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
     
-    def format_file_size(self, size_bytes):
-        """格式化文件大小"""
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
     
-    def remove_selected(self):
-        """移除选中项"""
-        selected_items = self.video_tree.selection()
-        if selected_items:
-            for item in selected_items:
-                if item in self.file_paths:
-                    file_path = self.file_paths[item]
-                    if file_path in self.video_files:
-                        self.video_files.remove(file_path)
-                    del self.file_paths[item]
-                self.video_tree.delete(item)
-            self.log_message(f"✅ 已移除 {len(selected_items)} 个文件")
+    def report(self):
+        """批次 JSON 报告：汇总与最近的逐任务记录（results_dropped 为未保留的较早记录数）"""
+        with self.lock:
+            tasks = list(self.tasks)
+            phase_totals = {phase: round(histogram.total, 6) for phase, histogram in self.phases.items()}
+            wall_time = time.time() - self.started
+            return {
+                'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'wall_time': wall_time,
+                'tasks': self.task_count,
+                'status': dict(self.status_counts),
+                'input_bytes': self.bytes_in,
+                'output_bytes': self.bytes_out,
+                'segments': self.segments,
+                'failures': dict(self.failures),
+                'fixes': dict(self.fixes),
+                'paths': dict(self.paths),
+                'files_per_sec': self.task_count / wall_time if wall_time > 0 else 0.0,
+                'mb_per_sec': self.bytes_in / 1024 / 1024 / wall_time if wall_time > 0 else 0.0,
+                'phase_seconds': phase_totals,
+                'task_duration_seconds': {'sum': self.task_latency.total, 'count': self.task_latency.count},
+                'queue_wait_seconds': {'sum': self.queue_wait.total, 'count': self.queue_wait.count},
+                'results': tasks,
+                'results_dropped': self.task_count - len(tasks)
+            }
     
-    def clear_list(self):
-        """清空列表"""
-        if self.video_tree.get_children():
-            self.video_tree.delete(*self.video_tree.get_children())
-            self.video_files.clear()
-            self.file_paths.clear()
-            self.log_message("✅ 已清空文件列表")
+    def write_report(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+ASYNC_BLOCKING_WORKERS = 8
+ASYNC_MAX_PARALLEL = 256  # 图形界面中异步引擎允许的并行任务数上限
+
+
+class AsyncConversionEngine:
+    """单事件循环驱动全部 ffmpeg 子进程的转换引擎
     
-    def select_all(self):
-        """全选"""
-        for item in self.video_tree.get_children():
-            self.video_tree.set(item, "选择", "✓")
+    每个运行中的任务只是一个协程：ffmpeg 的输出在事件循环中异步读取，并发数由信号量限制，
+    数百个轻量的流复制任务也不需要数百个线程；探测、校验等阻塞步骤交给容量固定的小线程池。
+    命令行在调用线程中用 asyncio.run 驱动；图形界面调用 start() 让事件循环在后台线程常驻，
+    submit() 返回 concurrent.futures.Future。
+    """
     
-    def deselect_all(self):
-        """取消全选"""
-        for item in self.video_tree.get_children():
-            self.video_tree.set(item, "选择", "")
+    def __init__(self, max_parallel, log_callback=None, timeout=None, stall_timeout=FFMPEG_STALL_TIMEOUT,
+                 blocking_workers=ASYNC_BLOCKING_WORKERS):
+        self.max_parallel = max(1, max_parallel)
+        self.log_callback = log_callback
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=blocking_workers)
+        self.semaphore = None
+        self.loop = None
+        self.thread = None
+        self.running = {}  # 键 -> asyncio.Task，用于取消
     
-    def on_item_double_click(self, event):
-        """双击切换选择"""
-        item = self.video_tree.identify_row(event.y)
-        if item:
-            current_value = self.video_tree.set(item, "选择")
-            new_value = "✓" if current_value == "" else ""
-            self.video_tree.set(item, "选择", new_value)
+    async def run_blocking(self, func, *args):
+        """在阻塞线程池中执行同步函数"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
     
-    def browse_output_dir(self):
-        """浏览输出目录"""
-        directory = filedialog.askdirectory(title="选择输出目录")
-        if directory:
-            self.output_entry.delete(0, tk.END)
-            self.output_entry.insert(0, directory)
+    async def convert(self, converter, task, task_id, progress_callback=None, resume=True, keyframe_index=None):
+        """异步版 run_conversion_task：URL 输入先占用主机连接名额，同时运行的转换不超过 max_parallel 个"""
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_parallel)
+        async with host_connections.slot_async(task['file_path'], converter,
+                                               host_wait_logger(task_id, self.log_callback)) as acquired:
+            if not acquired:
+                return False, "已停止"
+            async with self.semaphore:
+                return await self.convert_attempts(converter, task, task_id, progress_callback, resume,
+                                                   keyframe_index)
     
-    def get_selected_videos(self):
-        """获取选中的视频"""
-        selected_videos = []
-        for item in self.video_tree.get_children():
-            if self.video_tree.set(item, "选择") == "✓":
-                if item in self.file_paths:
-                    file_path = self.file_paths[item]
-                    selected_videos.append((item, file_path))
-        return selected_videos
+    async def convert_attempts(self, converter, task, task_id, progress_callback, resume, keyframe_index):
+        """依次执行 ConversionAttempts 给出的各次尝试"""
+        attempts = ConversionAttempts(converter, task, task_id, self.log_callback, resume, keyframe_index)
+        options = await self.run_blocking(attempts.first)
+        while options is not None:
+            result = await converter.convert_async(self.executor, progress_callback, self.timeout,
+                                                   self.stall_timeout, **options)
+            options = await self.run_blocking(attempts.next, result)
+        return attempts.finish()
     
-    def start_selected_conversion(self):
-        """开始转换选中项"""
-        selected = self.get_selected_videos()
-        if not selected:
-            messagebox.showwarning("警告", "请先选择要转换的视频文件")
-            return
-        output_dir = self.output_entry.get().strip()
-        if not output_dir:
-            messagebox.showerror("错误", "请选择输出目录")
-            return
-        self.start_conversion(selected)
+    async def tracked(self, key, coroutine):
+        """登记协程对应的 asyncio.Task，使其可按键取消"""
+        self.running[key] = asyncio.current_task()
+        try:
+            return await coroutine
+        finally:
+            self.running.pop(key, None)
+    
+    def start(self):
+        """在后台线程中启动常驻事件循环"""
+        if self.thread is None:
+            self.loop = asyncio.new_event_loop()
+            use_pidfd_child_watcher(self.loop)
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+        return self
+    
+    def submit(self, key, coroutine):
+        """把协程提交到后台事件循环，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self.tracked(key, coroutine), self.loop)
     
-    def start_all_conversion(self):
-        """开始转换全部"""
-        all_videos = []
-        for item in self.video_tree.get_children():
-            if item in self.file_paths:
-                file_path = self.file_paths[item]
-                all_videos.append((item, file_path))
-        if not all_videos:
-            messagebox.showwarning("警告", "视频列表为空")
-            return
-        output_dir = self.output_entry.get().strip()
-        if not output_dir:
-            messagebox.showerror("错误", "请选择输出目录")
+    def cancel(self, keys=None):
+        """取消指定键（默认全部）的协程：排队中的直接取消，运行中的结束其 ffmpeg 进程组"""
+        def cancel_tasks():
+            for key, task in list(self.running.items()):
+                if keys is None or key in keys:
+                    task.cancel()
+        if self.loop is not None and self.thread is not None:
+            self.loop.call_soon_threadsafe(cancel_tasks)
+        else:
+            cancel_tasks()
+    
+    def close(self):
+        """取消全部协程并停止后台事件循环"""
+        if self.thread is not None:
+            async def shutdown():
+                tasks = list(self.running.values())
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.thread = None
+            self.loop = None
+        self.executor.shutdown(wait=True)
+
+
+class BatchRunner:
+    """无界面批量转换引擎，与图形界面使用相同的任务字典与转换器"""
+    
+    def __init__(self, parallel_tasks, ffmpeg_path=None, log_callback=None, schedule='fifo',
+                 autotuner=None, cache=None, resume=True, metrics=None, engine=None):
+        """parallel_tasks 为固定并发数；传入 autotuner 时由其动态控制并发，
+        线程池按 autotuner.maximum 创建；传入 metrics（BatchMetrics）时逐任务记录指标；
+        传入 engine（AsyncConversionEngine）时 run() 改用异步引擎执行"""
+        self.autotuner = autotuner
+        if autotuner:
+            parallel_tasks = autotuner.maximum
+        self.parallel_tasks = max(1, parallel_tasks)
+        self.ffmpeg_path = ffmpeg_path
+        self.schedule = schedule
+        self.cache = cache
+        self.resume = resume
+        self.metrics = metrics
+        self.engine = engine
+        self.keyframe_index = KeyframeIndex()
+        self.log_callback = log_callback
+        self.active_converters = set()
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.progress_steps = {}
+        self.executor = None
+        self.submitted = 0
+    
+    def log(self, message, task_id=None):
+        if self.log_callback:
+            self.log_callback(message, task_id)
+    
+    def on_progress(self, task_id, progress, input_size=0):
+        """每跨过 10% 输出一次任务进度，避免刷屏"""
+        if self.autotuner and progress['percent'] is not None:
+            self.autotuner.record_progress(task_id, input_size * progress['percent'] / 100)
+        if progress['percent'] is None or progress['finished']:
             return
-        self.start_conversion(all_videos)
+        step = int(progress['percent'] // 10)
+        with self.lock:
+            if step <= self.progress_steps.get(task_id, 0):
+                return
+            self.progress_steps[task_id] = step
+        self.log(f"[任务{task_id}] ⏳ {format_progress(progress)}", task_id)
     
-    def start_conversion(self, task_list):
-        """开始转换"""
-        output_dir = self.output_entry.get().strip()
-        duration_str = self.duration_entry.get().strip()
+    def run_task(self, task, task_id):
+        """运行单个任务，结果附带排队等待时间，并计入批次指标"""
+        queue_wait = time.time() - task['queued_at'] if 'queued_at' in task else 0.0
+        if self.metrics:
+            self.metrics.task_started()
+        result = self.execute_task(task, task_id)
+        return self.observe_result(result, queue_wait)
+    
+    async def run_task_async(self, task, task_id):
+        """run_task 的协程版本，由异步引擎调度"""
+        queue_wait = time.time() - task['queued_at'] if 'queued_at' in task else 0.0
+        if self.metrics:
+            self.metrics.task_started()
+        result = await self.execute_task_async(task, task_id)
+        return self.observe_result(result, queue_wait)
+    
+    def observe_result(self, result, queue_wait):
+        result['queue_wait'] = queue_wait
+        if self.metrics:
+            self.metrics.observe_task(result)
+        return result
+    
+    def begin_task(self, task, task_id):
+        """转换前的检查：未变化的跳过、已停止的放弃，返回 (提前结束的结果或 None, 输入大小)"""
+        if self.cache and self.cache.is_fresh(task):
+            self.log(f"[任务{task_id}] ⏭️ 未变化，已跳过: {source_name(task['file_path'])}", task_id)
+            return {
+                'task_id': task_id,
+                'file_path': task['file_path'],
+                'success': True,
+                'skipped': True,
+                'message': "未变化，已跳过",
+                'bytes': 0,
+                'elapsed': 0.0
+            }, 0
         
-        if not output_dir:
-            messagebox.showerror("错误", "请设置输出目录")
-            return
+        input_size = source_size(task['file_path'], task.get('size') or 0)
+        
+        if not self.is_running or (self.autotuner and not self.autotuner.acquire()):
+            return {
+                'task_id': task_id,
+                'file_path': task['file_path'],
+                'success': False,
+                'message': "已停止",
+                'bytes': 0,
+                'elapsed': 0.0
+            }, input_size
+        
+        if task_needs_encoding(task):
+            jobs = self.autotuner.limit if self.autotuner else self.parallel_tasks
+            task['threads'] = plan_thread_budget(jobs)['threads']
+        return None, input_size
+    
+    def finish_task(self, task, task_id, converter, success, message, started_at, elapsed, input_size):
+        """转换结束后更新缓存、输出耗时并生成任务结果"""
+        task['elapsed'] = elapsed
+        if self.cache:
+            if success:
+                self.cache.record(task)
+            else:
+                self.cache.forget(task)
+        
+        mb_per_sec = input_size / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+        self.log(f"[任务{task_id}] ⏱️ 耗时 {elapsed:.2f}s, {format_file_size(input_size)}, "
+                 f"{mb_per_sec:.1f} MB/s", task_id)
+        return {
+            'task_id': task_id,
+            'file_path': task['file_path'],
+            'success': success,
+            'message': message,
+            'bytes': input_size,
+            'output_bytes': converter.output_stats.get('bytes', 0),
+            'segments': converter.output_stats.get('segments', 0),
+            'started_at': started_at,
+            'elapsed': elapsed,
+            'timings': dict(converter.timings),
+            'failure': task.get('failure'),
+            'fixes': task.get('fixes', []),
+            'stream_path': task.get('stream_path')
+        }
+    
+    def execute_task(self, task, task_id):
+        """执行单个任务并记录吞吐量"""
+        early_result, input_size = self.begin_task(task, task_id)
+        if early_result:
+            return early_result
         
+        converter = M3U8Converter(self.ffmpeg_path)
+        with self.lock:
+            self.active_converters.add(converter)
         try:
-            segment_duration = int(duration_str)
-            if segment_duration <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("错误", "请输入有效的片段时长")
-            return
+            started_at = time.time()
+            start_time = time.perf_counter()
+            success, message = run_conversion_task(
+                converter, task, task_id,
+                log_callback=self.log,
+                progress_callback=lambda tid, progress: self.on_progress(tid, progress, input_size),
+                resume=self.resume,
+                keyframe_index=self.keyframe_index)
+            elapsed = time.perf_counter() - start_time
+        finally:
+            with self.lock:
+                self.active_converters.discard(converter)
+                self.progress_steps.pop(task_id, None)
+            if self.autotuner:
+                self.autotuner.task_finished(task_id, input_size)
+                self.autotuner.release()
+        if self.autotuner and success:
+            self.autotuner.record_task_time(elapsed, input_size)
+        return self.finish_task(task, task_id, converter, success, message, started_at, elapsed, input_size)
+    
+    async def execute_task_async(self, task, task_id):
+        """execute_task 的协程版本：ffmpeg 由事件循环驱动，缓存与探测等阻塞步骤在引擎线程池中执行"""
+        early_result, input_size = await self.engine.run_blocking(self.begin_task, task, task_id)
+        if early_result:
+            return early_result
         
+        converter = M3U8Converter(self.ffmpeg_path)
+        with self.lock:
+            self.active_converters.add(converter)
         try:
-            parallel_tasks = int(self.parallel_var.get())
-            parallel_tasks = max(1, min(parallel_tasks, self.max_workers * 2))
-        except:
-            parallel_tasks = self.max_workers
+            started_at = time.time()
+            start_time = time.perf_counter()
+            success, message = await self.engine.convert(
+                converter, task, task_id,
+                progress_callback=lambda tid, progress: self.on_progress(tid, progress, input_size),
+                resume=self.resume,
+                keyframe_index=self.keyframe_index)
+            elapsed = time.perf_counter() - start_time
+        finally:
+            with self.lock:
+                self.active_converters.discard(converter)
+                self.progress_steps.pop(task_id, None)
+        return await self.engine.run_blocking(self.finish_task, task, task_id, converter, success, message,
+                                              started_at, elapsed, input_size)
+    
+    def run(self, tasks=None, store=None):
+        """执行全部任务，返回批次汇总
         
-        output_path = Path(output_dir)
-        if not output_path.exists():
-            try:
-                output_path.mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                messagebox.showerror("错误", f"无法创建输出目录: {e}")
-                return
+        线程池中最多同时排队 并行数 × IN_FLIGHT_FACTOR 个任务，其余任务留在列表或任务库中。
+        传入 store（JobStore）时从中按需领取排队的任务并逐个写回结果（tasks 可省略），
+        内存占用与批次大小无关，汇总中不保留逐任务结果。
+        设置了 engine（AsyncConversionEngine）时改由单个事件循环驱动全部任务，排队上限相同。
+        """
+        self.is_running = True
+        results = []
+        start_time = time.perf_counter()
+        total = store.counts()['queued'] if store else len(tasks)
+        parallel_text = "自动" if self.autotuner else str(self.parallel_tasks)
+        engine_text = "，异步引擎" if self.engine else ""
+        self.log(f"🚀 开始批量转换: {total} 个任务, 并行 {parallel_text}{engine_text}")
         
-        # 重置状态
-        self.completed_tasks = 0
-        self.submitted_tasks = 0
-        self.task_results = {}
-        self.conversion_tasks = []
+        plan = None
+        if self.schedule == 'lpt' and store:
+            self.log("⚠️ 任务库模式不支持最长优先调度，按加入顺序执行")
+        elif self.schedule == 'lpt':
+            self.log("🔍 正在探测视频时长与大小...")
+            tasks, plan = plan_longest_first(tasks, self.parallel_tasks, M3U8Converter(self.ffmpeg_path))
+            self.log(describe_schedule_plan(plan))
         
-        for item, file_path in task_list:
-            path = Path(file_path)
-            task_output_dir = output_path / path.stem
-            self.conversion_tasks.append({
-                'item': item,
-                'file_path': file_path,
-                'output_dir': str(task_output_dir),
-                'segment_duration': segment_duration,
-                'output_filename': path.stem
-            })
-            self.video_tree.set(item, "状态", "等待")
+        if not store and any(task_needs_encoding(task) for task in tasks):
+            if self.autotuner:
+                self.log(describe_thread_plan(plan_thread_budget(self.autotuner.limit))
+                         + "，随自动并发调整逐任务重新计算")
+            else:
+                self.log(describe_thread_plan(plan_thread_budget(self.parallel_tasks)))
         
-        self.is_converting = True
-        self.start_selected_btn.config(state=tk.DISABLED)
-        self.start_all_btn.config(state=tk.DISABLED)
-        self.stop_btn.config(state=tk.NORMAL)
+        if store:
+            next_tasks = store.claim
+        else:
+            task_iter = iter(tasks)
+            next_tasks = lambda count: list(itertools.islice(task_iter, count))
         
-        self.overall_progress.config(maximum=len(self.conversion_tasks), value=0)
-        self.progress_label.config(text=f"0/{len(self.conversion_tasks)}")
-        self.parallel_status_label.config(text="0")
+        window = self.parallel_tasks * IN_FLIGHT_FACTOR
+        queued_at = time.time()
+        counters = {'submitted': 0, 'completed': 0, 'success': 0, 'skipped': 0, 'bytes': 0}
+        paths = {}
         
-        self.log_message("🚀 开始批量转换...")
-        self.log_message(f"📋 总任务数: {len(self.conversion_tasks)}")
+        def prepare(task):
+            """分配任务编号并记录排队时间"""
+            counters['submitted'] += 1
+            task.setdefault('queued_at', queued_at)
+            return task['job_id'] if store else counters['submitted']
         
-        # 创建线程池并提交任务
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=parallel_tasks)
-        self.futures = {}
+        def on_result(task, result):
+            if store:
+                # 停止后结束的任务回到队列，下次运行时继续
+                stopped = not result['success'] and not self.is_running
+                store.finish(task, result['success'], result['message'], result['elapsed'],
+                             outcome='stopped' if stopped else None)
+            else:
+                results.append(result)
+            counters['completed'] += 1
+            counters['success'] += result['success']
+            counters['skipped'] += bool(result.get('skipped'))
+            counters['bytes'] += result['bytes']
+            if result.get('stream_path'):
+                paths[result['stream_path']] = paths.get(result['stream_path'], 0) + 1
         
-        for task_index, task in enumerate(self.conversion_tasks):
-            future = self.submit_single_task(task, task_index + 1)
-            if future:
-                self.futures[future] = task_index
-                self.submitted_tasks += 1
+        if self.autotuner:
+            self.autotuner.start()
+        try:
+            if self.engine:
+                asyncio.run(self.run_async(next_tasks, window, prepare, on_result, store))
+            else:
+                self.run_threads(next_tasks, window, prepare, on_result, store)
+        except KeyboardInterrupt:
+            self.log("⏹️ 用户中断，正在停止转换...")
+            self.stop()
+        finally:
+            if self.engine:
+                self.engine.close()
+            if self.autotuner:
+                self.autotuner.stop()
+            if self.cache:
+                self.cache.flush()
+            self.is_running = False
         
-        self.monitor_tasks()
+        wall_time = time.perf_counter() - start_time
+        completed = counters['completed']
+        success_count = counters['success']
+        skipped_count = counters['skipped']
+        total_bytes = counters['bytes']
+        summary = {
+            'total': total,
+            'completed': completed,
+            'success': success_count,
+            'skipped': skipped_count,
+            'failed': completed - success_count,
+            'bytes': total_bytes,
+            'wall_time': wall_time,
+            'files_per_sec': completed / wall_time if wall_time > 0 else 0.0,
+            'mb_per_sec': total_bytes / 1024 / 1024 / wall_time if wall_time > 0 else 0.0,
+            'paths': paths,
+            'results': results
+        }
+        self.log(f"📊 转换结果: 成功 {success_count}/{total} (跳过 {skipped_count}), "
+                 f"总耗时 {wall_time:.2f}s, {summary['files_per_sec']:.2f} 文件/s, "
+                 f"{summary['mb_per_sec']:.1f} MB/s")
+        if paths:
+            self.log(f"🎛️ 编码路径: {describe_stream_paths(paths)}")
+        if plan:
+            self.log(describe_schedule_result(plan, tasks, wall_time))
+        return summary
     
-    def submit_single_task(self, task, task_id):
-        """提交单个任务"""
-        if not self.is_converting:
-            return None
+    def run_threads(self, next_tasks, window, prepare, on_result, store):
+        """线程池执行：最多 window 个任务在池中排队或运行，完成一个补充一个"""
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel_tasks)
+        pending = {}  # Future -> 任务
         
-        file_name = Path(task['file_path']).name
-        self.video_tree.set(task['item'], "状态", "转换中")
-        self.log_message(f"🔧 提交任务 {task_id}/{len(self.conversion_tasks)}: {file_name}")
+        def fill():
+            while self.is_running and len(pending) < window:
+                batch = next_tasks(window - len(pending))
+                if not batch:
+                    return
+                for task in batch:
+                    pending[executor.submit(self.run_task, task, prepare(task))] = task
         
         try:
-            future = self.executor.submit(self.run_single_task_optimized, task, task_id)
-            future.add_done_callback(self.task_finished_callback)
-            return future
-        except Exception as e:
-            self.log_message(f"❌ 提交任务失败: {str(e)}")
-            self.video_tree.set(task['item'], "状态", "失败")
-            return None
-    
-    def run_single_task_optimized(self, task, task_id):
-        """运行单个任务"""
-        converter = M3U8Converter()
-        success, message = converter.convert_to_m3u8_optimized(
-            input_file=task['file_path'],
-            output_dir=task['output_dir'],
-            segment_duration=task['segment_duration'],
-            output_filename=task['output_filename'],
-            log_callback=self.log_message,
-            task_id=task_id
-        )
-        return task, task_id, success, message
+            fill()
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    on_result(task, future.result())
+                fill()
+        except KeyboardInterrupt:
+            self.log("⏹️ 用户中断，正在停止转换...")
+            self.stop()
+            for future, task in pending.items():
+                if future.cancel() and store:
+                    store.finish(task, False, "已停止", outcome='stopped')
+        finally:
+            executor.shutdown(wait=True)
     
-    def task_finished_callback(self, future):
-        """任务完成回调"""
-        if not self.is_converting:
-            return
+    async def run_async(self, next_tasks, window, prepare, on_result, store):
+        """事件循环执行：生产者按 window 容量的有界队列领取任务（队列满即等待），
+        并行数个工作协程从队列取任务，实际同时运行的 ffmpeg 数由引擎信号量限制"""
+        use_pidfd_child_watcher()
+        queue = asyncio.Queue(maxsize=window)
+        workers = self.parallel_tasks
+        held = []  # 已领取、尚未放入队列的任务
+        
+        async def producer():
+            while self.is_running:
+                held[:] = await self.engine.run_blocking(next_tasks, max(1, window - queue.qsize()))
+                if not held:
+                    break
+                while held:
+                    await queue.put(held[0])
+                    held.pop(0)
+            for _ in range(workers):
+                await queue.put(None)
+        
+        async def worker():
+            while True:
+                task = await queue.get()
+                if task is None:
+                    return
+                try:
+                    result = await self.run_task_async(task, prepare(task))
+                except asyncio.CancelledError:
+                    if store:
+                        store.finish(task, False, "已停止", outcome='stopped')
+                    raise
+                on_result(task, result)
+        
+        coroutines = [asyncio.ensure_future(producer())] + [asyncio.ensure_future(worker()) for _ in range(workers)]
         try:
-            task, task_id, success, message = future.result()
-            self.root.after(0, self.handle_task_result, task, task_id, success, message)
-        except Exception as e:
-            self.log_message(f"❌ 任务执行异常: {str(e)}")
+            await asyncio.gather(*coroutines)
+        except asyncio.CancelledError:
+            # gather 在第一个协程被取消时就返回，须等全部工作协程结束各自的 ffmpeg 进程
+            for coroutine in coroutines:
+                coroutine.cancel()
+            await asyncio.gather(*coroutines, return_exceptions=True)
+            # 已领取但还没开始的任务放回任务库
+            if store:
+                unstarted = held + [queue.get_nowait() for _ in range(queue.qsize())]
+                for task in unstarted:
+                    if task is not None:
+                        store.finish(task, False, "已停止", outcome='stopped')
+            raise
     
-    def handle_task_result(self, task, task_id, success, message):
-        """处理任务结果"""
-        if not self.is_converting:
-            return
-        
-        status = "成功" if success else "失败"
-        self.video_tree.set(task['item'], "状态", status)
-        self.task_results[task_id] = (success, message)
-        self.completed_tasks += 1
+    def submit(self, task):
+        """把单个任务提交到常驻线程池（监视模式使用），返回 Future"""
+        with self.lock:
+            if self.executor is None:
+                self.is_running = True
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel_tasks)
+            self.submitted += 1
+            task_id = self.submitted
+        task['queued_at'] = time.time()
+        return self.executor.submit(self.run_task, task, task_id)
+    
+    def shutdown(self):
+        """停止 submit() 使用的线程池，丢弃排队中的任务"""
+        self.stop()
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self.cache:
+            self.cache.flush()
+    
+    def stop(self):
+        """停止所有运行中的转换"""
+        self.is_running = False
+        if self.autotuner:
+            self.autotuner.stop()
+        with self.lock:
+            converters = list(self.active_converters)
+        for converter in converters:
+            converter.request_stop()
+        # 一次性结束全部进程组，所有进程共享同一个宽限期
+        process_registry.terminate([converter.process_key for converter in converters])
+
+
+DISTRIBUTED_LEASE_SECONDS = 60
+DISTRIBUTED_HEARTBEAT_SECONDS = 10
+DISTRIBUTED_MAX_ATTEMPTS = 3
+DISTRIBUTED_TOKEN_HEADER = "X-M3U8-Token"  # 工作节点接口要求的共享令牌
+DISTRIBUTED_TOKEN_ENV = "M3U8_COORDINATOR_TOKEN"
+
+
+def job_task_payload(task):
+    """任务字典中可通过网络传输的部分（去掉界面列表项等本地对象）"""
+    return {key: value for key, value in task.items() if key != 'item'}
+
+
+class JobCoordinator:
+    """分布式模式的协调端
+    
+    持有由 make_conversion_task 生成的任务队列，工作节点通过 HTTP 租用任务、
+    定期发送心跳（附带进度）并回报结果。心跳超时的租约失效，任务重新排队，
+    租约失效超过 max_attempts 次的任务记为失败。
+    各节点须能以相同路径访问输入与输出目录（例如共享存储）。
+    设置 token 时，工作节点接口（租用、心跳、回报）要求请求头 DISTRIBUTED_TOKEN_HEADER 与之相同。
+    """
+    
+    def __init__(self, tasks, lease_seconds=DISTRIBUTED_LEASE_SECONDS, max_attempts=DISTRIBUTED_MAX_ATTEMPTS,
+                 log_callback=None, cache=None, token=None):
+        self.lease_seconds = lease_seconds
+        self.token = token
+        self.max_attempts = max(1, max_attempts)
+        self.log_callback = log_callback
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.pending = deque()
+        self.leased = {}
+        self.workers = {}
+        self.remaining = len(tasks)
+        self.finished_event = threading.Event()
+        self.server = None
+        self.start_time = time.perf_counter()
+        for index, task in enumerate(tasks):
+            job_id = index + 1
+            self.jobs[job_id] = {'id': job_id, 'task': task, 'state': 'pending', 'worker': None,
+                                 'expires': 0.0, 'attempts': 0, 'progress_step': 0, 'result': None}
+            self.pending.append(job_id)
+        if not tasks:
+            self.finished_event.set()
+    
+    def log(self, message, task_id=None):
+        if self.log_callback:
+            self.log_callback(message, task_id)
+    
+    def finish_job(self, job, success, message, elapsed=0.0, skipped=False):
+        """记录任务结果（调用方持有锁）"""
+        job['state'] = 'done' if success else 'failed'
+        job['result'] = {'task_id': job['id'], 'file_path': job['task']['file_path'], 'success': success,
+                         'skipped': skipped, 'message': message, 'worker': job['worker'], 'elapsed': elapsed}
+        self.leased.pop(job['id'], None)
+        if self.cache and not skipped:
+            if success:
+                self.cache.record(job['task'])
+            else:
+                self.cache.forget(job['task'])
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.finished_event.set()
+    
+    def reap_expired(self):
+        """回收心跳超时的租约（调用方持有锁）"""
+        now = time.monotonic()
+        for job in [job for job in self.leased.values() if job['expires'] < now]:
+            if job['attempts'] >= self.max_attempts:
+                self.log(f"[任务{job['id']}] ❌ 租约已失效 {job['attempts']} 次，放弃该任务", job['id'])
+                self.finish_job(job, False, f"节点多次失联（{job['attempts']} 次）")
+            else:
+                self.log(f"[任务{job['id']}] ⚠️ 节点 {job['worker']} 心跳超时，任务重新排队", job['id'])
+                job['state'] = 'pending'
+                self.leased.pop(job['id'], None)
+                self.pending.appendleft(job['id'])
+    
+    def lease(self, worker):
+        """为工作节点分配一个任务；没有可分配的任务时 job_id 为 None，finished 表示全部完成"""
+        with self.lock:
+            self.workers[worker] = time.time()
+            self.reap_expired()
+            while self.pending:
+                job = self.jobs[self.pending.popleft()]
+                if job['state'] != 'pending':
+                    continue
+                if self.cache and self.cache.is_fresh(job['task']):
+                    self.log(f"[任务{job['id']}] ⏭️ 未变化，已跳过: {source_name(job['task']['file_path'])}",
+                             job['id'])
+                    self.finish_job(job, True, "未变化，已跳过", skipped=True)
+                    continue
+                job['state'] = 'leased'
+                job['worker'] = worker
+                job['attempts'] += 1
+                job['progress_step'] = 0
+                job['expires'] = time.monotonic() + self.lease_seconds
+                self.leased[job['id']] = job
+                self.log(f"[任务{job['id']}] 📤 分配给 {worker}: {source_name(job['task']['file_path'])}",
+                         job['id'])
+                return {'job_id': job['id'], 'task': job_task_payload(job['task']),
+                        'lease_seconds': self.lease_seconds}
+            return {'job_id': None, 'finished': self.finished_event.is_set()}
+    
+    def heartbeat(self, worker, job_id, progress=None):
+        """续租并记录进度，租约已不属于该节点时返回 ok=False"""
+        with self.lock:
+            self.workers[worker] = time.time()
+            job = self.leased.get(job_id)
+            if not job or job['worker'] != worker:
+                return {'ok': False}
+            job['expires'] = time.monotonic() + self.lease_seconds
+            report = False
+            if progress and progress.get('percent') is not None and not progress.get('finished'):
+                step = int(progress['percent'] // 10)
+                if step > job['progress_step']:
+                    job['progress_step'] = step
+                    report = True
+        if report:
+            self.log(f"[任务{job_id}] ⏳ {worker}: {format_progress(progress)}", job_id)
+        return {'ok': True}
+    
+    def complete(self, worker, job_id, success, message, elapsed=0.0):
+        """接收任务结果；任务已被重新分配给其他节点时忽略"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job['worker'] != worker or job['state'] not in ('leased', 'pending'):
+                return {'ok': False}
+            icon = "✅" if success else "❌"
+            self.log(f"[任务{job_id}] {icon} {worker}: {message} ({elapsed:.2f}s)", job_id)
+            self.finish_job(job, bool(success), message, elapsed)
+        return {'ok': True}
+    
+    def status(self):
+        with self.lock:
+            states = {}
+            for job in self.jobs.values():
+                states[job['state']] = states.get(job['state'], 0) + 1
+            return {'jobs': len(self.jobs), 'states': states, 'workers': sorted(self.workers),
+                    'finished': self.finished_event.is_set()}
+    
+    def make_handler(self):
+        coordinator = self
         
-        self.overall_progress.config(value=self.completed_tasks)
-        self.progress_label.config(text=f"{self.completed_tasks}/{len(self.conversion_tasks)}")
+        class Handler(BaseHTTPRequestHandler):
+            routes = {
+                '/lease': lambda body: coordinator.lease(body['worker']),
+                '/heartbeat': lambda body: coordinator.heartbeat(body['worker'], body['job_id'],
+                                                                 body.get('progress')),
+                '/complete': lambda body: coordinator.complete(body['worker'], body['job_id'], body['success'],
+                                                               body.get('message', ""), body.get('elapsed', 0.0)),
+            }
+            
+            def reply(self, code, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_POST(self):
+                route = self.routes.get(self.path)
+                if route is None:
+                    return self.reply(404, {'error': "unknown endpoint"})
+                if coordinator.token and not hmac.compare_digest(
+                        self.headers.get(DISTRIBUTED_TOKEN_HEADER, "").encode('utf-8'),
+                        coordinator.token.encode('utf-8')):
+                    return self.reply(401, {'error': "invalid token"})
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    return self.reply(200, route(body))
+                except (ValueError, KeyError, TypeError) as e:
+                    return self.reply(400, {'error': str(e)})
+            
+            def do_GET(self):
+                if self.path != '/status':
+                    return self.reply(404, {'error': "unknown endpoint"})
+                return self.reply(200, coordinator.status())
+            
+            def log_message(self, format, *args):
+                pass
         
-        running_count = self.submitted_tasks - self.completed_tasks
-        self.parallel_status_label.config(text=str(running_count))
+        return Handler
     
-    def monitor_tasks(self):
-        """监控任务状态"""
-        if not self.is_converting:
+    def serve(self, host, port):
+        """在后台线程启动 HTTP 服务，返回实际监听的 (主机, 端口)"""
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[:2]
+    
+    def wait(self, poll_interval=1.0):
+        """等待全部任务完成（期间回收超时租约），返回批次汇总"""
+        while not self.finished_event.wait(poll_interval):
+            with self.lock:
+                self.reap_expired()
+        return self.summary()
+    
+    def summary(self):
+        with self.lock:
+            results = [job['result'] for job in self.jobs.values() if job['result']]
+        wall_time = time.perf_counter() - self.start_time
+        success_count = sum(1 for result in results if result['success'])
+        skipped_count = sum(1 for result in results if result['skipped'])
+        summary = {
+            'total': len(self.jobs),
+            'completed': len(results),
+            'success': success_count,
+            'skipped': skipped_count,
+            'failed': len(results) - success_count,
+            'wall_time': wall_time,
+            'files_per_sec': len(results) / wall_time if wall_time > 0 else 0.0,
+            'workers': len(self.workers),
+            'results': results
+        }
+        self.log(f"📊 转换结果: 成功 {success_count}/{len(self.jobs)} (跳过 {skipped_count}), "
+                 f"{len(self.workers)} 个节点, 总耗时 {wall_time:.2f}s, {summary['files_per_sec']:.2f} 文件/s")
+        return summary
+    
+    def shutdown(self, linger=None):
+        """保留服务一段时间让轮询中的节点得知已完成，然后关闭"""
+        if not self.server:
             return
-        if self.completed_tasks >= len(self.conversion_tasks):
-            self.finalize_conversion()
-        else:
-            self.root.after(1000, self.monitor_tasks)
+        if linger is None:
+            linger = DISTRIBUTED_HEARTBEAT_SECONDS
+        deadline = time.monotonic() + linger
+        while time.monotonic() < deadline:
+            with self.lock:
+                # 最近一个轮询周期内没有节点访问即可提前关闭
+                recent = [seen for seen in self.workers.values() if time.time() - seen < 3]
+            if not recent:
+                break
+            time.sleep(0.5)
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JobWorker:
+    """分布式模式的工作节点：从协调端租用任务，在本机调用 ffmpeg 转换并回报结果"""
     
-    def finalize_conversion(self):
-        """完成转换"""
-        if hasattr(self, 'executor'):
-            self.executor.shutdown(wait=True)
+    def __init__(self, coordinator_url, name=None, parallel_tasks=1, ffmpeg_path=None, log_callback=None,
+                 heartbeat_interval=DISTRIBUTED_HEARTBEAT_SECONDS, poll_interval=2.0, token=None):
+        self.url = coordinator_url.rstrip('/')
+        self.token = token
+        if "://" not in self.url:
+            self.url = "http://" + self.url
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.parallel_tasks = max(1, parallel_tasks)
+        self.ffmpeg_path = ffmpeg_path
+        self.log_callback = log_callback
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.keyframe_index = KeyframeIndex()
+        self.active_converters = set()
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.completed = 0
+        self.succeeded = 0
+    
+    def log(self, message, task_id=None):
+        if self.log_callback:
+            self.log_callback(message, task_id)
+    
+    def call(self, endpoint, payload, retries=5):
+        """POST JSON 到协调端，连接失败时退避重试，全部失败抛出 ConnectionError"""
+        data = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers[DISTRIBUTED_TOKEN_HEADER] = self.token
+        last_error = None
+        for attempt in range(retries):
+            try:
+                request = urllib.request.Request(self.url + endpoint, data=data, headers=headers)
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    return json.loads(response.read() or b"{}")
+            except urllib.error.HTTPError as e:
+                if e.code == 401:
+                    raise ConnectionError(f"协调端 {self.url} 拒绝了令牌，请检查 --token 或 {DISTRIBUTED_TOKEN_ENV}")
+                last_error = e
+                if attempt + 1 < retries:
+                    time.sleep(min(2 ** attempt, 10))
+            except (OSError, ValueError) as e:
+                last_error = e
+                if attempt + 1 < retries:
+                    time.sleep(min(2 ** attempt, 10))
+        raise ConnectionError(f"无法连接协调端 {self.url}: {last_error}")
+    
+    def run_job(self, job):
+        task = job['task']
+        task_id = job['job_id']
+        if task_needs_encoding(task):
+            task['threads'] = plan_thread_budget(self.parallel_tasks)['threads']
         
-        self.is_converting = False
-        self.start_selected_btn.config(state=tk.NORMAL)
-        self.start_all_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.DISABLED)
+        converter = M3U8Converter(self.ffmpeg_path)
+        with self.lock:
+            self.active_converters.add(converter)
+        latest = {}
+        stop_heartbeat = threading.Event()
         
-        success_count = sum(1 for result in self.task_results.values() if result[0])
-        self.log_message("🎉 批量转换完成！")
-        self.log_message(f"📊 转换结果: 成功 {success_count}/{len(self.conversion_tasks)}")
+        def heartbeat():
+            while not stop_heartbeat.wait(self.heartbeat_interval):
+                try:
+                    reply = self.call('/heartbeat', {'worker': self.name, 'job_id': task_id,
+                                                     'progress': latest.get('progress')}, retries=1)
+                except ConnectionError:
+                    continue
+                if not reply.get('ok'):
+                    self.log(f"[任务{task_id}] ⚠️ 租约已失效，停止转换", task_id)
+                    converter.stop_conversion()
+                    return
         
-        messagebox.showinfo("完成", f"批量转换完成！\n成功: {success_count}/{len(self.conversion_tasks)}")
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        start_time = time.perf_counter()
+        try:
+            success, message = run_conversion_task(
+                converter, task, task_id,
+                log_callback=self.log,
+                progress_callback=lambda tid, progress: latest.__setitem__('progress', progress),
+                keyframe_index=self.keyframe_index)
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+            with self.lock:
+                self.active_converters.discard(converter)
+        elapsed = time.perf_counter() - start_time
+        
+        if not self.is_running:
+            # 本节点正在停止：不回报结果，租约到期后由协调端重新分配
+            return
+        with self.lock:
+            self.completed += 1
+            self.succeeded += 1 if success else 0
+        self.call('/complete', {'worker': self.name, 'job_id': task_id, 'success': success,
+                                'message': message, 'elapsed': elapsed})
     
-    def stop_conversion(self):
-        """停止转换"""
-        self.is_converting = False
-        if hasattr(self, 'executor'):
-            self.executor.shutdown(wait=False)
+    def worker_loop(self):
+        while self.is_running:
+            try:
+                reply = self.call('/lease', {'worker': self.name})
+                if reply.get('job_id') is None:
+                    if reply.get('finished'):
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+                self.run_job(reply)
+            except ConnectionError as e:
+                self.log(f"❌ {e}")
+                return
+    
+    def run(self):
+        """启动 parallel_tasks 个执行线程，直到协调端报告全部完成，返回 (完成数, 成功数)"""
+        self.is_running = True
+        self.log(f"🛰️ 节点 {self.name} 已连接 {self.url}，并行 {self.parallel_tasks}")
+        threads = [threading.Thread(target=self.worker_loop, daemon=True) for _ in range(self.parallel_tasks)]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.log("⏹️ 用户中断，正在停止转换...")
+            self.stop()
+        self.is_running = False
+        self.log(f"📊 节点 {self.name} 完成 {self.completed} 个任务，成功 {self.succeeded}")
+        return self.completed, self.succeeded
+    
+    def stop(self):
+        """停止领取新任务并结束本机运行中的转换（租约到期后由协调端重新分配）"""
+        self.is_running = False
+        with self.lock:
+            converters = list(self.active_converters)
+        for converter in converters:
+            converter.request_stop()
+        process_registry.terminate([converter.process_key for converter in converters])
+
+
+def console_log(message, task_id=None):
+    """命令行日志输出"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    # 单次写入整行，避免多线程输出时换行符交错
+    sys.stdout.write(f"[{timestamp}] {message}\n")
+    sys.stdout.flush()
+
+
+def add_task_arguments(parser):
+    """添加生成转换任务所需的参数（单机模式与分布式协调端共用）"""
+    parser.add_argument("inputs", nargs="*",
+                        help="输入目录、视频文件、通配符（如 'videos/**/*.mp4'）或 HTTP(S) 视频/m3u8 地址")
+    parser.add_argument("-m", "--manifest", help="清单文件，每行一个视频路径或 HTTP(S) 地址")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归扫描输入目录的子文件夹")
+    parser.add_argument("--include", action="append", default=[],
+                        help="只包含匹配的文件（通配符，可多次指定），默认按视频扩展名过滤")
+    parser.add_argument("--exclude", action="append", default=[],
+                        help="排除匹配的文件或目录（通配符，可多次指定）")
+    parser.add_argument("-o", "--output", required=True, help="输出目录")
+    parser.add_argument("-s", "--segment-duration", type=int, default=10, help="片段时长（秒），默认 10")
+    parser.add_argument("--output-mode", choices=list(OUTPUT_MODES), default='ts',
+                        help="输出格式: ts 片段, fmp4 片段 (CMAF), single/fmp4_single 单文件字节范围，默认 ts")
+    parser.add_argument("--abr", metavar="LADDER",
+                        help="多码率输出：源流复制一路加缩放档位，格式 '720:2800k,480:1400k'，并生成主播放列表")
+    parser.add_argument("--transcode", choices=list(TRANSCODE_PRESETS),
+                        help="使用 libx264/AAC 软件转码而非直接复制；CPU 线程按并行任务数平均分配")
+    parser.add_argument("--gop-plan", choices=list(GOP_PLAN_MODES), default='off',
+                        help="流复制前分析关键帧（结果缓存到磁盘）: warn 预测片段时长分布并提示, "
+                             "auto 自动改用切片更均匀的时长，默认 off")
+    parser.add_argument("--force", action="store_true",
+                        help=f"忽略增量缓存（输出目录下的 {CACHE_FILENAME}），全部重新转换")
+    parser.add_argument("--reconnect-delay-max", type=int, default=NETWORK_DEFAULTS['reconnect_delay_max'],
+                        help=f"URL 输入断线重连的最长等待（秒），默认 {NETWORK_DEFAULTS['reconnect_delay_max']}")
+    parser.add_argument("--rw-timeout", type=float, default=NETWORK_DEFAULTS['rw_timeout'],
+                        help=f"URL 输入单次网络读写超时（秒），默认 {NETWORK_DEFAULTS['rw_timeout']:g}")
+    parser.add_argument("--no-read-ahead", action="store_true",
+                        help="URL 输入不预读（默认 HLS 源并行预取下一个片段，单文件源在独立线程中读取）")
+
+
+def task_options_from_args(parser, args):
+    """校验任务参数，返回 make_conversion_task 的附加参数"""
+    if args.segment_duration <= 0:
+        parser.error("片段时长必须为正整数")
+    
+    if args.reconnect_delay_max < 0 or args.rw_timeout <= 0:
+        parser.error("重连等待不能为负数，读写超时必须为正数")
+    
+    abr_ladder = None
+    if args.abr:
+        try:
+            abr_ladder = parse_abr_ladder(args.abr)
+        except ValueError as e:
+            parser.error(str(e))
+    network = {'reconnect_delay_max': args.reconnect_delay_max, 'rw_timeout': args.rw_timeout,
+               'read_ahead': not args.no_read_ahead}
+    return {'abr_ladder': abr_ladder, 'transcode': args.transcode, 'gop_plan': args.gop_plan,
+            'output_mode': args.output_mode, 'network': network}
+
+
+def add_metrics_arguments(parser, report=True):
+    """添加指标导出参数；report 为 False 时不提供批次报告（常驻模式）"""
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="每个任务结束后把 Prometheus 文本格式指标写入该文件（可供 node_exporter textfile 采集）")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="在 127.0.0.1 的该端口提供 HTTP /metrics")
+    if report:
+        parser.add_argument("--report", metavar="PATH", help="批次结束后写入 JSON 报告（逐任务阶段耗时与字节数）")
+
+
+def metrics_from_args(args):
+    """按命令行参数创建 BatchMetrics，未请求任何导出时返回 None"""
+    if not (args.metrics_file or args.metrics_port or getattr(args, 'report', None)):
+        return None
+    metrics = BatchMetrics(textfile=args.metrics_file)
+    if args.metrics_port:
+        port = metrics.serve(args.metrics_port)
+        console_log(f"📈 指标地址: http://127.0.0.1:{port}/metrics")
+    return metrics
+
+
+def finish_metrics(metrics, args):
+    """写出最终的指标文件与批次报告，并关闭指标服务"""
+    if not metrics:
+        return
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
+    if getattr(args, 'report', None):
+        metrics.write_report(args.report)
+        console_log(f"📄 批次报告已写入: {args.report}")
+    metrics.close()
+
+
+def build_tasks_from_args(parser, args):
+    """校验任务参数、收集输入并生成任务字典列表"""
+    options = task_options_from_args(parser, args)
+    if not args.inputs and not args.manifest:
+        parser.error("请指定输入目录、文件、通配符或清单文件")
+    
+    files = collect_input_files(args.inputs, args.manifest, recursive=args.recursive,
+                                include=args.include, exclude=args.exclude)
+    namer = OutputNamer()
+    return [make_conversion_task(file_path, args.output, args.segment_duration,
+                                 output_name=namer.name_for(file_path), **options)
+            for file_path in files]
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="m3u8_batch_converter",
+        description="M3U8 批量视频分割工具（命令行模式）。不带参数运行时启动图形界面。")
+    add_task_arguments(parser)
+    parser.add_argument("-j", "--parallel", default=str(min(4, (os.cpu_count() or 1))),
+                        help="并行任务数或 auto（按磁盘吞吐自动调整），默认 min(4, CPU核数)")
+    parser.add_argument("--max-parallel", type=int, default=AUTO_MAX_PARALLEL,
+                        help=f"auto 模式下的并发上限，默认 {AUTO_MAX_PARALLEL}")
+    parser.add_argument("--schedule", choices=sorted(SCHEDULE_MODES), default='fifo',
+                        help="调度方式: fifo 按列表顺序, lpt 探测时长后最长优先，默认 fifo")
+    parser.add_argument("--engine", choices=("thread", "async"), default="thread",
+                        help="执行引擎: thread 每个任务一个线程, async 单个事件循环驱动全部 ffmpeg 进程"
+                             "（适合数百个并行的流复制任务，-j 可设得很大），默认 thread")
+    parser.add_argument("--timeout", type=float,
+                        help="单次 ffmpeg 运行的最长时间（秒），超时即结束，仅异步引擎")
+    parser.add_argument("--max-per-host", type=int, default=NETWORK_MAX_PER_HOST,
+                        help=f"同一主机同时转换的 URL 输入数上限（0 为不限制），默认 {NETWORK_MAX_PER_HOST}")
+    parser.add_argument("--stall-timeout", type=float, default=FFMPEG_STALL_TIMEOUT,
+                        help=f"ffmpeg 无任何输出超过该秒数视为卡死并结束，仅异步引擎，默认 {FFMPEG_STALL_TIMEOUT:g}")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="不从中断处续转，已有的未完成输出将被覆盖")
+    parser.add_argument("--job-store", metavar="DB",
+                        help="把批次保存到 SQLite 任务库：逐任务记录状态与结果，中断后用同一任务库再次运行即可继续"
+                             "（此时可不指定输入）")
+    parser.add_argument("--retry-failed", action="store_true", help="任务库中失败的任务重新排队")
+    parser.add_argument("--ffmpeg", help="ffmpeg 可执行文件路径，默认自动查找")
+    add_metrics_arguments(parser)
+    return parser
+
+
+def cli_main(argv):
+    """命令行模式入口"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    
+    autotuner = None
+    if args.parallel == 'auto':
+        autotuner = ConcurrencyAutotuner(maximum=args.max_parallel, log_callback=console_log)
+        parallel_tasks = args.max_parallel
+    else:
+        try:
+            parallel_tasks = int(args.parallel)
+        except ValueError:
+            parser.error("并行任务数必须为正整数或 auto")
+    if args.engine == "async" and autotuner:
+        parser.error("异步引擎不支持 -j auto，请指定并行任务数")
+    if args.max_per_host < 0:
+        parser.error("每主机连接数不能为负数")
+    host_connections.limit = args.max_per_host
+    
+    store = None
+    if args.job_store:
+        store = JobStore(args.job_store)
+        if store.recovered:
+            console_log(f"♻️ 任务库中有 {store.recovered} 个任务在上次运行时中断，已重新排队")
+        if args.inputs or args.manifest:
+            added = store.add_tasks(build_tasks_from_args(parser, args))
+            console_log(f"📋 任务库新增 {added} 个任务")
+        else:
+            task_options_from_args(parser, args)
+        if args.retry_failed:
+            console_log(f"🔁 {store.retry_failed()} 个失败任务重新排队")
+        counts = store.counts()
+        console_log(f"📋 任务库: 排队 {counts['queued']}, 完成 {counts['done']}, 失败 {counts['failed']}")
+        tasks = None
+        has_work = counts['queued'] > 0
+    else:
+        tasks = build_tasks_from_args(parser, args)
+        has_work = bool(tasks)
+    if not has_work and store:
+        console_log("✅ 任务库中没有待转换的任务")
+        return 0 if counts['failed'] == 0 else 1
+    if not has_work:
+        console_log("⚠️ 未找到任何视频文件")
+        return 1
+    
+    converter = M3U8Converter(args.ffmpeg)
+    success, message = converter.check_ffmpeg()
+    console_log(f"✅ {message}" if success else f"⚠️ {message}")
+    if not success:
+        return 1
+    
+    cache = None if args.force else ConversionCache(Path(args.output) / CACHE_FILENAME)
+    metrics = metrics_from_args(args)
+    engine = None
+    if args.engine == "async":
+        engine = AsyncConversionEngine(parallel_tasks, log_callback=console_log, timeout=args.timeout,
+                                       stall_timeout=args.stall_timeout)
+    runner = BatchRunner(parallel_tasks, ffmpeg_path=converter.ffmpeg_path, log_callback=console_log,
+                         schedule=args.schedule, autotuner=autotuner, cache=cache,
+                         resume=not args.no_resume, metrics=metrics, engine=engine)
+    try:
+        summary = runner.run(tasks, store=store)
+    finally:
+        finish_metrics(metrics, args)
+    if store:
+        counts = store.counts()
+        store.close()
+        console_log(f"📋 任务库: 排队 {counts['queued']}, 完成 {counts['done']}, 失败 {counts['failed']}")
+        return 0 if counts['queued'] == 0 and counts['failed'] == 0 else 1
+    return 0 if summary['success'] == summary['total'] else 1
+
+
+def build_coordinator_arg_parser():
+    """构建 coordinator 子命令的参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="m3u8_batch_converter coordinator",
+        description="分布式模式协调端：生成任务队列，由各工作节点通过 HTTP 租用执行。"
+                    "输入与输出路径须在所有节点上以相同路径可用（如共享存储）。")
+    add_task_arguments(parser)
+    parser.add_argument("--listen", default="127.0.0.1:8765",
+                        help="监听地址，默认 127.0.0.1:8765（仅本机）；其他机器的节点接入时指定如 0.0.0.0:8765")
+    parser.add_argument("--token", default=os.environ.get(DISTRIBUTED_TOKEN_ENV),
+                        help=f"工作节点须提供的共享令牌，默认读取环境变量 {DISTRIBUTED_TOKEN_ENV}，"
+                             f"都未设置时随机生成并显示")
+    parser.add_argument("--lease", type=int, default=DISTRIBUTED_LEASE_SECONDS,
+                        help=f"租约时长（秒），节点超过该时长没有心跳则任务重新排队，默认 {DISTRIBUTED_LEASE_SECONDS}")
+    parser.add_argument("--max-attempts", type=int, default=DISTRIBUTED_MAX_ATTEMPTS,
+                        help=f"单个任务最多分配次数，默认 {DISTRIBUTED_MAX_ATTEMPTS}")
+    return parser
+
+
+def coordinator_main(argv):
+    """coordinator 子命令入口：全部任务完成后退出，有失败任务时返回 1"""
+    parser = build_coordinator_arg_parser()
+    args = parser.parse_args(argv)
+    host, _, port = args.listen.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        parser.error("监听地址格式应为 主机:端口")
+    if args.lease <= DISTRIBUTED_HEARTBEAT_SECONDS:
+        parser.error(f"租约时长必须大于心跳间隔 {DISTRIBUTED_HEARTBEAT_SECONDS} 秒")
+    
+    tasks = build_tasks_from_args(parser, args)
+    if not tasks:
+        console_log("⚠️ 未找到任何视频文件")
+        return 1
+    
+    token = args.token or secrets.token_urlsafe(16)
+    cache = None if args.force else ConversionCache(Path(args.output) / CACHE_FILENAME)
+    coordinator = JobCoordinator(tasks, lease_seconds=args.lease, max_attempts=args.max_attempts,
+                                 log_callback=console_log, cache=cache, token=token)
+    try:
+        address = coordinator.serve(host or "127.0.0.1", port)
+    except OSError as e:
+        console_log(f"❌ 无法监听 {args.listen}: {e}")
+        return 1
+    console_log(f"🌐 协调端已启动: http://{address[0]}:{address[1]}，共 {len(tasks)} 个任务")
+    if not args.token:
+        console_log(f"🔑 节点令牌: {token}（启动节点时设置 {DISTRIBUTED_TOKEN_ENV} 或传入 --token）")
+    try:
+        summary = coordinator.wait()
+    except KeyboardInterrupt:
+        console_log("⏹️ 用户中断，协调端退出（未完成的任务下次重新分配）")
+        summary = coordinator.summary()
+    finally:
+        if cache:
+            cache.flush()
+    coordinator.shutdown()
+    return 0 if summary['success'] == summary['total'] else 1
+
+
+def worker_main(argv):
+    """worker 子命令入口"""
+    parser = argparse.ArgumentParser(
+        prog="m3u8_batch_converter worker",
+        description="分布式模式工作节点：从协调端租用任务并在本机转换，全部任务完成后退出。")
+    parser.add_argument("coordinator", help="协调端地址，如 http://192.168.1.10:8765")
+    parser.add_argument("-j", "--parallel", type=int, default=min(4, (os.cpu_count() or 1)),
+                        help="本节点并行任务数，默认 min(4, CPU核数)")
+    parser.add_argument("--name", help="节点名称，默认 主机名-进程号")
+    parser.add_argument("--token", default=os.environ.get(DISTRIBUTED_TOKEN_ENV),
+                        help=f"协调端的共享令牌，默认读取环境变量 {DISTRIBUTED_TOKEN_ENV}")
+    parser.add_argument("--max-per-host", type=int, default=NETWORK_MAX_PER_HOST,
+                        help=f"本节点同一主机同时转换的 URL 输入数上限（0 为不限制），默认 {NETWORK_MAX_PER_HOST}")
+    parser.add_argument("--ffmpeg", help="ffmpeg 可执行文件路径，默认自动查找")
+    args = parser.parse_args(argv)
+    host_connections.limit = max(0, args.max_per_host)
+    
+    converter = M3U8Converter(args.ffmpeg)
+    success, message = converter.check_ffmpeg()
+    console_log(f"✅ {message}" if success else f"⚠️ {message}")
+    if not success:
+        return 1
+    
+    worker = JobWorker(args.coordinator, name=args.name, parallel_tasks=args.parallel,
+                       ffmpeg_path=converter.ffmpeg_path, log_callback=console_log, token=args.token)
+    completed, succeeded = worker.run()
+    return 0 if completed == succeeded else 1
+
+
+def watch_main(argv):
+    """watch 子命令入口：持续监视目录，新文件写入完成后自动转换，Ctrl+C 退出"""
+    parser = argparse.ArgumentParser(
+        prog="m3u8_batch_converter watch",
+        description="监视目录，新视频写入完成（大小与修改时间保持不变）后自动加入转换队列。")
+    add_task_arguments(parser)
+    parser.add_argument("-j", "--parallel", type=int, default=min(4, (os.cpu_count() or 1)),
+                        help="并行任务数，默认 min(4, CPU核数)")
+    parser.add_argument("--stable", type=float, default=WATCH_STABLE_SECONDS,
+                        help=f"文件保持不变多少秒后视为写入完成，默认 {WATCH_STABLE_SECONDS:g}")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL,
+                        help=f"轮询模式的检查间隔（秒），默认 {WATCH_POLL_INTERVAL:g}")
+    parser.add_argument("--polling", action="store_true", help="不使用 inotify，强制轮询")
+    parser.add_argument("--ignore-existing", action="store_true",
+                        help="忽略启动时已存在的文件，只处理之后新增的文件")
+    parser.add_argument("--ffmpeg", help="ffmpeg 可执行文件路径，默认自动查找")
+    add_metrics_arguments(parser, report=False)
+    args = parser.parse_args(argv)
+    
+    options = task_options_from_args(parser, args)
+    if args.manifest:
+        parser.error("监视模式不支持清单文件")
+    roots = [path for path in args.inputs if os.path.isdir(path)]
+    if not roots or len(roots) != len(args.inputs):
+        parser.error("请指定要监视的目录")
+    # 输出目录位于监视目录内时跳过它；反过来监视目录位于输出目录内则无法区分输入与输出
+    output_root = os.path.abspath(args.output)
+    if any(FolderScanner(skip_dirs=[output_root]).is_skipped(root) for root in roots):
+        parser.error("监视目录不能是输出目录或位于输出目录内")
+    
+    converter = M3U8Converter(args.ffmpeg)
+    success, message = converter.check_ffmpeg()
+    console_log(f"✅ {message}" if success else f"⚠️ {message}")
+    if not success:
+        return 1
+    
+    # 常驻运行：记录按固定间隔追加写盘，进程被结束时至多丢失最近几秒的增量信息
+    cache = None if args.force else ConversionCache(Path(args.output) / CACHE_FILENAME,
+                                                    flush_interval=WATCH_CACHE_FLUSH_SECONDS)
+    metrics = metrics_from_args(args)
+    runner = BatchRunner(args.parallel, ffmpeg_path=converter.ffmpeg_path, log_callback=console_log,
+                         cache=cache, metrics=metrics)
+    in_flight = set()
+    in_flight_lock = threading.Lock()
+    namer = OutputNamer()
+    
+    def on_ready(path):
+        with in_flight_lock:
+            if path in in_flight:
+                return
+            in_flight.add(path)
+        console_log(f"📥 新文件就绪: {path}")
+        future = runner.submit(make_conversion_task(path, args.output, args.segment_duration,
+                                                    output_name=namer.name_for(path), **options))
         
-        for task in self.conversion_tasks:
-            if self.video_tree.set(task['item'], "状态") in ["等待", "转换中"]:
-                self.video_tree.set(task['item'], "状态", "已停止")
+        def done(_):
+            with in_flight_lock:
+                in_flight.discard(path)
         
-        self.start_selected_btn.config(state=tk.NORMAL)
-        self.start_all_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.DISABLED)
-        self.log_message("⏹️ 用户停止转换")
+        future.add_done_callback(done)
     
-    def log_message(self, message, task_id=None):
-        """添加日志"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] {message}"
-        
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, formatted_message + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+    daemon = WatchFolderDaemon(roots, on_ready, include=args.include, exclude=args.exclude,
+                               recursive=args.recursive, stable_seconds=args.stable,
+                               poll_interval=args.poll_interval, use_inotify=not args.polling,
+                               include_existing=not args.ignore_existing, log_callback=console_log,
+                               skip_dirs=[output_root], on_tick=cache.flush_if_due if cache else None)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        console_log("⏹️ 用户中断，正在停止监视与转换...")
+    finally:
+        daemon.stop()
+        runner.shutdown()
+        finish_metrics(metrics, args)
+    return 0
+
+
+def build_verify_arg_parser():
+    """构建 verify 子命令的参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="m3u8_batch_converter verify",
+        description="按播放列表校验已有输出目录：片段是否存在、大小与头部是否合理。")
+    parser.add_argument("paths", nargs="+", help="输出目录或 .m3u8 文件")
+    parser.add_argument("-j", "--workers", type=int, default=32, help="并行校验的线程数，默认 32")
+    parser.add_argument("--samples", type=int, default=VERIFY_HEADER_SAMPLES,
+                        help=f"每个播放列表抽样检查头部的片段数，默认 {VERIFY_HEADER_SAMPLES}")
+    parser.add_argument("--probe", type=int, default=0, metavar="N",
+                        help="每个播放列表额外用 ffprobe 探测的片段数，默认 0（不调用 ffprobe）")
+    parser.add_argument("--ffmpeg", help="ffmpeg 可执行文件路径（用于定位 ffprobe），默认自动查找")
+    return parser
+
+
+def verify_main(argv):
+    """verify 子命令入口：批量审计已有输出，任一播放列表有问题时返回 1"""
+    parser = build_verify_arg_parser()
+    args = parser.parse_args(argv)
+    
+    playlists = []
+    directories = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            directories.append(path)
+        elif os.path.isfile(path):
+            playlists.append(os.path.abspath(path))
+        else:
+            parser.error(f"路径不存在: {path}")
+    if directories:
+        scanner = FolderScanner(recursive=True, extensions={'.m3u8'})
+        scanner.scan(directories, lambda files: playlists.extend(path for path, _ in files))
+    if not playlists:
+        console_log("⚠️ 未找到任何播放列表")
+        return 1
+    
+    converter = M3U8Converter(args.ffmpeg) if args.probe > 0 else None
+    verifier = PlaylistVerifier(converter, header_samples=args.samples, probe_samples=args.probe,
+                                workers=args.workers)
+    console_log(f"🔍 开始校验 {len(playlists)} 个播放列表（{args.workers} 线程）")
+    
+    def report(result):
+        if not result['ok']:
+            console_log(f"❌ {result['playlist']}: {'; '.join(result['problems'])}")
+        elif result['warnings']:
+            console_log(f"⚠️ {result['playlist']}: {'; '.join(result['warnings'])}")
+    
+    start_time = time.time()
+    results = verifier.verify_many(playlists, on_result=report)
+    elapsed = time.time() - start_time
+    failed = sum(1 for result in results if not result['ok'])
+    segments = sum(result['segments'] for result in results)
+    console_log(f"📊 校验结果: 通过 {len(results) - failed}/{len(results)}, 片段 {segments}, "
+                f"耗时 {elapsed:.2f}s, {len(results) / max(elapsed, 1e-6):.0f} 个/s")
+    return 1 if failed else 0
+
 
-def main():
+def gui_main():
+    """图形界面模式入口"""
+    load_tkinter()
+    hide_console_window()
+    
     # 设置高DPI
     if sys.platform == "win32":
         from ctypes import windll
@@ -743,6 +6012,24 @@ def main():
     root = tk.Tk()
     app = M3U8BatchConverterGUI(root)
     root.mainloop()
+    return 0
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'verify':
+        return verify_main(argv[1:])
+    if argv and argv[0] == 'coordinator':
+        return coordinator_main(argv[1:])
+    if argv and argv[0] == 'worker':
+        return worker_main(argv[1:])
+    if argv and argv[0] == 'watch':
+        return watch_main(argv[1:])
+    if argv:
+        return cli_main(argv)
+    return gui_main()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
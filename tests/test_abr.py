@@ -0,0 +1,84 @@
+import pytest
+
+from m3u8_batch_converter import M3U8Converter, format_abr_ladder, parse_abr_ladder
+
+
+class ProbedConverter(M3U8Converter):
+    def __init__(self, streams):
+        super().__init__(ffmpeg_path="ffmpeg")
+        self.streams = streams
+
+    def probe_streams(self, input_file):
+        return self.streams
+
+
+VIDEO_720 = {'codec_type': 'video', 'codec_name': 'h264', 'height': 720}
+AUDIO = {'codec_type': 'audio', 'codec_name': 'aac'}
+
+
+def value(args, option):
+    return args[args.index(option) + 1]
+
+
+def test_parse_abr_ladder_sorts_by_height():
+    ladder = parse_abr_ladder(" 480:1400k, 1080:5000K ,720:2800")
+
+    assert ladder == [{'name': "1080p", 'height': 1080, 'bitrate_kbps': 5000},
+                      {'name': "720p", 'height': 720, 'bitrate_kbps': 2800},
+                      {'name': "480p", 'height': 480, 'bitrate_kbps': 1400}]
+    assert format_abr_ladder(ladder) == "1080:5000k,720:2800k,480:1400k"
+    assert parse_abr_ladder("") == []
+
+
+@pytest.mark.parametrize("text", ["720", "720:", "p720:2800k", "720:fast", "720:-1k"])
+def test_parse_abr_ladder_rejects_invalid_rungs(text):
+    with pytest.raises(ValueError):
+        parse_abr_ladder(text)
+
+
+def test_rungs_at_or_above_source_height_are_skipped(tmp_path):
+    converter = ProbedConverter([VIDEO_720, AUDIO])
+    ladder = parse_abr_ladder("1080:5000k,720:2800k,480:1400k,360:800k")
+
+    args, names = converter.build_abr_args("in.mp4", ladder, tmp_path, "clip")
+
+    assert names == ["source", "480p", "360p"]
+    assert value(args, "-filter_complex") == "[0:v:0]split=2[s0][s1];[s0]scale=-2:480[v0];[s1]scale=-2:360[v1]"
+
+
+def test_stream_map_and_master_playlist_layout(tmp_path):
+    converter = ProbedConverter([VIDEO_720, AUDIO])
+
+    args, names = converter.build_abr_args("in.mp4", parse_abr_ladder("480:1400k"), tmp_path, "clip", threads=3)
+
+    maps = [args[index + 1] for index, arg in enumerate(args) if arg == "-map"]
+    assert maps == ["0:v:0", "0:a:0", "[v0]", "0:a:0"]
+    assert value(args, "-c:v:0") == "copy"
+    assert value(args, "-c:v:1") == "libx264"
+    assert value(args, "-b:v:1") == "1400k"
+    assert value(args, "-bufsize:v:1") == "2800k"
+    assert value(args, "-force_key_frames:v:1") == "source"
+    assert value(args, "-c:a") == "copy"
+    assert value(args, "-threads") == "3"
+    assert value(args, "-var_stream_map") == "v:0,a:0,name:source v:1,a:1,name:480p"
+    assert value(args, "-master_pl_name") == "clip.m3u8"
+
+
+def test_video_only_source_with_transcoded_top_rung(tmp_path):
+    converter = ProbedConverter([VIDEO_720])
+
+    args, names = converter.build_abr_args("in.mp4", parse_abr_ladder("480:1400k"), tmp_path, "clip",
+                                           transcode='fast')
+
+    assert "0:a:0" not in args and "-c:a" not in args
+    assert value(args, "-c:v:0") == "libx264"
+    assert value(args, "-preset:v:0") == "veryfast"
+    assert value(args, "-var_stream_map") == "v:0,name:source v:1,name:480p"
+
+
+def test_unknown_source_height_keeps_every_rung(tmp_path):
+    converter = ProbedConverter([])
+
+    args, names = converter.build_abr_args("in.mp4", parse_abr_ladder("1080:5000k,480:1400k"), tmp_path, "clip")
+
+    assert names == ["source", "1080p", "480p"]
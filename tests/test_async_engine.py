@@ -0,0 +1,158 @@
+import asyncio
+import concurrent.futures
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from m3u8_batch_converter import AsyncConversionEngine, M3U8Converter, make_conversion_task
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32" or shutil.which("ps") is None,
+                                reason="需要 POSIX 进程组与 ps")
+
+# 假 ffmpeg：按 STUB_FFMPEG_MODE 写出两个片段的播放列表、以错误退出，或启动子进程后一直不输出
+STUB_FFMPEG = """\
+#!{python}
+import os, subprocess, sys, time
+
+args = sys.argv[1:]
+mode = os.environ.get("STUB_FFMPEG_MODE", "ok")
+if mode == "fail":
+    print("in.mp4: No such file or directory", flush=True)
+    sys.exit(1)
+if mode == "hang":
+    child = subprocess.Popen(["sleep", "30"])
+    with open(os.environ["STUB_FFMPEG_PIDS"], "w") as f:
+        f.write(f"{{os.getpid()}} {{child.pid}}")
+    time.sleep(30)
+    sys.exit(0)
+
+pattern = args[args.index("-hls_segment_filename") + 1]
+lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:10", "#EXT-X-MEDIA-SEQUENCE:0"]
+for number in range(2):
+    with open(pattern % number, "wb") as f:
+        f.write(b"\\x47" + bytes(187) + b"\\x47" + bytes(187))
+    lines += ["#EXTINF:10.000000,", os.path.basename(pattern % number)]
+with open(args[-1], "w") as f:
+    f.write("\\n".join(lines + ["#EXT-X-ENDLIST"]) + "\\n")
+print("out_time_ms=20000000\\nprogress=end", flush=True)
+"""
+
+
+class StubConverter(M3U8Converter):
+    def probe_media(self, input_file):
+        return {'duration': 20.0, 'size': 1024}
+
+    def probe_streams(self, input_file):
+        return [{'index': 0, 'codec_type': 'video', 'codec_name': 'h264'},
+                {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac'}]
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    script = tmp_path / "ffmpeg"
+    script.write_text(STUB_FFMPEG.format(python=sys.executable))
+    script.chmod(0o755)
+    pids_file = tmp_path / "pids"
+    monkeypatch.setenv("STUB_FFMPEG_PIDS", str(pids_file))
+
+    def make(mode):
+        monkeypatch.setenv("STUB_FFMPEG_MODE", mode)
+        converter = StubConverter(str(script))
+        converter.toolchain.probed = True  # 假 ffmpeg 不回答能力探测，按未知处理
+        task = make_conversion_task(str(tmp_path / "in.mp4"), tmp_path / "out", 10)
+        return converter, task
+    make.pids_file = pids_file
+    return make
+
+
+def spawned_pids(pids_file, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pids_file.exists() and pids_file.read_text():
+            return [int(pid) for pid in pids_file.read_text().split()]
+        time.sleep(0.05)
+    raise AssertionError("假 ffmpeg 没有启动")
+
+
+def all_gone(pids, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        states = [subprocess.run(["ps", "-o", "stat=", "-p", str(pid)], capture_output=True, text=True).stdout.strip()
+                  for pid in pids]
+        if all(not state or state.startswith("Z") for state in states):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(engine, converter, task):
+    try:
+        return asyncio.run(engine.convert(converter, task, 1))
+    finally:
+        engine.close()
+
+
+def test_successful_conversion(stub):
+    converter, task = stub("ok")
+
+    success, message = run(AsyncConversionEngine(2), converter, task)
+
+    assert success, message
+    assert "2 个片段" in message
+    assert task['stream_path'] == 'copy'
+    assert (Path(task['output_dir']) / f"{task['output_filename']}.m3u8").exists()
+
+
+def test_non_zero_exit_is_classified(stub):
+    converter, task = stub("fail")
+
+    success, message = run(AsyncConversionEngine(2), converter, task)
+
+    assert not success
+    assert "返回码: 1" in message
+    assert converter.last_failure['category'] == 'missing_input'
+    assert task['fixes'] == []
+
+
+def test_timeout_kills_the_process_group(stub):
+    converter, task = stub("hang")
+
+    started = time.monotonic()
+    success, message = run(AsyncConversionEngine(2, timeout=1.0), converter, task)
+
+    assert not success
+    assert "转换超时" in message
+    assert converter.last_failure['category'] == 'timeout'
+    assert time.monotonic() - started < 10
+    assert all_gone(spawned_pids(stub.pids_file))
+
+
+def test_stall_timeout_ends_a_silent_process(stub):
+    converter, task = stub("hang")
+
+    success, message = run(AsyncConversionEngine(2, stall_timeout=1.0), converter, task)
+
+    assert not success
+    assert "没有任何输出" in message
+    assert all_gone(spawned_pids(stub.pids_file))
+
+
+def test_cancel_ends_the_running_process_group(stub):
+    converter, task = stub("hang")
+    engine = AsyncConversionEngine(2).start()
+    try:
+        future = engine.submit("job", engine.convert(converter, task, 1))
+        pids = spawned_pids(stub.pids_file)
+
+        engine.cancel(["job"])
+
+        with pytest.raises(concurrent.futures.CancelledError):
+            future.result(timeout=10)
+        assert converter.stop_requested
+        assert all_gone(pids)
+    finally:
+        engine.close()
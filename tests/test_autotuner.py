@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from m3u8_batch_converter import ConcurrencyAutotuner, percentile
+
+MB = 1024 * 1024
+
+
+def make_tuner(limit=4, **kwargs):
+    messages = []
+    tuner = ConcurrencyAutotuner(initial=limit, minimum=1, maximum=8,
+                                 log_callback=lambda message, task_id: messages.append(message), **kwargs)
+    tuner.messages = messages
+    return tuner
+
+
+def run_window(tuner, megabytes, active=None, seconds=5.0, task_seconds=()):
+    """模拟一个评估窗口：读取 megabytes MB，期间完成耗时为 task_seconds（每任务 1MB）的任务"""
+    tuner.active = tuner.limit if active is None else active
+    tuner.window_bytes = megabytes * MB
+    tuner.window_start = time.perf_counter() - seconds
+    for elapsed in task_seconds:
+        tuner.record_task_time(elapsed, MB)
+    tuner.evaluate()
+
+
+@pytest.mark.parametrize("values, fraction, expected", [
+    ([1.0], 0.9, 1.0),
+    ([1.0, 2.0, 3.0, 4.0], 0.5, 2.0),
+    ([1.0, 2.0, 3.0, 4.0], 0.9, 4.0),
+    (list(range(1, 11)), 0.9, 9),
+])
+def test_percentile(values, fraction, expected):
+    assert percentile(values, fraction) == expected
+
+
+def test_rising_throughput_increases_limit():
+    tuner = make_tuner(limit=2)
+    run_window(tuner, 50)
+    assert tuner.limit == 3
+    run_window(tuner, 80)
+    assert tuner.limit == 4
+
+
+def test_flat_throughput_steps_back_and_sets_ceiling():
+    tuner = make_tuner(limit=2)
+    run_window(tuner, 50)
+    run_window(tuner, 51)
+
+    assert tuner.limit == 2
+    assert tuner.ceiling == 2
+    run_window(tuner, 50)
+    assert tuner.limit == 2
+
+
+def test_idle_slots_hold_limit():
+    tuner = make_tuner(limit=4)
+    run_window(tuner, 50, active=2)
+    assert tuner.limit == 4
+    assert "待处理任务不足" in tuner.messages[-1]
+
+
+def test_task_time_spike_reduces_limit():
+    tuner = make_tuner(limit=2)
+    run_window(tuner, 50, task_seconds=[1.0, 1.1, 1.2])
+    assert tuner.limit == 3
+    assert tuner.best_latency == 1.1
+
+    run_window(tuner, 100, task_seconds=[1.5, 2.0, 2.6])
+
+    assert tuner.limit == 2
+    assert "延迟突增" in tuner.messages[-1]
+
+
+def test_latency_rule_needs_enough_completed_tasks():
+    tuner = make_tuner(limit=2)
+    run_window(tuner, 50, task_seconds=[1.0, 1.0, 1.0])
+    run_window(tuner, 100, task_seconds=[5.0, 5.0])
+
+    assert tuner.limit == 4
+
+
+def test_changing_limit_discards_task_times():
+    tuner = make_tuner(limit=2)
+    tuner.record_task_time(1.0, MB)
+    tuner.record_task_time(1.0, 0)
+    assert list(tuner.latencies) == [1.0]
+
+    tuner.set_limit(3, "测试")
+
+    assert not tuner.latencies
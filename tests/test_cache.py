@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+from m3u8_batch_converter import ConversionCache, make_conversion_task
+
+
+@pytest.fixture
+def task(tmp_path):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"\0" * 64)
+    task = make_conversion_task(str(source), tmp_path / "out", 10)
+    os.makedirs(task['output_dir'])
+    ConversionCache.playlist_path(task).write_text("#EXTM3U\n#EXT-X-ENDLIST\n", encoding='utf-8')
+    return task
+
+
+def cache_lines(cache_file):
+    return cache_file.read_text(encoding='utf-8').splitlines()
+
+
+def test_recorded_task_is_fresh_after_reopening(tmp_path, task):
+    cache_file = tmp_path / "cache.json"
+    cache = ConversionCache(cache_file, flush_every=1)
+    assert not cache.is_fresh(task)
+
+    cache.record(task)
+
+    assert ConversionCache(cache_file).is_fresh(task)
+
+
+@pytest.mark.parametrize("change", ["size", "mtime", "settings", "playlist"])
+def test_changed_input_settings_or_output_is_a_miss(tmp_path, task, change):
+    cache = ConversionCache(tmp_path / "cache.json")
+    cache.record(task)
+    if change == "size":
+        with open(task['file_path'], 'ab') as f:
+            f.write(b"\0")
+    elif change == "mtime":
+        stat = os.stat(task['file_path'])
+        os.utime(task['file_path'], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    elif change == "settings":
+        task = dict(task, segment_duration=6)
+    else:
+        ConversionCache.playlist_path(task).unlink()
+
+    assert not cache.is_fresh(task)
+
+
+@pytest.mark.parametrize("content", [None, "", "{not json", '{"version": 99}\n', "[]\n"])
+def test_missing_or_corrupt_cache_starts_empty_and_is_rewritten(tmp_path, task, content):
+    cache_file = tmp_path / "cache.json"
+    if content is not None:
+        cache_file.write_text(content, encoding='utf-8')
+
+    cache = ConversionCache(cache_file)
+    assert cache.entries == {}
+    cache.record(task)
+    cache.flush()
+
+    assert json.loads(cache_lines(cache_file)[0]) == {'version': ConversionCache.VERSION}
+    assert ConversionCache(cache_file).is_fresh(task)
+
+
+def test_flush_appends_only_changes(tmp_path, task):
+    cache_file = tmp_path / "cache.json"
+    cache = ConversionCache(cache_file)
+    cache.record(task)
+    cache.flush()
+    cache.flush()
+    assert len(cache_lines(cache_file)) == 2
+
+    cache.forget(task)
+    cache.flush()
+
+    assert len(cache_lines(cache_file)) == 3
+    assert json.loads(cache_lines(cache_file)[-1])['entry'] is None
+    assert not ConversionCache(cache_file).is_fresh(task)
+
+
+def test_torn_last_line_is_dropped_and_file_rewritten_atomically(tmp_path, task):
+    cache_file = tmp_path / "cache.json"
+    cache = ConversionCache(cache_file)
+    cache.record(task)
+    cache.flush()
+    with open(cache_file, 'a', encoding='utf-8') as f:
+        f.write('{"key": "/other.mp4", "en')
+
+    reopened = ConversionCache(cache_file)
+
+    assert reopened.is_fresh(task)
+    assert len(cache_lines(cache_file)) == 2
+    assert not (tmp_path / "cache.json.tmp").exists()
+
+
+def test_stale_lines_are_compacted_on_open(tmp_path, task, monkeypatch):
+    monkeypatch.setattr(ConversionCache, 'COMPACT_MIN_LINES', 2)
+    cache_file = tmp_path / "cache.json"
+    cache = ConversionCache(cache_file, flush_every=1)
+    for _ in range(5):
+        cache.record(task)
+
+    assert len(cache_lines(cache_file)) == 6
+    ConversionCache(cache_file)
+    assert len(cache_lines(cache_file)) == 2
+
+
+def test_version_1_manifest_is_migrated(tmp_path, task):
+    cache = ConversionCache(tmp_path / "scratch.json")
+    cache.record(task)
+    cache_file = tmp_path / "cache.json"
+    cache_file.write_text(json.dumps({'version': 1, 'entries': cache.entries}), encoding='utf-8')
+
+    assert ConversionCache(cache_file).is_fresh(task)
+    assert json.loads(cache_lines(cache_file)[0]) == {'version': ConversionCache.VERSION}
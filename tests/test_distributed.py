@@ -0,0 +1,67 @@
+import pytest
+
+from m3u8_batch_converter import JobCoordinator, JobWorker, make_conversion_task
+
+
+def make_tasks(tmp_path, count):
+    return [make_conversion_task(str(tmp_path / f"{index}.mp4"), tmp_path / "out", 10) for index in range(count)]
+
+
+def test_lease_heartbeat_and_complete(tmp_path):
+    coordinator = JobCoordinator(make_tasks(tmp_path, 2))
+
+    lease = coordinator.lease("node-a")
+    assert lease['job_id'] == 1
+    assert 'item' not in lease['task']
+    assert coordinator.heartbeat("node-b", 1) == {'ok': False}
+    assert coordinator.heartbeat("node-a", 1, {'percent': 35.0, 'speed': 2.0}) == {'ok': True}
+    assert coordinator.jobs[1]['progress_step'] == 3
+    assert coordinator.complete("node-a", 1, True, "转换成功", 1.0) == {'ok': True}
+
+    assert coordinator.lease("node-b")['job_id'] == 2
+    coordinator.complete("node-b", 2, False, "转换失败")
+    assert coordinator.lease("node-a") == {'job_id': None, 'finished': True}
+    assert coordinator.status()['states'] == {'done': 1, 'failed': 1}
+
+
+def test_expired_lease_is_requeued_then_abandoned(tmp_path):
+    coordinator = JobCoordinator(make_tasks(tmp_path, 1), lease_seconds=-1, max_attempts=2)
+
+    assert coordinator.lease("node-a")['job_id'] == 1
+    assert coordinator.lease("node-b")['job_id'] == 1
+    assert coordinator.complete("node-a", 1, True, "转换成功") == {'ok': False}
+    assert coordinator.lease("node-c") == {'job_id': None, 'finished': True}
+    assert coordinator.jobs[1]['state'] == 'failed'
+
+
+def test_lease_log_uses_source_name_for_urls(tmp_path):
+    messages = []
+    url = "https://cdn.example.com/shows/episode-7/index.m3u8?token=abc"
+    coordinator = JobCoordinator([make_conversion_task(url, tmp_path / "out", 10)],
+                                 log_callback=lambda message, task_id=None: messages.append(message))
+
+    coordinator.lease("node-a")
+
+    assert messages[-1].endswith("分配给 node-a: index.m3u8")
+
+
+@pytest.fixture
+def served(tmp_path):
+    coordinator = JobCoordinator(make_tasks(tmp_path, 1), token="secret")
+    host, port = coordinator.serve("127.0.0.1", 0)
+    yield coordinator, f"http://{host}:{port}"
+    coordinator.server.shutdown()
+    coordinator.server.server_close()
+
+
+def test_worker_endpoints_require_token(served):
+    coordinator, url = served
+
+    with pytest.raises(ConnectionError, match="令牌"):
+        JobWorker(url, name="node-a").call('/lease', {'worker': "node-a"}, retries=1)
+    with pytest.raises(ConnectionError, match="令牌"):
+        JobWorker(url, name="node-a", token="wrong").call('/lease', {'worker': "node-a"}, retries=1)
+    assert coordinator.status()['states'] == {'pending': 1}
+
+    reply = JobWorker(url, name="node-a", token="secret").call('/lease', {'worker': "node-a"}, retries=1)
+    assert reply['job_id'] == 1
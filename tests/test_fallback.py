@@ -0,0 +1,168 @@
+import pytest
+
+from m3u8_batch_converter import (ConversionAttempts, FFmpegProgressParser, M3U8Converter, classify_failure,
+                                  make_conversion_task, next_fallback_fix, plan_fallback)
+
+H264_AAC = [{'index': 0, 'codec_type': 'video', 'codec_name': 'h264'},
+            {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac'}]
+H264_OPUS = [{'index': 0, 'codec_type': 'video', 'codec_name': 'h264'},
+             {'index': 1, 'codec_type': 'audio', 'codec_name': 'opus'}]
+
+
+def classify(output):
+    parser = FFmpegProgressParser()
+    for line in output.splitlines():
+        parser.feed(line)
+    return classify_failure(parser.failure_lines)
+
+
+@pytest.mark.parametrize("output, category", [
+    ("av_interleaved_write_frame(): No space left on device", 'disk_full'),
+    ("[http @ 0x1] HTTP error 403 Forbidden", 'permission'),
+    ("input.mp4: No such file or directory", 'missing_input'),
+    ("[tcp @ 0x1] Connection reset by peer", 'network'),
+    ("[mov,mp4,m4a,3gp,3g2,mj2 @ 0x1] moov atom not found\ninput.mp4: Invalid data found when processing input",
+     'broken_container'),
+    ("[h264 @ 0x1] Invalid NAL unit size\nError while decoding stream #0:0", 'corrupt_input'),
+    ("[mpegts @ 0x1] Non-monotonous DTS in output stream 0:1", 'timestamps'),
+    ("Could not find tag for codec opus in stream #1, codec not currently supported in container",
+     'unsupported_codec'),
+    ("Conversion failed!", 'unknown'),
+])
+def test_classify_failure(output, category):
+    assert classify(output) == category
+
+
+def test_classify_failure_prefers_higher_priority_category():
+    output = "[h264 @ 0x1] Invalid NAL unit size\nav_interleaved_write_frame(): No space left on device"
+    assert classify(output) == 'disk_full'
+
+
+def failure(category, line=""):
+    return {'category': category, 'line': line}
+
+
+@pytest.fixture
+def task(tmp_path):
+    return make_conversion_task(str(tmp_path / "in.mp4"), tmp_path / "out", 10)
+
+
+def test_next_fallback_fix_walks_category_fixes(task):
+    assert next_fallback_fix(task, failure('timestamps'), []) == 'regen_timestamps'
+    assert next_fallback_fix(task, failure('timestamps'), ['regen_timestamps']) == 'transcode'
+    assert next_fallback_fix(task, failure('timestamps'), ['regen_timestamps', 'transcode']) is None
+
+
+@pytest.mark.parametrize("category", ['disk_full', 'permission', 'missing_input', 'broken_container', 'timeout',
+                                      'unknown'])
+def test_unfixable_failures_are_not_retried(task, category):
+    assert next_fallback_fix(task, failure(category), []) is None
+
+
+def test_next_fallback_fix_respects_task_options(task):
+    task['transcode'] = 'fast'
+    assert next_fallback_fix(task, failure('unsupported_codec'), []) is None
+    task['transcode'] = None
+    task['abr_ladder'] = ['720p']
+    assert next_fallback_fix(task, failure('corrupt_input'), []) == 'ignore_errors'
+    assert next_fallback_fix(task, failure('corrupt_input'), ['ignore_errors']) is None
+
+
+def test_next_fallback_fix_stops_after_retry_limit(task):
+    assert next_fallback_fix(task, failure('network'), ['a', 'b', 'c']) is None
+
+
+@pytest.fixture
+def converter(monkeypatch):
+    converter = M3U8Converter(ffmpeg_path="ffmpeg")
+    monkeypatch.setattr(converter, 'probe_streams', lambda file_path: H264_OPUS)
+    return converter
+
+
+def test_plan_fallback_accumulates_input_fixes(converter, task):
+    options = plan_fallback(converter, task, failure('corrupt_input'), ['regen_timestamps', 'ignore_errors'], 10,
+                            ["-c:v", "copy", "-c:a", "copy"])
+
+    assert options['input_args'] == ["-err_detect", "ignore_err", "-fflags", "+genpts+igndts+discardcorrupt"]
+    assert options['codec_args'] == ["-c:v", "copy", "-c:a", "copy"]
+    assert options['resume'] is False
+
+
+def test_plan_fallback_reencodes_only_the_named_stream(converter, task):
+    line = "Could not find tag for codec opus in stream #1"
+    options = plan_fallback(converter, task, failure('unsupported_codec', line), ['reencode_streams'], 10)
+
+    assert options['codec_args'] == ["-c", "copy"] + M3U8Converter.audio_encode_args()
+
+
+def test_plan_fallback_bitstream_filter_for_ts(converter, task):
+    options = plan_fallback(converter, task, failure('bitstream'), ['bitstream_filter'], 10)
+    assert options['codec_args'][-2:] == ["-bsf:v", "h264_mp4toannexb"]
+
+
+def test_plan_fallback_reconnect_resumes_without_read_ahead(converter, task):
+    task['network'] = {'read_ahead': True, 'rw_timeout': 15}
+    options = plan_fallback(converter, task, failure('network'), ['reconnect'], 10)
+
+    assert options['resume'] is True
+    assert options['network'] == {'read_ahead': False, 'rw_timeout': 15}
+
+
+def test_plan_fallback_transcode(converter, task):
+    options = plan_fallback(converter, task, failure('corrupt_input'), ['ignore_errors', 'transcode'], 10)
+    assert options['transcode'] == 'fast'
+    assert 'codec_args' not in options
+
+
+class ScriptedConverter:
+    """按顺序返回预设失败类别的转换器替身"""
+
+    class Toolchain:
+        def missing_features(self, task):
+            return []
+
+    def __init__(self, failures):
+        self.toolchain = self.Toolchain()
+        self.failures = list(failures)
+        self.timings = {}
+        self.last_failure = None
+        self.stop_requested = False
+
+    def probe_streams(self, file_path):
+        return H264_AAC
+
+    def run(self, attempts):
+        options = attempts.first()
+        while options is not None:
+            category = self.failures.pop(0)
+            self.last_failure = failure(category) if category else None
+            options = attempts.next((category is None, "转换成功" if category is None else "转换失败"))
+        return attempts.finish()
+
+
+def test_stream_path_is_reported_for_successful_attempt(task):
+    converter = ScriptedConverter(['corrupt_input', None])
+    success, message = converter.run(ConversionAttempts(converter, task, 1))
+
+    assert success
+    assert task['stream_path'] == 'copy'
+    assert task['fixes'] == ['ignore_errors']
+
+
+def test_failed_transcode_fallback_is_not_reported_as_encode_path(task):
+    converter = ScriptedConverter(['corrupt_input', 'corrupt_input', 'corrupt_input'])
+    success, message = converter.run(ConversionAttempts(converter, task, 1))
+
+    assert not success
+    assert task['fixes'] == ['ignore_errors', 'transcode']
+    assert task['stream_path'] is None
+    assert task['failure'] == 'corrupt_input'
+
+
+def test_successful_transcode_fallback_reports_transcode(task):
+    converter = ScriptedConverter(['corrupt_input', 'corrupt_input', None])
+    success, message = converter.run(ConversionAttempts(converter, task, 1))
+
+    assert success
+    assert task['stream_path'] == 'transcode'
+    assert message.endswith("（自动修复: 丢弃损坏数据, 完整转码）")
@@ -0,0 +1,131 @@
+import pytest
+
+from m3u8_batch_converter import (JOB_TASK_FIELDS, JobStore, OutputNamer, conversion_settings, make_conversion_task,
+                                  parse_abr_ladder)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite")
+    yield store
+    store.close()
+
+
+def make_tasks(tmp_path, names, segment_duration=10):
+    return [make_conversion_task(str(tmp_path / name), tmp_path / "out", segment_duration) for name in names]
+
+
+def rows(store):
+    with store.lock:
+        return store.conn.execute("SELECT file_path, state, attempts, message FROM jobs ORDER BY id").fetchall()
+
+
+def test_claim_marks_running_in_insertion_order(tmp_path, store):
+    assert store.add_tasks(make_tasks(tmp_path, ["a.mp4", "b.mp4", "c.mp4"])) == 3
+
+    claimed = store.claim(2)
+
+    assert [task['file_path'] for task in claimed] == [str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")]
+    assert all('job_id' in task for task in claimed)
+    assert store.counts() == {'queued': 1, 'running': 2, 'done': 0, 'failed': 0, 'cancelled': 0}
+
+
+def test_finish_records_outcome(tmp_path, store):
+    store.add_tasks(make_tasks(tmp_path, ["a.mp4", "b.mp4", "c.mp4", "d.mp4"]))
+    done, failed, stopped, cancelled = store.claim(4)
+
+    store.finish(done, True, "转换成功", 1.5)
+    store.finish(failed, False, "转换失败")
+    store.finish(stopped, False, "已停止", outcome='stopped')
+    store.finish(cancelled, False, "已取消", outcome='cancelled')
+
+    states = [(state, attempts) for _, state, attempts, _ in rows(store)]
+    assert states == [('done', 1), ('failed', 1), ('queued', 0), ('cancelled', 0)]
+    assert store.claim(10)[0]['job_id'] == stopped['job_id']
+
+
+def test_finish_without_claim_counts_attempt(tmp_path, store):
+    task, = make_tasks(tmp_path, ["a.mp4"])
+    store.add_tasks([task])
+
+    store.finish(task, False, "转换失败")
+    store.finish(task, False, "已停止", outcome='stopped')
+
+    assert [(state, attempts) for _, state, attempts, _ in rows(store)] == [('queued', 1)]
+
+
+def test_reopen_requeues_running_tasks(tmp_path, store):
+    store.add_tasks(make_tasks(tmp_path, ["a.mp4", "b.mp4"]))
+    store.claim(1)
+    store.close()
+
+    reopened = JobStore(tmp_path / "jobs.sqlite")
+    try:
+        assert reopened.recovered == 1
+        assert reopened.counts()['queued'] == 2
+    finally:
+        reopened.close()
+
+
+def test_add_tasks_refreshes_unfinished_rows_only(tmp_path, store):
+    store.add_tasks(make_tasks(tmp_path, ["a.mp4", "b.mp4"]))
+    done, _ = store.claim(2)
+    store.finish(done, True, "转换成功")
+
+    assert store.add_tasks(make_tasks(tmp_path, ["a.mp4", "b.mp4", "c.mp4"], segment_duration=6)) == 1
+
+    tasks = [task for page in store.unfinished_tasks() for task in page]
+    assert [task['segment_duration'] for task in tasks] == [6, 6]
+    with store.lock:
+        payload = store.conn.execute("SELECT task FROM jobs WHERE id = ?", (done['job_id'],)).fetchone()[0]
+    assert '"segment_duration": 10' in payload
+
+
+def test_retry_failed_respects_max_attempts(tmp_path, store):
+    store.add_tasks(make_tasks(tmp_path, ["a.mp4", "b.mp4"]))
+    first, second = store.claim(2)
+    store.finish(first, False, "转换失败")
+    store.finish(second, False, "转换失败")
+    store.retry_failed()
+    first, = [task for task in store.claim(1)]
+    store.finish(first, False, "转换失败")
+
+    assert store.retry_failed(max_attempts=2) == 0
+    assert store.counts()['failed'] == 1
+
+
+def test_unfinished_tasks_are_paged(tmp_path, store):
+    store.add_tasks(make_tasks(tmp_path, [f"{index}.mp4" for index in range(5)]))
+    store.claim(1)
+
+    pages = list(store.unfinished_tasks(page_size=2))
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+def test_unfinished_tasks_keep_per_task_settings(tmp_path):
+    ladder = parse_abr_ladder("720:2800k,480:1400k")
+    tasks = [make_conversion_task(str(tmp_path / "a.mp4"), tmp_path / "out", 6, abr_ladder=ladder,
+                                  gop_plan='auto', output_mode='fmp4', output_name="a_1f2e3d4c"),
+             make_conversion_task(str(tmp_path / "b.mp4"), tmp_path / "other", 4, transcode='fast')]
+    store = JobStore(tmp_path / "jobs.sqlite")
+    store.add_tasks(tasks)
+    store.claim(2)
+    store.close()
+
+    store = JobStore(tmp_path / "jobs.sqlite")
+    restored = [{key: task[key] for key in JOB_TASK_FIELDS if key in task}
+                for page in store.unfinished_tasks() for task in page]
+    store.close()
+
+    expected = [{key: task[key] for key in JOB_TASK_FIELDS if key in task} for task in tasks]
+    assert restored == expected
+    assert [conversion_settings(task) for task in restored] == [conversion_settings(task) for task in tasks]
+
+
+def test_reserved_names_are_not_reassigned(tmp_path):
+    namer = OutputNamer()
+    namer.reserve(str(tmp_path / "old" / "ep01.mp4"), "ep01")
+
+    assert namer.name_for(str(tmp_path / "new" / "ep01.mp4")).startswith("ep01_")
+    assert namer.name_for(str(tmp_path / "old" / "ep01.mp4")) == "ep01"
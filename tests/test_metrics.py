@@ -0,0 +1,48 @@
+from m3u8_batch_converter import BatchMetrics
+
+
+def record(index, success=True, **extra):
+    return dict({'task_id': index, 'file_path': f"{index}.mp4", 'success': success, 'message': "",
+                 'elapsed': 2.0, 'queue_wait': 0.5, 'bytes': 1000, 'output_bytes': 900, 'segments': 3,
+                 'timings': {'convert': 1.5}}, **extra)
+
+
+def test_report_keeps_totals_and_recent_records():
+    metrics = BatchMetrics(recent_tasks=2)
+    for index in range(4):
+        metrics.task_started()
+        metrics.observe_task(record(index))
+    metrics.observe_task(record(4, success=False, message="转换失败", failure='network'))
+
+    report = metrics.report()
+
+    assert report['tasks'] == 5
+    assert report['status'] == {'success': 4, 'failed': 1}
+    assert report['input_bytes'] == 5000
+    assert report['segments'] == 15
+    assert report['failures'] == {'network': 1}
+    assert [result['task_id'] for result in report['results']] == [3, 4]
+    assert report['results_dropped'] == 3
+    assert report['task_duration_seconds'] == {'sum': 10.0, 'count': 5}
+
+
+def test_skipped_and_stopped_tasks_are_not_totalled():
+    metrics = BatchMetrics()
+    metrics.observe_task(record(1, skipped=True))
+    metrics.observe_task(record(2, success=False, message="已停止"))
+
+    report = metrics.report()
+
+    assert report['status'] == {'skipped': 1, 'stopped': 1}
+    assert report['input_bytes'] == 1000
+
+
+def test_prometheus_counters():
+    metrics = BatchMetrics()
+    metrics.observe_task(record(1, stream_path='copy'))
+
+    text = metrics.render_prometheus()
+
+    assert 'm3u8_tasks_total{status="success"} 1' in text
+    assert 'm3u8_task_paths_total{path="copy"} 1' in text
+    assert 'm3u8_task_duration_seconds_count 1' in text
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from m3u8_batch_converter import OUTPUT_MODES, hls_output_args, segment_number_width
+
+OUT = Path("out")
+
+
+def value(args, option):
+    return args[args.index(option) + 1]
+
+
+def test_ts_segments():
+    args, flags = hls_output_args('ts', OUT, "clip")
+
+    assert args == ["-hls_segment_filename", str(OUT / "clip_%03d.ts")]
+    assert flags == []
+
+
+def test_fmp4_segments_with_init_file():
+    args, flags = hls_output_args('fmp4', OUT, "clip", number_width=5)
+
+    assert value(args, "-hls_segment_type") == "fmp4"
+    assert value(args, "-hls_fmp4_init_filename") == "clip_init.mp4"
+    assert value(args, "-hls_segment_filename") == str(OUT / "clip_%05d.m4s")
+    assert flags == []
+
+
+def test_single_file_ts_uses_byte_ranges():
+    args, flags = hls_output_args('single', OUT, "clip")
+
+    assert "-hls_segment_type" not in args
+    assert value(args, "-hls_segment_filename") == str(OUT / "clip.ts")
+    assert flags == ["single_file"]
+
+
+def test_single_file_fmp4():
+    args, flags = hls_output_args('fmp4_single', OUT, "clip_%v")
+
+    assert value(args, "-hls_segment_type") == "fmp4"
+    assert value(args, "-hls_fmp4_init_filename") == "clip_%v_init.mp4"
+    assert value(args, "-hls_segment_filename") == str(OUT / "clip_%v.mp4")
+    assert flags == ["single_file"]
+
+
+def test_every_mode_names_its_segments():
+    for mode in OUTPUT_MODES:
+        args, _ = hls_output_args(mode, OUT, "clip")
+        assert "-hls_segment_filename" in args
+
+
+@pytest.mark.parametrize("duration, segment_duration, width", [
+    (None, 10, 3),
+    (600, None, 3),
+    (600, 10, 3),
+    (9990, 10, 4),
+    (9989, 10, 3),
+    (36000, 2, 5),
+])
+def test_segment_number_width(duration, segment_duration, width):
+    assert segment_number_width(duration, segment_duration) == width
@@ -0,0 +1,28 @@
+from m3u8_batch_converter import OutputNamer, build_arg_parser, build_tasks_from_args
+
+
+def test_same_stem_in_different_subfolders_gets_distinct_outputs(tmp_path):
+    for folder in ("s1", "s2"):
+        (tmp_path / "in" / folder).mkdir(parents=True)
+        (tmp_path / "in" / folder / "ep01.mp4").write_bytes(b"\0")
+    parser = build_arg_parser()
+    args = parser.parse_args([str(tmp_path / "in"), "-o", str(tmp_path / "out"), "-r"])
+
+    first, second = build_tasks_from_args(parser, args)
+
+    assert first['output_dir'] == str(tmp_path / "out" / "ep01")
+    assert first['output_filename'] == "ep01"
+    assert second['output_dir'] != first['output_dir']
+    assert second['output_filename'].startswith("ep01_")
+    assert second['output_dir'] == str(tmp_path / "out" / second['output_filename'])
+
+
+def test_names_are_stable_and_case_insensitive(tmp_path):
+    namer = OutputNamer()
+    first = namer.name_for(str(tmp_path / "a" / "Clip.mp4"))
+    second = namer.name_for(str(tmp_path / "b" / "clip.mkv"))
+
+    assert first == "Clip"
+    assert second.startswith("clip_")
+    assert namer.name_for(str(tmp_path / "b" / "clip.mkv")) == second
+    assert namer.name_for(str(tmp_path / "a" / "Clip.mp4")) == first
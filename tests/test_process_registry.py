@@ -0,0 +1,89 @@
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from m3u8_batch_converter import ProcessRegistry
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32" or shutil.which("ps") is None,
+                                reason="需要 POSIX 进程组与 ps")
+
+# sh 先输出两个 sleep 子进程的进程号，再等待它们；ignore_term 时整个进程树忽略 SIGTERM
+CHILD_TREE = "{trap}sleep 30 & echo $!; sleep 30 & echo $!; wait"
+
+
+def process_state(pid):
+    """ps 报告的进程状态首字母，进程已不存在时返回 None"""
+    result = subprocess.run(["ps", "-o", "stat=", "-p", str(pid)], capture_output=True, text=True)
+    state = result.stdout.strip()
+    return state[0] if state else None
+
+
+def wait_for_state(pids, accept, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(accept(process_state(pid)) for pid in pids):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def is_gone(state):
+    return state in (None, "Z")
+
+
+def start_tree(registry, ignore_term=False):
+    trap = "trap '' TERM; " if ignore_term else ""
+    process = registry.spawn("job", ["sh", "-c", CHILD_TREE.format(trap=trap)], stdout=subprocess.PIPE, text=True)
+    children = [int(process.stdout.readline()) for _ in range(2)]
+    return process, [process.pid] + children
+
+
+@pytest.fixture
+def registry():
+    registry = ProcessRegistry()
+    yield registry
+    registry.terminate(grace=0.5)
+
+
+def test_pause_and_resume_signal_the_whole_tree(registry):
+    process, pids = start_tree(registry)
+
+    assert registry.pause("job")
+    assert registry.is_paused("job")
+    assert wait_for_state(pids, lambda state: state == "T")
+
+    assert registry.resume("job")
+    assert not registry.is_paused("job")
+    assert wait_for_state(pids, lambda state: state not in (None, "T"))
+
+
+def test_terminate_stops_the_tree_without_orphans(registry):
+    process, pids = start_tree(registry)
+
+    assert registry.terminate(grace=2.0) == 1
+
+    assert process.poll() is not None
+    assert wait_for_state(pids, is_gone)
+
+
+def test_terminate_kills_a_tree_that_ignores_sigterm(registry):
+    process, pids = start_tree(registry, ignore_term=True)
+    registry.pause("job")
+
+    started = time.monotonic()
+    assert registry.terminate(grace=0.5) == 1
+
+    assert time.monotonic() - started >= 0.5
+    assert process.returncode == -9
+    assert wait_for_state(pids, is_gone)
+
+
+def test_finished_processes_are_not_signalled(registry):
+    process = registry.spawn("job", ["sh", "-c", "exit 0"])
+    process.wait()
+
+    assert registry.terminate() == 0
+    assert not registry.pause("job")
@@ -0,0 +1,69 @@
+import pytest
+
+from m3u8_batch_converter import FFMPEG_LINE_MAX, FFmpegProgressParser, parse_ffmpeg_time
+
+
+def feed_all(parser, text):
+    return [progress for progress in map(parser.feed, text.splitlines()) if progress]
+
+
+PROGRESS_BLOCK = """frame=250
+fps=0.0
+out_time_us=30000000
+out_time=00:00:30.000000
+total_size=1048576
+speed=4.0x
+progress=continue
+"""
+
+
+def test_progress_with_probed_duration():
+    parser = FFmpegProgressParser()
+    updates = feed_all(parser, "  Duration: 00:02:00.00, start: 0.000000, bitrate: 800 kb/s\n" + PROGRESS_BLOCK)
+
+    assert updates == [{'percent': 25.0, 'out_time': 30.0, 'duration': 120.0, 'speed': 4.0, 'eta': 22.5,
+                        'total_size': 1048576, 'finished': False}]
+
+
+def test_progress_end_is_complete():
+    parser = FFmpegProgressParser(duration=60.0)
+    progress, = feed_all(parser, "out_time_us=59000000\nspeed=N/A\nprogress=end\n")
+
+    assert progress['percent'] == 100.0
+    assert progress['eta'] == 0
+    assert progress['speed'] is None
+
+
+def test_resume_offset_is_added():
+    parser = FFmpegProgressParser(duration=120.0, offset=60.0)
+    progress, = feed_all(parser, PROGRESS_BLOCK)
+
+    assert progress['out_time'] == 90.0
+    assert progress['percent'] == 75.0
+
+
+def test_negative_out_time_and_unknown_duration():
+    parser = FFmpegProgressParser()
+    progress, = feed_all(parser, "out_time_us=-5000\nprogress=continue\n")
+
+    assert progress['out_time'] == 0.0
+    assert progress['percent'] is None
+
+
+def test_tail_is_bounded_and_failure_lines_recorded():
+    parser = FFmpegProgressParser(tail_lines=3)
+    feed_all(parser, "\n".join(f"[hls @ 0x1] line {index}" for index in range(10)))
+    parser.feed("x" * (FFMPEG_LINE_MAX * 2) + " No space left on device")
+    parser.feed("Another No space left on device")
+
+    assert len(parser.tail) == 3
+    assert len(parser.tail[-2]) == FFMPEG_LINE_MAX
+    assert parser.failure_lines == {'disk_full': "Another No space left on device"}
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("00:01:02.50", 62.5),
+    ("1:00:00", 3600.0),
+])
+def test_parse_ffmpeg_time(text, seconds):
+    assert parse_ffmpeg_time(text) == seconds
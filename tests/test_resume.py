@@ -0,0 +1,196 @@
+import shutil
+import subprocess
+
+import pytest
+
+from m3u8_batch_converter import KeyframeIndex, M3U8Converter, TS_PACKET_SIZE, parse_media_playlist
+
+
+def write_segment(path, packets=2):
+    path.write_bytes((b"\x47" + b"\x00" * (TS_PACKET_SIZE - 1)) * packets)
+
+
+def write_partial_output(output_path, name="clip", complete=3, durations=(10.0, 10.0, 10.0, 10.0)):
+    """模拟中断的转换：列表登记 len(durations) 个片段，其中前 complete 个完整"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:10", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for index, duration in enumerate(durations):
+        segment = f"{name}_{index:03d}.ts"
+        lines += [f"#EXTINF:{duration:.6f},", segment]
+        if index < complete:
+            write_segment(output_path / segment)
+        else:
+            (output_path / segment).write_bytes(b"\x47" * 100)
+    (output_path / f"{name}_{len(durations):03d}.ts").write_bytes(b"\x47")
+    m3u8_file = output_path / f"{name}.m3u8"
+    m3u8_file.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return m3u8_file
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"\x00" * 1024)
+    return source
+
+
+@pytest.fixture
+def converter():
+    return M3U8Converter(ffmpeg_path="ffmpeg")
+
+
+class StaticKeyframes:
+    def __init__(self, keyframes):
+        self.keyframes = keyframes
+
+    def get(self, converter, input_file):
+        return self.keyframes, None
+
+
+EVERY_10S = StaticKeyframes([1.4 + 10.0 * index for index in range(7)])
+
+
+def hls_flags(cmd):
+    if "-hls_flags" not in cmd:
+        return []
+    return cmd[cmd.index("-hls_flags") + 1].split("+")
+
+
+def test_find_resume_point_truncates_to_last_complete_segment(tmp_path, converter):
+    output_path = tmp_path / "out"
+    output_path.mkdir()
+    m3u8_file = write_partial_output(output_path, durations=(10.0, 9.5, 10.0, 10.0))
+
+    point = converter.find_resume_point(m3u8_file, output_path, "clip")
+
+    assert point == {'segments': 3, 'offset': 29.5}
+    text = m3u8_file.read_text(encoding='utf-8')
+    assert [segment['uri'] for segment in parse_media_playlist(text)['segments']] == [
+        "clip_000.ts", "clip_001.ts", "clip_002.ts"]
+    assert "#EXT-X-ENDLIST" not in text
+    assert sorted(p.name for p in output_path.glob("clip_*.ts")) == ["clip_000.ts", "clip_001.ts", "clip_002.ts"]
+
+
+def test_find_resume_point_ignores_finished_playlist(tmp_path, converter):
+    output_path = tmp_path / "out"
+    output_path.mkdir()
+    m3u8_file = write_partial_output(output_path, complete=4)
+    m3u8_file.write_text(m3u8_file.read_text(encoding='utf-8') + "#EXT-X-ENDLIST\n", encoding='utf-8')
+
+    assert converter.find_resume_point(m3u8_file, output_path, "clip") is None
+
+
+def test_resumed_command_appends_to_existing_playlist(tmp_path, converter, source):
+    output_path = tmp_path / "out"
+    converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60)
+    write_partial_output(output_path)
+
+    job = converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60,
+                                keyframe_index=EVERY_10S)
+
+    cmd = job['cmd']
+    assert cmd[cmd.index("-ss") + 1] == f"{30 + M3U8Converter.RESUME_SEEK_EPSILON:.6f}"
+    assert "-start_number" not in cmd
+    assert "append_list" in hls_flags(cmd)
+    assert "discont_start" not in hls_flags(cmd)
+    assert job['parser'].offset == 30
+
+
+@pytest.mark.parametrize("change", ["segment_duration", "codec_args", "source"])
+def test_changed_source_or_settings_restarts_from_scratch(tmp_path, converter, source, change):
+    output_path = tmp_path / "out"
+    converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60)
+    write_partial_output(output_path)
+
+    options = {'segment_duration': 10, 'expected_duration': 60}
+    if change == "segment_duration":
+        options['segment_duration'] = 6
+    elif change == "codec_args":
+        options['codec_args'] = ["-c:v", "copy", "-c:a", "aac"]
+    else:
+        source.write_bytes(b"\x00" * 2048)
+    job = converter.prepare_job(source, output_path, **options)
+
+    assert "-ss" not in job['cmd']
+    assert "append_list" not in hls_flags(job['cmd'])
+    assert not any((output_path / f"clip_{index:03d}.ts").exists() for index in range(4))
+
+
+@pytest.mark.parametrize("keyframes", [[0.0, 10.0, 20.0, 25.0], [], [0.0, 10.0, 20.0, 30.2]])
+def test_resume_point_without_keyframe_restarts_from_scratch(tmp_path, converter, source, keyframes):
+    output_path = tmp_path / "out"
+    converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60)
+    write_partial_output(output_path)
+
+    job = converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60,
+                                keyframe_index=StaticKeyframes(keyframes))
+
+    assert "-ss" not in job['cmd']
+    assert "append_list" not in hls_flags(job['cmd'])
+    assert not any((output_path / f"clip_{index:03d}.ts").exists() for index in range(4))
+
+
+def test_reencoded_video_resumes_without_keyframe_index(tmp_path, converter, source):
+    output_path = tmp_path / "out"
+    options = {'segment_duration': 10, 'expected_duration': 60, 'transcode': 'fast'}
+    converter.prepare_job(source, output_path, **options)
+    write_partial_output(output_path)
+
+    job = converter.prepare_job(source, output_path, keyframe_index=StaticKeyframes([]), **options)
+
+    assert "-ss" in job['cmd']
+
+
+def test_cleanup_keeps_other_outputs_in_directory(tmp_path, converter, source):
+    output_path = tmp_path / "out"
+    converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60)
+    write_partial_output(output_path)
+    for name in ("clip_2f9a01c3_000.ts", "clip_extra.ts"):
+        write_segment(output_path / name)
+
+    converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60,
+                          keyframe_index=EVERY_10S)
+    converter.prepare_job(source, output_path, segment_duration=6, expected_duration=60)
+
+    assert (output_path / "clip_2f9a01c3_000.ts").exists()
+    assert (output_path / "clip_extra.ts").exists()
+
+
+def test_output_without_recorded_settings_is_not_resumed(tmp_path, converter, source):
+    output_path = tmp_path / "out"
+    output_path.mkdir()
+    write_partial_output(output_path)
+
+    job = converter.prepare_job(source, output_path, segment_duration=10, expected_duration=60)
+
+    assert "-ss" not in job['cmd']
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="需要 ffmpeg")
+def test_resumed_playlist_is_continuous(tmp_path):
+    source = tmp_path / "clip.ts"
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=24:size=160x120:rate=25",
+                    "-c:v", "libx264", "-g", "25", "-keyint_min", "25", "-sc_threshold", "0", "-y", str(source)],
+                   check=True)
+    output_path = tmp_path / "out"
+    converter = M3U8Converter()
+    success, message = converter.convert_to_m3u8_optimized(source, output_path, segment_duration=4)
+    assert success, message
+    m3u8_file = output_path / "clip.m3u8"
+    complete = parse_media_playlist(m3u8_file.read_text(encoding='utf-8'))['segments']
+
+    # 模拟中断：去掉结束标记与最后两个片段，并重新记录续转所需的设置
+    lines = m3u8_file.read_text(encoding='utf-8').splitlines()
+    cut = [index for index, line in enumerate(lines) if line.startswith("#EXTINF:")][-2]
+    m3u8_file.write_text("\n".join(lines[:cut]) + "\n", encoding='utf-8')
+    converter.save_resume_state(output_path, "clip", converter.resume_fingerprint(str(source), 4))
+
+    success, message = M3U8Converter().convert_to_m3u8_optimized(source, output_path, segment_duration=4,
+                                                                 keyframe_index=KeyframeIndex(tmp_path / "keyframes"))
+    assert success, message
+
+    text = m3u8_file.read_text(encoding='utf-8')
+    resumed = parse_media_playlist(text)['segments']
+    assert [segment['uri'] for segment in resumed] == [segment['uri'] for segment in complete]
+    assert "#EXT-X-MEDIA-SEQUENCE:0" in text
+    assert text.count("#EXT-X-ENDLIST") == 1
+    assert not (output_path / "clip.resume.json").exists()
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+
+from m3u8_batch_converter import (describe_schedule_plan, describe_schedule_result, make_conversion_task,
+                                  plan_longest_first, simulate_makespan)
+
+
+class StubConverter:
+    def __init__(self, media):
+        self.media = media
+
+    def probe_media(self, input_file):
+        return self.media.get(input_file, {})
+
+
+def plan(tmp_path, media, workers):
+    media = {str(tmp_path / name): info for name, info in media.items()}
+    tasks = [make_conversion_task(path, tmp_path / "out", 10) for path in media]
+    ordered, schedule = plan_longest_first(tasks, workers, StubConverter(media), probe_workers=2)
+    return [Path(task['file_path']).name for task in ordered], schedule
+
+
+def test_longest_first_beats_list_order(tmp_path):
+    media = {name: {'size': size, 'duration': size / 10}
+             for name, size in [("a", 1), ("b", 1), ("c", 1), ("d", 1), ("e", 4)]}
+
+    order, schedule = plan(tmp_path, media, 2)
+
+    assert order == ["e", "a", "b", "c", "d"]
+    assert schedule == {'workers': 2, 'lpt_load': 4.0, 'fifo_load': 6.0}
+    assert "33.3%" in describe_schedule_plan(schedule)
+
+
+def test_ties_keep_list_order_and_unknown_costs_go_last(tmp_path):
+    media = {"a": {}, "b": {'size': 5}, "c": {'duration': 20.0}, "d": {'size': 5},
+             "e": {'size': 10, 'duration': 10.0}}
+
+    order, schedule = plan(tmp_path, media, 2)
+
+    # c 缺少大小，按中位码率（1 字节/秒）由时长推算为 20
+    assert order == ["c", "e", "b", "d", "a"]
+    assert schedule['lpt_load'] == 20.0
+
+
+def test_no_estimable_costs(tmp_path):
+    order, schedule = plan(tmp_path, {"a": {}, "b": {}}, 4)
+
+    assert order == ["a", "b"]
+    assert describe_schedule_plan(schedule) == "🗓️ 最长优先调度: 无法估算任务开销"
+
+
+@pytest.mark.parametrize("costs, workers, makespan", [
+    ([], 4, 0.0),
+    ([5.0, 3.0], 8, 5.0),
+    ([4.0, 4.0, 4.0], 0, 12.0),
+    ([1.0, 1.0, 1.0, 1.0], 2, 2.0),
+])
+def test_simulate_makespan(costs, workers, makespan):
+    assert simulate_makespan(costs, workers) == makespan
+
+
+def test_schedule_result_is_calibrated_by_measured_rate():
+    schedule = {'workers': 2, 'lpt_load': 700.0, 'fifo_load': 800.0}
+    tasks = [{'cost': 300.0, 'elapsed': 3.0}, {'cost': 100.0, 'elapsed': 1.0}, {'cost': 50.0}]
+
+    assert describe_schedule_result(schedule, tasks, 7.5) == \
+        "🗓️ 调度评估: 预测完工 7.0s, 实际 7.5s, 列表顺序预计 8.0s"
+    assert "无可用于校准" in describe_schedule_result(schedule, [{'cost': 1.0}], 3.0)
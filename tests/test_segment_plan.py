@@ -0,0 +1,36 @@
+from m3u8_batch_converter import plan_segment_duration, predict_segment_durations, summarize_segment_durations
+
+
+def every(gop, total):
+    return [index * gop for index in range(int(total / gop))]
+
+
+def test_predict_cuts_at_first_keyframe_past_each_boundary():
+    assert predict_segment_durations(every(4, 40), 40, 10) == [12, 8, 12, 8]
+    assert predict_segment_durations([], 40, 10) == []
+
+
+def test_summary():
+    stats = summarize_segment_durations([12, 8, 12, 8])
+    assert stats == {'count': 4, 'min': 8, 'max': 12, 'mean': 10.0, 'p95': 12}
+    assert summarize_segment_durations([]) is None
+
+
+def test_target_not_a_gop_multiple_snaps_to_gop():
+    best, current, planned = plan_segment_duration(every(4, 120), 120, 10)
+
+    assert best == 8
+    assert current['max'] == 12
+    assert planned['min'] == planned['max'] == 8
+
+
+def test_target_already_even_is_kept():
+    best, current, planned = plan_segment_duration(every(2, 120), 120, 10)
+    assert best == 10
+    assert current == planned
+
+
+def test_too_few_keyframes_keeps_target():
+    best, current, planned = plan_segment_duration([0.0], 120, 6)
+    assert best == 6
+
@@ -0,0 +1,82 @@
+import pytest
+
+from m3u8_batch_converter import (HostConnectionLimiter, OutputNamer, is_source_url, make_conversion_task,
+                                  network_input, source_host, source_name, source_stem)
+
+
+@pytest.mark.parametrize("path, stem", [
+    ("/videos/lecture 01.mp4", "lecture 01"),
+    ("https://cdn.example.com/movies/trailer.mp4?token=abc", "trailer"),
+    ("https://cdn.example.com/shows/episode-7/index.m3u8", "episode-7"),
+    ("https://cdn.example.com/live/master.m3u8", "live"),
+    ("https://cdn.example.com/%E8%AF%BE%E7%A8%8B.mp4", "课程"),
+    ("http://cdn.example.com/a:b*c.mp4", "a_b_c"),
+    ("http://cdn.example.com:8080/", "cdn.example.com_8080"),
+    ("https://cdn.example.com/index.m3u8", "index"),
+])
+def test_source_stem(path, stem):
+    assert source_stem(path) == stem
+
+
+def test_source_name_and_host():
+    url = "HTTPS://CDN.example.com:8443/shows/clip.mp4"
+    assert is_source_url(url)
+    assert source_name(url) == "clip.mp4"
+    assert source_host(url) == "cdn.example.com:8443"
+    assert source_host("/videos/clip.mp4") is None
+    assert not is_source_url("C:/videos/clip.mp4")
+
+
+def test_url_task_gets_network_defaults(tmp_path):
+    task = make_conversion_task("https://cdn.example.com/live/index.m3u8", tmp_path, 6,
+                                network={'read_ahead': False})
+    assert task['output_dir'] == str(tmp_path / "live")
+    assert task['network']['read_ahead'] is False
+    assert task['network']['rw_timeout'] == 30.0
+    assert 'network' not in make_conversion_task(str(tmp_path / "a.mp4"), tmp_path, 6)
+
+
+def test_network_input_for_single_file():
+    args, url = network_input("https://cdn.example.com/a.mp4", {'rw_timeout': 2.5})
+    assert url == "async:https://cdn.example.com/a.mp4"
+    assert args[args.index("-rw_timeout") + 1] == "2500000"
+    assert network_input("https://cdn.example.com/a.mp4", {'read_ahead': False})[1] == "https://cdn.example.com/a.mp4"
+
+
+def test_network_input_for_hls_playlist():
+    args, url = network_input("https://cdn.example.com/live/index.m3u8")
+    assert url == "https://cdn.example.com/live/index.m3u8"
+    assert "-http_multiple" in args
+    args, _ = network_input("https://cdn.example.com/live/index.m3u8", {'read_ahead': False})
+    assert "-http_persistent" in args and "-http_multiple" not in args
+
+
+def test_host_limiter_counts_per_host():
+    limiter = HostConnectionLimiter(limit=2)
+    assert limiter.try_acquire("a") and limiter.try_acquire("a")
+    assert not limiter.try_acquire("a")
+    assert limiter.try_acquire("b")
+    limiter.release("a")
+    assert limiter.try_acquire("a")
+
+
+def test_host_limiter_slot_skips_local_files():
+    limiter = HostConnectionLimiter(limit=1)
+    with limiter.slot("https://cdn.example.com/a.mp4") as acquired:
+        assert acquired
+        with limiter.slot("/videos/b.mp4") as local:
+            assert local
+        assert not limiter.try_acquire("cdn.example.com")
+    assert limiter.active == {}
+
+
+def test_urls_with_same_stem_get_distinct_outputs(tmp_path):
+    namer = OutputNamer()
+    urls = ["https://a.example.com/x/720p/index.m3u8", "https://b.example.com/y/720p/index.m3u8",
+            "https://b.example.com/y/720P/master.m3u8"]
+    tasks = [make_conversion_task(url, tmp_path, 6, output_name=namer.name_for(url)) for url in urls]
+
+    assert tasks[0]['output_dir'] == str(tmp_path / "720p")
+    assert len({task['output_dir'].casefold() for task in tasks}) == 3
+    assert all(task['output_filename'].startswith("720") for task in tasks)
+    assert namer.name_for(urls[1]) == tasks[1]['output_filename']
@@ -0,0 +1,29 @@
+import pytest
+
+from m3u8_batch_converter import plan_stream_codecs
+
+
+STREAMS = [
+    {'index': 0, 'codec_type': 'video', 'codec_name': 'h264'},
+    {'index': 1, 'codec_type': 'audio', 'codec_name': 'opus'},
+    {'index': 2, 'codec_type': 'subtitle', 'codec_name': 'subrip'},
+]
+
+
+@pytest.mark.parametrize("output_mode", ['ts', 'fmp4', 'single'])
+def test_subtitles_are_not_mapped_into_media_playlist(output_mode):
+    args, path, notes = plan_stream_codecs(STREAMS, output_mode, 6)
+
+    maps = [args[index + 1] for index, arg in enumerate(args) if arg == "-map"]
+    assert maps == ["0:0", "0:1"]
+    assert not any(arg.startswith("-c:s") or arg == "webvtt" for arg in args)
+    assert any("字幕 subrip" in note and "丢弃" in note for note in notes)
+
+
+def test_copy_video_and_reencode_incompatible_audio():
+    args, path, notes = plan_stream_codecs(STREAMS[:2], 'ts', 6)
+
+    assert args[args.index("-c:v") + 1] == "copy"
+    assert "-c:a" in args and args[args.index("-c:a") + 1] != "copy"
+    assert path == 'audio'
+    assert plan_stream_codecs([], 'ts', 6) == (None, 'unknown', [])
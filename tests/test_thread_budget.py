@@ -0,0 +1,35 @@
+from m3u8_batch_converter import describe_thread_plan, plan_thread_budget
+
+
+def test_threads_are_split_evenly_across_jobs():
+    plan = plan_thread_budget(4, cpu_count=16)
+
+    assert plan == {'cpus': 16, 'jobs': 4, 'threads': 4, 'total': 16}
+
+
+def test_uneven_split_rounds_down():
+    plan = plan_thread_budget(3, cpu_count=8)
+
+    assert plan['threads'] == 2
+    assert plan['total'] == 6
+
+
+def test_every_job_gets_at_least_one_thread():
+    plan = plan_thread_budget(6, cpu_count=4)
+
+    assert plan['threads'] == 1
+    assert plan['total'] == 6
+    assert "超过核数" in describe_thread_plan(plan)
+
+
+def test_zero_jobs_counts_as_one():
+    plan = plan_thread_budget(0, cpu_count=8)
+
+    assert plan['jobs'] == 1
+    assert plan['threads'] == 8
+
+
+def test_cpu_count_defaults_to_the_machine(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: None)
+
+    assert plan_thread_budget(2)['cpus'] == 1
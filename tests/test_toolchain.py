@@ -0,0 +1,124 @@
+import os
+
+from m3u8_batch_converter import FFmpegToolchain
+
+ENCODERS_OUTPUT = """Encoders:
+ V..... = Video
+ A..... = Audio
+ S..... = Subtitle
+ .F.... = Frame-level multithreading
+ ..S... = Slice-level multithreading
+ ...X.. = Codec is experimental
+ ....B. = Supports draw_horiz_band
+ .....D = Supports direct rendering method 1
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V....D libx264rgb           libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 RGB (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+ S..... mov_text             3GPP Timed Text subtitle
+"""
+
+MUXERS_OUTPUT = """File formats:
+ D. = Demuxing supported
+ .E = Muxing supported
+ --
+  E hls             Apple HTTP Live Streaming
+  E mp4             MP4 (MPEG-4 Part 14)
+  E mpegts          MPEG-TS (MPEG-2 Transport Stream)
+  E matroska,webm   Matroska / WebM
+"""
+
+FILTERS_OUTPUT = """Filters:
+  T.. = Timeline support
+  .S. = Slice threading
+  ..C = Command support
+  A = Audio input/output
+  V = Video input/output
+  N = Dynamic number and/or type of input/output
+  | = Source or sink filter
+ ... aresample         A->A       Resample audio data.
+ ..C scale             V->V       Scale the input video size and/or convert the image format.
+ ... split             V->N       Pass on the input to N video outputs.
+ ... nullsrc           |->V       Null video source, return unprocessed video frames.
+"""
+
+
+class CountingToolchain(FFmpegToolchain):
+    def __init__(self, ffmpeg_path, cache_file):
+        super().__init__(ffmpeg_path, cache_file=cache_file)
+        self.probes = 0
+
+    def probe_capabilities(self, executable):
+        self.probes += 1
+        return {'version': f"build-{self.probes}", 'muxers': ["hls"], 'encoders': [], 'filters': [],
+                'hls_options': []}
+
+
+def fake_ffmpeg(tmp_path, content=b"ffmpeg"):
+    binary = tmp_path / "ffmpeg"
+    binary.write_bytes(content)
+    return binary
+
+
+def test_parse_encoders_listing():
+    assert FFmpegToolchain.parse_listing(ENCODERS_OUTPUT) == ["aac", "libx264", "libx264rgb", "mov_text"]
+
+
+def test_parse_muxers_listing_splits_aliases():
+    assert FFmpegToolchain.parse_listing(MUXERS_OUTPUT) == ["hls", "matroska", "mp4", "mpegts", "webm"]
+
+
+def test_parse_filters_listing_skips_the_legend():
+    assert FFmpegToolchain.parse_listing(FILTERS_OUTPUT) == ["aresample", "nullsrc", "scale", "split"]
+
+
+def test_parse_listing_of_failed_probe_is_unknown():
+    assert FFmpegToolchain.parse_listing(None) is None
+
+
+def test_capabilities_are_read_from_the_cache(tmp_path):
+    binary = fake_ffmpeg(tmp_path)
+    cache_file = tmp_path / "capabilities.json"
+
+    first = CountingToolchain(str(binary), cache_file)
+    assert first.capabilities()['version'] == "build-1"
+    second = CountingToolchain(str(binary), cache_file)
+
+    assert second.capabilities()['version'] == "build-1"
+    assert second.probes == 0
+
+
+def test_cache_is_invalidated_when_the_binary_mtime_changes(tmp_path):
+    binary = fake_ffmpeg(tmp_path)
+    cache_file = tmp_path / "capabilities.json"
+    CountingToolchain(str(binary), cache_file).capabilities()
+
+    stat = binary.stat()
+    os.utime(binary, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    toolchain = CountingToolchain(str(binary), cache_file)
+
+    assert toolchain.capabilities()['version'] == "build-1"
+    assert toolchain.probes == 1
+
+
+def test_cache_is_invalidated_when_the_binary_size_changes(tmp_path):
+    binary = fake_ffmpeg(tmp_path)
+    cache_file = tmp_path / "capabilities.json"
+    CountingToolchain(str(binary), cache_file).capabilities()
+
+    stat = binary.stat()
+    binary.write_bytes(b"ffmpeg, upgraded")
+    os.utime(binary, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    toolchain = CountingToolchain(str(binary), cache_file)
+
+    toolchain.capabilities()
+    assert toolchain.probes == 1
+
+
+def test_missing_filters_are_reported_for_abr(tmp_path):
+    toolchain = CountingToolchain(str(fake_ffmpeg(tmp_path)), tmp_path / "capabilities.json")
+    toolchain.cached_capabilities = {'muxers': ["hls"], 'encoders': ["libx264"], 'filters': ["scale"],
+                                     'hls_options': ["var_stream_map"]}
+    toolchain.probed = True
+
+    assert toolchain.missing_features({'abr_ladder': [{'height': 480}]}) == ["split"]
@@ -0,0 +1,49 @@
+from m3u8_batch_converter import TS_PACKET_SIZE, M3U8Converter, PlaylistVerifier
+
+
+def write_output(tmp_path, durations, ended=True):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:6"]
+    for index, duration in enumerate(durations):
+        (tmp_path / f"out_{index:03d}.ts").write_bytes(b"\x47" + b"\0" * (TS_PACKET_SIZE - 1))
+        lines += [f"#EXTINF:{duration:.3f},", f"out_{index:03d}.ts"]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    playlist = tmp_path / "out.m3u8"
+    playlist.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return playlist
+
+
+def test_duration_mismatch_is_a_warning(tmp_path):
+    playlist = write_output(tmp_path, [6.0, 6.0, 2.0])
+
+    result = PlaylistVerifier().verify(playlist, expected_duration=20.0)
+
+    assert result['ok']
+    assert result['problems'] == []
+    assert len(result['warnings']) == 1
+    assert PlaylistVerifier().verify(playlist, expected_duration=15.0)['warnings'] == []
+
+
+def test_missing_segment_and_open_playlist_fail(tmp_path):
+    playlist = write_output(tmp_path, [6.0, 6.0], ended=False)
+    (tmp_path / "out_001.ts").unlink()
+
+    result = PlaylistVerifier().verify(playlist)
+
+    assert not result['ok']
+    assert len(result['problems']) == 2
+
+
+def test_resume_truncates_by_the_segments_the_verifier_sees(tmp_path):
+    playlist = write_output(tmp_path, [6.0, 6.0, 2.0], ended=False)
+    text = playlist.read_text(encoding='utf-8').replace("#EXTINF:6.000,\nout_001.ts",
+                                                        "stray.ts\n#EXTINF:6.000,\nout_001.ts")
+    playlist.write_text(text, encoding='utf-8')
+    (tmp_path / "out_002.ts").write_bytes(b"\x47" * 100)
+
+    point = M3U8Converter(ffmpeg_path="ffmpeg").find_resume_point(playlist, tmp_path, "out")
+
+    assert point == {'segments': 2, 'offset': 12.0}
+    result = PlaylistVerifier().verify(playlist)
+    assert result['segments'] == 2
+    assert result['problems'] == ["播放列表未结束（转换可能被中断）"]
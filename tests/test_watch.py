@@ -0,0 +1,67 @@
+import pytest
+
+from m3u8_batch_converter import (ConversionCache, FolderScanner, PollingWatcher, WatchFolderDaemon,
+                                  make_conversion_task, watch_main)
+
+
+def make_tree(tmp_path):
+    (tmp_path / "in" / "hls" / "clip").mkdir(parents=True)
+    (tmp_path / "in" / "clip.mp4").write_bytes(b"\0")
+    (tmp_path / "in" / "hls" / "clip" / "clip_000.ts").write_bytes(b"\0")
+    return tmp_path / "in"
+
+
+def test_output_inside_watched_root_is_skipped(tmp_path):
+    root = make_tree(tmp_path)
+    scanner = FolderScanner(skip_dirs=[root / "hls"])
+    watcher = PollingWatcher([root], scanner)
+
+    assert watcher.initial_files == [str(root / "clip.mp4")]
+    assert str(root / "hls") not in watcher.dir_mtimes
+    assert not scanner.accept_file("clip_001.ts", str(root / "hls" / "clip" / "clip_001.ts"))
+    assert scanner.accept_file("new.ts", str(root / "new.ts"))
+
+
+@pytest.mark.parametrize("output", [".", ".."])
+def test_watch_rejects_root_inside_output(tmp_path, output):
+    root = make_tree(tmp_path)
+    with pytest.raises(SystemExit):
+        watch_main([str(root), "-o", str(root / output)])
+
+
+def test_cache_flushes_on_interval_not_per_record(tmp_path, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("m3u8_batch_converter.time.monotonic", lambda: clock[0])
+    cache_file = tmp_path / "cache.json"
+    cache = ConversionCache(cache_file, flush_interval=5.0)
+    tasks = []
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.mp4").write_bytes(b"\0")
+        task = make_conversion_task(str(tmp_path / f"{name}.mp4"), tmp_path / "out", 10)
+        (tmp_path / "out" / name).mkdir(parents=True)
+        ConversionCache.playlist_path(task).write_text("#EXTM3U\n", encoding='utf-8')
+        tasks.append(task)
+
+    cache.record(tasks[0])
+    clock[0] += 1
+    cache.record(tasks[1])
+    assert not cache_file.exists()
+
+    clock[0] += 4
+    cache.flush_if_due()
+    assert len(cache_file.read_text(encoding='utf-8').splitlines()) == 3
+
+
+def test_daemon_calls_on_tick(tmp_path):
+    root = make_tree(tmp_path)
+    ticks = []
+
+    def on_tick():
+        ticks.append(1)
+        daemon.stop()
+
+    daemon = WatchFolderDaemon([root], lambda path: None, use_inotify=False, poll_interval=0,
+                               include_existing=False, on_tick=on_tick)
+    daemon.run()
+
+    assert ticks == [1]